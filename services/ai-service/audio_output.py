@@ -0,0 +1,142 @@
+"""Delivery of generated speech.
+
+The talker hands back a finished waveform; nothing here touches the event
+loop with it. Clips are encoded on worker threads. Streaming clients get
+the audio as SSE chunks while it is uploaded. Finished clips go to the
+file-service under a unique name instead of piling up in /tmp.
+
+Formats: "wav" streams raw 16-bit PCM chunks and stores a WAV file;
+"opus" streams and stores Ogg/Opus.
+"""
+import os
+import io
+import time
+import uuid
+import base64
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+FILE_SERVICE_URL = os.getenv("FILE_SERVICE_URL", "http://localhost:8005")
+AUDIO_SAMPLE_RATE = 24000
+# Audio per streamed chunk
+AUDIO_CHUNK_SECONDS = float(os.getenv("AUDIO_CHUNK_SECONDS", "0.5"))
+# Owner of clips from requests that carry no user
+AUDIO_DEFAULT_OWNER = os.getenv("AUDIO_DEFAULT_OWNER", "ai-service")
+
+# format -> (soundfile format, subtype, content type, extension)
+AUDIO_FORMATS = {
+    "wav": ("WAV", "PCM_16", "audio/wav", ".wav"),
+    "opus": ("OGG", "OPUS", "audio/ogg", ".ogg")
+}
+
+
+def pcm16(samples: np.ndarray) -> bytes:
+    """Little-endian 16-bit PCM of a float waveform in [-1, 1]"""
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def encode_clip(samples: np.ndarray, audio_format: str) -> bytes:
+    file_format, subtype, _, _ = AUDIO_FORMATS[audio_format]
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, AUDIO_SAMPLE_RATE, format=file_format, subtype=subtype)
+    return buffer.getvalue()
+
+
+class AudioPublisher:
+    """Encodes finished clips off the event loop and hands them to the file-service"""
+
+    def __init__(self, base_url: str = FILE_SERVICE_URL, registry=None):
+        self.base_url = base_url.rstrip("/")
+        self.client: Optional[httpx.AsyncClient] = None
+        self.stats = {"clips": 0, "bytes": 0, "upload_failures": 0, "encode_seconds": 0.0}
+
+        self.encode_histogram = None
+        if registry is not None:
+            self.encode_histogram = registry.histogram(
+                "ai_audio_encode_seconds", "Time to encode a generated clip", ["format"]
+            )
+
+    async def start(self):
+        self.client = httpx.AsyncClient(base_url=self.base_url, timeout=30.0)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def encode(self, samples: np.ndarray, audio_format: str) -> bytes:
+        start = time.monotonic()
+        data = await asyncio.to_thread(encode_clip, samples, audio_format)
+        elapsed = time.monotonic() - start
+        self.stats["encode_seconds"] += elapsed
+        if self.encode_histogram is not None:
+            self.encode_histogram.labels(audio_format).observe(elapsed)
+        return data
+
+    async def publish(self, samples: np.ndarray, audio_format: str, user_id: Optional[str]) -> Optional[str]:
+        """Encode and store a clip; returns its URL, or None if it could not be stored"""
+        return await self.upload(await self.encode(samples, audio_format), audio_format, user_id)
+
+    async def upload(self, data: bytes, audio_format: str, user_id: Optional[str]) -> Optional[str]:
+        _, _, content_type, extension = AUDIO_FORMATS[audio_format]
+        filename = f"qwen_audio_{uuid.uuid4().hex}{extension}"
+        try:
+            response = await self.client.post(
+                "/api/upload",
+                files={"file": (filename, data, content_type)},
+                headers={"X-User-ID": user_id or AUDIO_DEFAULT_OWNER}
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            self.stats["upload_failures"] += 1
+            logger.error(f"Could not hand generated audio to the file-service: {str(e)}")
+            return None
+        self.stats["clips"] += 1
+        self.stats["bytes"] += len(data)
+        return response.json()["url"]
+
+    async def stream(
+        self,
+        samples: np.ndarray,
+        audio_format: str,
+        user_id: Optional[str],
+        result: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """SSE payloads carrying the clip in AUDIO_CHUNK_SECONDS pieces while it is stored.
+
+        The stored clip's URL is put in result["audio_url"] once the last
+        chunk has been sent and the upload has finished.
+        """
+        if audio_format == "wav":
+            upload = asyncio.ensure_future(self.publish(samples, audio_format, user_id))
+            data = await asyncio.to_thread(pcm16, samples)
+            chunk_size = int(AUDIO_SAMPLE_RATE * AUDIO_CHUNK_SECONDS) * 2
+            encoding = "pcm_s16le"
+        else:
+            data = await self.encode(samples, audio_format)
+            upload = asyncio.ensure_future(self.upload(data, audio_format, user_id))
+            # Roughly the same playback time per chunk as PCM, at Opus bitrates
+            chunk_size = max(1, int(len(data) * AUDIO_CHUNK_SECONDS * AUDIO_SAMPLE_RATE / max(1, len(samples))))
+            encoding = "ogg_opus"
+        try:
+            for offset in range(0, len(data), chunk_size):
+                yield {
+                    "type": "audio",
+                    "encoding": encoding,
+                    "sample_rate": AUDIO_SAMPLE_RATE,
+                    "data": base64.b64encode(data[offset:offset + chunk_size]).decode("ascii")
+                }
+            result["audio_url"] = await upload
+        finally:
+            if not upload.done():
+                upload.cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "encode_seconds": round(self.stats["encode_seconds"], 3)}
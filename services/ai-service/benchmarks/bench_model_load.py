@@ -0,0 +1,145 @@
+"""Time-to-ready of a small model: hub-id loading versus model_loader.
+
+Builds a GPT-2 style model (BENCH_LAYERS x BENCH_HIDDEN, random weights)
+and lays it out as a Hugging Face hub cache in a temp directory. Then it
+measures load + one short generation, the service's warm-up, three ways:
+
+- hub_id: from_pretrained(model_id) for the weights, then the tokenizer,
+  one after the other, which is how the service loaded before;
+- loader_first_start: model_loader.load_pretrained, which resolves the
+  snapshot, pins it, prefetches the shards and loads the tokenizer on
+  another thread;
+- loader_pinned: the same on a later start, straight from the pin.
+
+Each runs with a cold page cache (the files evicted with
+POSIX_FADV_DONTNEED) and a warm one. The hub is used offline here
+(HF_HUB_OFFLINE=1), so hub_id pays no network lookups; on a connected
+host, where it makes a HEAD request per file, the gap is larger.
+
+    python benchmarks/bench_model_load.py [repeats]
+"""
+import os
+import sys
+import glob
+import time
+import shutil
+import tempfile
+import statistics
+
+ROOT = tempfile.mkdtemp(prefix="bench-model-load-")
+# Current and older spellings, read by different huggingface_hub / transformers releases
+for name in ("HF_HUB_CACHE", "HUGGINGFACE_HUB_CACHE", "TRANSFORMERS_CACHE"):
+    os.environ[name] = os.path.join(ROOT, "hub")
+for name in ("HF_HUB_OFFLINE", "TRANSFORMERS_OFFLINE"):
+    os.environ[name] = "1"
+os.environ["MODEL_SNAPSHOT_DIR"] = os.path.join(ROOT, "snapshots")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torch  # noqa: E402
+from tokenizers import Tokenizer, models, pre_tokenizers, trainers  # noqa: E402
+from transformers import (  # noqa: E402
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    GPT2Config,
+    GPT2LMHeadModel,
+    PreTrainedTokenizerFast,
+)
+
+from transformers.utils import logging as transformers_logging  # noqa: E402
+
+import model_loader  # noqa: E402
+
+transformers_logging.set_verbosity_error()
+transformers_logging.disable_progress_bar()
+
+MODEL_ID = "radon/bench-small"
+BENCH_LAYERS = int(os.getenv("BENCH_LAYERS", "8"))
+BENCH_HIDDEN = int(os.getenv("BENCH_HIDDEN", "768"))
+
+
+def build_snapshot() -> str:
+    """Save the model and a tokenizer where the hub cache expects them"""
+    revision = "0" * 40
+    repo = os.path.join(os.environ["HF_HUB_CACHE"], "models--" + MODEL_ID.replace("/", "--"))
+    snapshot = os.path.join(repo, "snapshots", revision)
+    os.makedirs(os.path.join(repo, "refs"))
+    with open(os.path.join(repo, "refs", "main"), "w") as f:
+        f.write(revision)
+
+    tokenizer = Tokenizer(models.BPE(unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel()
+    corpus = ["Say hello in one short sentence.", "Radon answers questions about anything."] * 100
+    tokenizer.train_from_iterator(corpus, trainers.BpeTrainer(vocab_size=2000, special_tokens=["<unk>", "<eos>"]))
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<eos>", pad_token="<eos>").save_pretrained(snapshot)
+
+    config = GPT2Config(n_layer=BENCH_LAYERS, n_embd=BENCH_HIDDEN, n_head=BENCH_HIDDEN // 64, vocab_size=32000, n_positions=512)
+    GPT2LMHeadModel(config).save_pretrained(snapshot, safe_serialization=True, max_shard_size="200MB")
+    return snapshot
+
+
+def evict(directory: str):
+    """Drop the files from the page cache, as after a reboot or on a new node"""
+    for path in glob.glob(os.path.join(directory, "**", "*"), recursive=True):
+        if os.path.isfile(path):
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+def warm_up(model, tokenizer):
+    inputs = tokenizer(["Say hello in one short sentence."], return_tensors="pt")
+    with torch.inference_mode():
+        model.generate(**inputs, max_new_tokens=8, do_sample=False, pad_token_id=tokenizer.pad_token_id)
+
+
+def load_model(path: str):
+    return AutoModelForCausalLM.from_pretrained(path, use_safetensors=True, low_cpu_mem_usage=True)
+
+
+def hub_id():
+    model = load_model(MODEL_ID)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_ID)
+    warm_up(model, tokenizer)
+
+
+def loader_first_start():
+    shutil.rmtree(os.environ["MODEL_SNAPSHOT_DIR"], ignore_errors=True)
+    loader_pinned()
+
+
+def loader_pinned():
+    model, tokenizer, _ = model_loader.load_pretrained(MODEL_ID, load_model, AutoTokenizer.from_pretrained)
+    warm_up(model, tokenizer)
+
+
+def measure(start, cold: bool, repeats: int, snapshot: str) -> float:
+    samples = []
+    for _ in range(repeats):
+        if cold:
+            evict(snapshot)
+        began = time.perf_counter()
+        start()
+        samples.append(time.perf_counter() - began)
+    return statistics.median(samples)
+
+
+def main(repeats: int):
+    try:
+        snapshot = build_snapshot()
+        size = sum(os.path.getsize(path) for path in glob.glob(os.path.join(snapshot, "*.safetensors")))
+        print(f"model: {BENCH_LAYERS} layers x {BENCH_HIDDEN}, {size / 1024 ** 2:.0f} MiB of safetensors")
+        # One untimed load so imports and lazy initialisation do not count
+        hub_id()
+        print(f"{'start':<20} {'cold s':>8} {'warm s':>8}")
+        for start in (hub_id, loader_first_start, loader_pinned):
+            cold = measure(start, True, repeats, snapshot)
+            warm = measure(start, False, repeats, snapshot)
+            print(f"{start.__name__:<20} {cold:>8.3f} {warm:>8.3f}")
+    finally:
+        shutil.rmtree(ROOT, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
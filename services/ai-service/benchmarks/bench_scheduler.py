@@ -0,0 +1,75 @@
+"""Throughput of the batching scheduler across concurrency levels.
+
+The model is replaced by a CPU stand-in whose cost has the shape of GPU
+decoding: a fixed cost per forward pass (BATCH_MS) plus a small cost per
+sequence in the batch (ITEM_MS). It sleeps rather than computes, like a
+thread waiting on CUDA kernels, so the numbers show what batching buys
+rather than the host's speed. Each concurrency level runs with batching
+off (max batch 1) and on (INFERENCE_MAX_BATCH_SIZE).
+
+    python benchmarks/bench_scheduler.py [requests per level]
+"""
+import os
+import sys
+import time
+import asyncio
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_WAIT_MS, InferenceScheduler  # noqa: E402
+
+BATCH_MS = float(os.getenv("BATCH_MS", "40"))
+ITEM_MS = float(os.getenv("ITEM_MS", "4"))
+CONCURRENCY_LEVELS = (1, 2, 4, 8, 16, 32)
+
+
+def stand_in_runner(payloads, params):
+    time.sleep((BATCH_MS + ITEM_MS * len(payloads)) / 1000)
+    return payloads
+
+
+async def client(scheduler: InferenceScheduler, requests: int, latencies: list):
+    for i in range(requests):
+        start = time.perf_counter()
+        await scheduler.submit(i, "greedy")
+        latencies.append(time.perf_counter() - start)
+
+
+def run_level(concurrency: int, max_batch_size: int, total_requests: int):
+    scheduler = InferenceScheduler(stand_in_runner, max_batch_size=max_batch_size)
+    scheduler.start()
+    latencies = []
+
+    async def run():
+        per_client = max(1, total_requests // concurrency)
+        await asyncio.gather(*(client(scheduler, per_client, latencies) for _ in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    snapshot = scheduler.snapshot()
+    scheduler.close()
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "avg_batch": snapshot["avg_batch_size"]
+    }
+
+
+def main(total_requests: int):
+    print(f"stand-in cost: {BATCH_MS}ms per batch + {ITEM_MS}ms per request, max wait {INFERENCE_MAX_WAIT_MS}ms")
+    print(f"{'concurrency':>11} {'batch':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'avg batch':>9}")
+    for concurrency in CONCURRENCY_LEVELS:
+        for max_batch_size in (1, INFERENCE_MAX_BATCH_SIZE):
+            result = run_level(concurrency, max_batch_size, total_requests)
+            print(
+                f"{concurrency:>11} {max_batch_size:>5} {result['throughput']:>8.1f} "
+                f"{result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['avg_batch']:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 128)
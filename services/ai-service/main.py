@@ -1,19 +1,28 @@
-from fastapi import FastAPI, HTTPException, Request, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, ORJSONResponse
 import httpx
 import os
 import json
 import time
 import logging
 import torch
-import soundfile as sf
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, NamedTuple, Callable, Awaitable, Tuple, Literal
 from pydantic import BaseModel
 import asyncio
 import base64
-import io
-from PIL import Image
+import copy
+
+from radon_common.metrics import setup_metrics, prefers_json, prometheus_response
+from scheduler import InferenceScheduler, SchedulerBusy, INFERENCE_MAX_BATCH_SIZE
+from streaming import AsyncTextStreamer, StopOnCancel, sse_event, SSE_HEADERS
+from prefix_cache import PrefixCache, personality_key
+from radon_client import RadonClient
+from media_cache import MediaCache
+from audio_output import AudioPublisher
+from model_loader import load_pretrained
+from uploads import InvalidUpload, UploadTooLarge, check_content_length, remove_files, spool_multipart
+from response_cache import AIResponseCache, is_deterministic, make_cache_key
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,7 +34,8 @@ app = FastAPI(
     description="AI Service для Radon AI 30B с поддержкой мультимодальности",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -37,6 +47,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus latency and payload histograms per route
+metrics_registry = setup_metrics(app, "ai-service")
+inference_duration = metrics_registry.histogram(
+    "ai_inference_duration_seconds",
+    "End-to-end generation time per endpoint",
+    ["endpoint"]
+)
+inference_tokens = metrics_registry.counter("ai_tokens_total", "Tokens generated per endpoint", ["endpoint"])
+inference_errors = metrics_registry.counter("ai_inference_errors_total", "Failed generations per endpoint", ["endpoint"])
+time_to_first_token = metrics_registry.histogram(
+    "ai_time_to_first_token_seconds",
+    "Time from request to the first streamed token",
+    ["endpoint"]
+)
+
 # Qwen3-Omni configuration
 QWEN_MODEL_PATH = os.getenv("QWEN_MODEL_PATH", "Qwen/Qwen3-Omni-30B-A3B-Instruct")
 RADON_API_URL = os.getenv("RADON_API_URL")
@@ -44,10 +69,28 @@ RADON_API_URL = os.getenv("RADON_API_URL")
 if not RADON_API_URL:
     raise ValueError("RADON_API_URL environment variable is required")
 RADON_API_KEY = os.getenv("RADON_API_KEY")
+# Model served behind RADON_API_URL; part of the response cache key, so bump it on model upgrades
+RADON_MODEL = os.getenv("RADON_MODEL", "radon-ai-30b")
+radon_client = RadonClient(RADON_API_URL, RADON_API_KEY, registry=metrics_registry)
 
-# Initialize Qwen3-Omni model (lazy loading)
+# Load the model at startup and warm it up, instead of on the first request
+QWEN_EAGER_LOAD = os.getenv("QWEN_EAGER_LOAD", "false").lower() == "true"
+QWEN_WARMUP = os.getenv("QWEN_WARMUP", "true").lower() == "true"
+QWEN_WARMUP_MAX_NEW_TOKENS = int(os.getenv("QWEN_WARMUP_MAX_NEW_TOKENS", "16"))
+# Tiny CPU model with the same interface, for running the service without weights
+QWEN_STAND_IN_MODEL = os.getenv("QWEN_STAND_IN_MODEL", "false").lower() == "true"
+
+# Initialize Qwen3-Omni model (lazily, or at startup with QWEN_EAGER_LOAD)
 model = None
 processor = None
+model_load_lock = asyncio.Lock()
+model_status = {"state": "not_loaded", "load_seconds": None, "load_phases": None, "warmup_seconds": None, "error": None}
+model_load_seconds = metrics_registry.gauge("ai_model_load_seconds", "Time taken to load the model and processor")
+model_load_phase_seconds = metrics_registry.gauge(
+    "ai_model_load_phase_seconds", "Time taken by each model loading phase", ["phase"]
+)
+model_warmup_seconds = metrics_registry.gauge("ai_model_warmup_seconds", "Time taken by the startup warm-up generations")
+model_ready = metrics_registry.gauge("ai_model_ready", "1 once the model is loaded and warmed up")
 
 # Request models
 class InferenceRequest(BaseModel):
@@ -75,13 +118,20 @@ class MultimodalRequest(BaseModel):
     user_id: Optional[str] = None
     speaker: str = "Ethan"  # For audio output
     use_audio_in_video: bool = True
+    # Off by default: text-only requests are batched and reuse cached prompt prefixes
+    return_audio: bool = False
+    audio_format: Literal["wav", "opus"] = "wav"
 
 class QwenConversationRequest(BaseModel):
     messages: List[Dict[str, Any]]
+    conversation_id: Optional[str] = None
     speaker: str = "Ethan"
     use_audio_in_video: bool = True
     max_new_tokens: int = 2048
     temperature: float = 0.7
+    return_audio: bool = False
+    audio_format: Literal["wav", "opus"] = "wav"
+    user_id: Optional[str] = None
 
 # Response models
 class InferenceResponse(BaseModel):
@@ -106,6 +156,46 @@ class HealthResponse(BaseModel):
     memory_usage: Optional[Dict[str, Any]] = None
     timestamp: str
 
+# AI personalities, served on /personalities and used as system prompts
+PERSONALITIES = {
+    "helpful": {
+        "name": "Helpful Radon",
+        "description": "Patient, thorough, and educational assistant",
+        "response_style": "detailed, educational, patient",
+        "tone": "encouraging, supportive, thorough"
+    },
+    "creative": {
+        "name": "Creative Radon",
+        "description": "Imaginative, expressive, and storytelling-focused assistant",
+        "response_style": "imaginative, expressive, storytelling",
+        "tone": "inspiring, artistic, engaging"
+    },
+    "technical": {
+        "name": "Technical Radon",
+        "description": "Precise, efficient, and code-focused assistant",
+        "response_style": "concise, precise, technical",
+        "tone": "professional, direct, efficient"
+    }
+}
+
+def personality_system_prompt(personality: str) -> Optional[str]:
+    info = PERSONALITIES.get(personality)
+    if info is None:
+        return None
+    return (
+        f"You are {info['name']}, a {info['description'].lower()}. "
+        f"Response style: {info['response_style']}. Tone: {info['tone']}."
+    )
+
+# Past key/values of recent conversations and the shared personality prompts
+prefix_cache = PrefixCache()
+# Encodes generated speech and stores it in the file-service
+audio_publisher = AudioPublisher(registry=metrics_registry)
+# Decoded images, audio and video frames keyed by content hash
+media_cache = MediaCache()
+# Exact-match cache of greedy (temperature 0) responses, off unless AI_RESPONSE_CACHE_ENABLED
+response_cache = AIResponseCache(registry=metrics_registry)
+
 # Metrics storage
 metrics = {
     "total_requests": 0,
@@ -115,220 +205,443 @@ metrics = {
     "last_request": None
 }
 
+def record_inference(endpoint: str, processing_time: float, tokens: int):
+    """Update the JSON summary and the Prometheus series after a generation"""
+    metrics["total_requests"] += 1
+    metrics["total_tokens"] += tokens
+    metrics["last_request"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    inference_duration.labels(endpoint).observe(processing_time)
+    inference_tokens.labels(endpoint).inc(tokens)
+
+async def response_cache_key(kind: str, payload: Dict[str, Any], temperature: float) -> Optional[str]:
+    """Cache key for a request, or None when its response must not be cached"""
+    if not response_cache.enabled or not is_deterministic(temperature):
+        return None
+    # Hashes local media files, so keep it off the event loop
+    return await asyncio.to_thread(make_cache_key, kind, payload)
+
+def record_inference_error(endpoint: str):
+    metrics["error_count"] += 1
+    inference_errors.labels(endpoint).inc()
+
+@app.on_event("startup")
+async def startup():
+    await radon_client.start()
+    await audio_publisher.start()
+    inference_scheduler.start()
+    if QWEN_EAGER_LOAD:
+        # In the background, so /health and /ready answer while the model loads
+        app.state.eager_start = asyncio.create_task(eager_start())
+
+@app.on_event("shutdown")
+async def shutdown():
+    await asyncio.to_thread(inference_scheduler.close)
+    await radon_client.close()
+    await audio_publisher.close()
+    media_cache.close()
+
 # Helper functions
+def load_model_weights():
+    """Load the model and processor (blocking; runs on a worker thread)"""
+    if QWEN_STAND_IN_MODEL:
+        from stand_in import load_stand_in
+        
+        logger.info("Loading the CPU stand-in model")
+        return load_stand_in()
+    
+    from transformers import Qwen3OmniMoeForConditionalGeneration, Qwen3OmniMoeProcessor
+    
+    logger.info(f"Loading Qwen3-Omni model: {QWEN_MODEL_PATH}")
+    
+    def load_model(path: str):
+        return Qwen3OmniMoeForConditionalGeneration.from_pretrained(
+            path,
+            dtype="auto",
+            device_map="auto",
+            attn_implementation="flash_attention_2",
+            torch_dtype=torch.bfloat16,
+            use_safetensors=True,
+            low_cpu_mem_usage=True
+        )
+    
+    def load_processor(path: str):
+        loaded_processor = Qwen3OmniMoeProcessor.from_pretrained(path)
+        # Batched generation needs prompts aligned on the right
+        loaded_processor.tokenizer.padding_side = "left"
+        return loaded_processor
+    
+    loaded_model, loaded_processor, phases = load_pretrained(QWEN_MODEL_PATH, load_model, load_processor)
+    model_status["load_phases"] = phases
+    for phase, seconds in phases.items():
+        model_load_phase_seconds.labels(phase).set(seconds)
+    return loaded_model, loaded_processor
+
 async def load_qwen_model():
-    """Load Qwen3-Omni model and processor"""
+    """Load Qwen3-Omni model and processor once; concurrent callers wait for the same load"""
     global model, processor
     
-    if model is None or processor is None:
+    if model is not None and processor is not None:
+        return
+    
+    async with model_load_lock:
+        if model is not None and processor is not None:
+            return
+        
+        model_status["state"] = "loading"
+        start = time.monotonic()
         try:
-            from transformers import Qwen3OmniMoeForConditionalGeneration, Qwen3OmniMoeProcessor
-            from qwen_omni_utils import process_mm_info
-            
-            logger.info(f"Loading Qwen3-Omni model: {QWEN_MODEL_PATH}")
-            
-            model = Qwen3OmniMoeForConditionalGeneration.from_pretrained(
-                QWEN_MODEL_PATH,
-                dtype="auto",
-                device_map="auto",
-                attn_implementation="flash_attention_2",
-                torch_dtype=torch.bfloat16
-            )
-            
-            processor = Qwen3OmniMoeProcessor.from_pretrained(QWEN_MODEL_PATH)
-            
-            logger.info("Qwen3-Omni model loaded successfully")
-            
+            model, processor = await asyncio.to_thread(load_model_weights)
         except Exception as e:
+            model_status["state"] = "failed"
+            model_status["error"] = str(e)
             logger.error(f"Error loading Qwen3-Omni model: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Model loading failed: {str(e)}")
+        
+        model_status["load_seconds"] = round(time.monotonic() - start, 3)
+        model_load_seconds.labels().set(model_status["load_seconds"])
+        model_status["state"] = "loaded"
+        model_status["error"] = None
+        logger.info(f"Qwen3-Omni model loaded in {model_status['load_seconds']}s")
+
+async def warm_up_model():
+    """Run the common request shapes once, so the first users do not pay for
+    kernel selection, compilation and allocator growth"""
+    model_status["state"] = "warming_up"
+    start = time.monotonic()
+    
+    conversation = [{"role": "user", "content": [{"type": "text", "text": "Say hello in one short sentence."}]}]
+    prepared = await prepare_conversation(conversation, use_audio_in_video=False)
+    text_params = GenerationParams("Ethan", QWEN_WARMUP_MAX_NEW_TOKENS, 0.0, False, False)
+    shapes = [
+        # A single text reply, a full text batch, and a spoken reply
+        (1, text_params),
+        (INFERENCE_MAX_BATCH_SIZE, text_params),
+        (1, text_params._replace(return_audio=True))
+    ]
+    for count, params in shapes:
+        shape_start = time.monotonic()
+        await asyncio.gather(*(inference_scheduler.submit(prepared, params) for _ in range(count)))
+        logger.info(
+            f"Warm-up: {count} request(s), audio={params.return_audio} in {time.monotonic() - shape_start:.2f}s"
+        )
+    
+    model_status["warmup_seconds"] = round(time.monotonic() - start, 3)
+    model_warmup_seconds.labels().set(model_status["warmup_seconds"])
 
-async def process_multimodal_input(request: MultimodalRequest) -> Dict[str, Any]:
-    """Process multimodal input for Qwen3-Omni"""
+async def eager_start():
+    """Load and warm up the model at startup; /ready reports ready once both are done"""
     try:
-        from qwen_omni_utils import process_mm_info
-        
-        # Build conversation format
-        content = []
-        
-        if request.image_url:
-            content.append({"type": "image", "image": request.image_url})
-        if request.audio_url:
-            content.append({"type": "audio", "audio": request.audio_url})
-        if request.video_url:
-            content.append({"type": "video", "video": request.video_url})
-        if request.text:
-            content.append({"type": "text", "text": request.text})
-        
-        conversation = [{"role": "user", "content": content}]
-        
-        # Process multimodal info
+        await load_qwen_model()
+        if QWEN_WARMUP:
+            await warm_up_model()
+    except Exception as e:
+        error = e.detail if isinstance(e, HTTPException) else str(e)
+        model_status["state"] = "failed"
+        model_status["error"] = error
+        logger.error(f"Model startup failed: {error}")
+        return
+    model_status["state"] = "ready"
+    model_ready.labels().set(1)
+
+class GenerationParams(NamedTuple):
+    """Generation settings; requests batch together only when these match"""
+    speaker: str
+    max_new_tokens: int
+    temperature: float
+    use_audio_in_video: bool
+    return_audio: bool
+    stream: bool = False
+
+def build_multimodal_conversation(request: MultimodalRequest) -> List[Dict[str, Any]]:
+    """Build the Qwen3-Omni conversation for a single multimodal turn"""
+    content = []
+    
+    if request.image_url:
+        content.append({"type": "image", "image": request.image_url})
+    if request.audio_url:
+        content.append({"type": "audio", "audio": request.audio_url})
+    if request.video_url:
+        content.append({"type": "video", "video": request.video_url})
+    if request.text:
+        content.append({"type": "text", "text": request.text})
+    
+    conversation = [{"role": "user", "content": content}]
+    system_prompt = personality_system_prompt(request.personality)
+    if system_prompt:
+        conversation.insert(0, {"role": "system", "content": [{"type": "text", "text": system_prompt}]})
+    return conversation
+
+async def prepare_conversation(
+    conversation: List[Dict[str, Any]],
+    use_audio_in_video: bool,
+    conversation_id: Optional[str] = None,
+    personality: Optional[str] = None
+) -> Dict[str, Any]:
+    """Load the media through the media cache and render the chat template, off the event loop"""
+    def prepare(audios, images, videos):
         text = processor.apply_chat_template(
-            conversation, 
-            add_generation_prompt=True, 
+            conversation,
+            add_generation_prompt=True,
             tokenize=False
         )
+        prepared = {"text": text, "audios": audios, "images": images, "videos": videos}
         
-        audios, images, videos = process_mm_info(
-            conversation, 
-            use_audio_in_video=request.use_audio_in_video
-        )
-        
-        inputs = processor(
-            text=text,
-            audio=audios,
-            images=images,
-            videos=videos,
-            return_tensors="pt",
-            padding=True,
-            use_audio_in_video=request.use_audio_in_video
-        )
-        
-        inputs = inputs.to(model.device).to(model.dtype)
-        
-        return {
-            "inputs": inputs,
-            "conversation": conversation
-        }
-        
+        # Keys for reusing past key/values; see run_generation_batch
+        if conversation_id:
+            prepared["conversation_key"] = f"conversation:{conversation_id}"
+        if personality and conversation and conversation[0]["role"] == "system":
+            system_text = processor.apply_chat_template(conversation[:1], tokenize=False)
+            tokens = processor.tokenizer(system_text, add_special_tokens=False)["input_ids"]
+            prepared["shared_prefix"] = (personality_key(personality, tokens), tokens)
+        return prepared
+    
+    try:
+        audios, images, videos = await media_cache.process(conversation, use_audio_in_video)
+        return await asyncio.to_thread(prepare, audios, images, videos)
     except Exception as e:
         logger.error(f"Error processing multimodal input: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Input processing failed: {str(e)}")
 
-async def generate_qwen_response(
-    inputs: Dict[str, Any], 
-    speaker: str = "Ethan",
-    max_new_tokens: int = 2048,
-    temperature: float = 0.7,
-    use_audio_in_video: bool = True
-) -> Dict[str, Any]:
-    """Generate response using Qwen3-Omni"""
-    try:
-        # Generate text and audio
+def _batch_media(prepared: List[Dict[str, Any]], kind: str) -> Optional[List[Any]]:
+    """Flatten one media kind across a batch, as the processor expects"""
+    items = [item for request in prepared for item in (request[kind] or [])]
+    return items or None
+
+def run_generation_batch(prepared: List[Dict[str, Any]], params: GenerationParams) -> List[Dict[str, Any]]:
+    """Generate for a batch of prepared requests (runs on the scheduler thread)"""
+    inputs = processor(
+        text=[request["text"] for request in prepared],
+        audio=_batch_media(prepared, "audios"),
+        images=_batch_media(prepared, "images"),
+        videos=_batch_media(prepared, "videos"),
+        return_tensors="pt",
+        padding=True,
+        use_audio_in_video=params.use_audio_in_video
+    )
+    inputs = inputs.to(model.device).to(model.dtype)
+    
+    # Past key/values only carry over for single text-only requests: media
+    # features are not part of the cached tokens, and the talker needs the
+    # thinker's hidden states for the whole prompt
+    reuse_prefix = (
+        len(prepared) == 1
+        and not params.return_audio
+        and not any(prepared[0][kind] for kind in ("audios", "images", "videos"))
+    )
+    prefix_kwargs = {}
+    if reuse_prefix:
+        input_ids = inputs["input_ids"][0].tolist()
+        shared_prefix = prepared[0].get("shared_prefix")
+        past_key_values, _ = prefix_cache.match(
+            input_ids,
+            prepared[0].get("conversation_key"),
+            shared_prefix[0] if shared_prefix else None
+        )
+        if past_key_values is not None:
+            prefix_kwargs["thinker_past_key_values"] = past_key_values
+    
+    stream_kwargs = {}
+    if params.stream:
+        from transformers import StoppingCriteriaList
+        
+        # Streamed requests run alone; the streamer only applies to the thinker's text
+        streamer = prepared[0]["streamer"]
+        stream_kwargs = {
+            "thinker_streamer": streamer,
+            "thinker_stopping_criteria": StoppingCriteriaList([StopOnCancel(streamer)])
+        }
+    
+    with torch.inference_mode():
         text_ids, audio = model.generate(
             **inputs,
-            speaker=speaker,
+            speaker=params.speaker,
             thinker_return_dict_in_generate=True,
-            use_audio_in_video=use_audio_in_video,
-            max_new_tokens=max_new_tokens,
-            temperature=temperature,
-            do_sample=True if temperature > 0 else False
+            use_audio_in_video=params.use_audio_in_video,
+            max_new_tokens=params.max_new_tokens,
+            temperature=params.temperature,
+            do_sample=True if params.temperature > 0 else False,
+            return_audio=params.return_audio,
+            **prefix_kwargs,
+            **stream_kwargs
         )
-        
-        # Decode text
-        text = processor.batch_decode(
-            text_ids.sequences[:, inputs["input_ids"].shape[1]:],
-            skip_special_tokens=True,
-            clean_up_tokenization_spaces=False
-        )[0]
-        
-        # Save audio if generated
-        audio_url = None
-        if audio is not None:
-            audio_filename = f"qwen_audio_{int(time.time())}.wav"
-            audio_path = f"/tmp/{audio_filename}"
-            
-            sf.write(
-                audio_path,
-                audio.reshape(-1).detach().cpu().numpy(),
-                samplerate=24000,
-            )
-            
-            # In production, upload to file service
-            audio_url = f"/api/files/{audio_filename}"
-        
-        return {
-            "text": text,
-            "audio_url": audio_url,
-            "tokens_used": text_ids.sequences.shape[1] - inputs["input_ids"].shape[1]
-        }
-        
+    
+    if reuse_prefix:
+        store_prefixes(prepared[0], text_ids, input_ids)
+    
+    # Prompts are left-padded, so every completion starts at the same column
+    completions = text_ids.sequences[:, inputs["input_ids"].shape[1]:]
+    texts = processor.batch_decode(
+        completions,
+        skip_special_tokens=True,
+        clean_up_tokenization_spaces=False
+    )
+    pad_token_id = processor.tokenizer.pad_token_id
+    token_counts = (completions != pad_token_id).sum(dim=1).tolist() if pad_token_id is not None else [completions.shape[1]] * len(prepared)
+    prompt_counts = inputs["attention_mask"].sum(dim=1).tolist()
+    
+    # Audio requests are never batched; encoding and storage happen off this thread
+    samples = audio.reshape(-1).float().cpu().numpy() if audio is not None else None
+    
+    return [
+        {"text": text, "audio": samples, "tokens_used": int(tokens), "prompt_tokens": int(prompt_tokens)}
+        for text, tokens, prompt_tokens in zip(texts, token_counts, prompt_counts)
+    ]
+
+def store_prefixes(prepared: Dict[str, Any], text_ids, input_ids: List[int]):
+    """Keep the turn's past key/values for the conversation and its system prompt"""
+    past_key_values = getattr(text_ids, "past_key_values", None)
+    if past_key_values is None:
+        return
+    
+    shared_prefix = prepared.get("shared_prefix")
+    if shared_prefix is not None:
+        key, tokens = shared_prefix
+        if not prefix_cache.contains(key) and input_ids[:len(tokens)] == tokens:
+            shared_cache = copy.deepcopy(past_key_values)
+            shared_cache.crop(len(tokens))
+            prefix_cache.store(key, tokens, shared_cache, pinned=True)
+    
+    conversation_key = prepared.get("conversation_key")
+    if conversation_key:
+        sequence = text_ids.sequences[0].tolist()[:past_key_values.get_seq_length()]
+        prefix_cache.store(conversation_key, sequence, past_key_values)
+
+def generation_batch_limit(params: GenerationParams) -> int:
+    # The talker produces one waveform per call and streamers follow a single sequence
+    return 1 if params.return_audio or params.stream else INFERENCE_MAX_BATCH_SIZE
+
+inference_scheduler = InferenceScheduler(
+    run_generation_batch,
+    batch_limit=generation_batch_limit,
+    registry=metrics_registry
+)
+
+async def generate_qwen_response(
+    prepared: Dict[str, Any],
+    params: GenerationParams,
+    audio_format: str = "wav",
+    user_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Generate a response through the batching scheduler and store its audio"""
+    try:
+        result = dict(await inference_scheduler.submit(prepared, params))
+        samples = result.pop("audio")
+        result["audio_url"] = await audio_publisher.publish(samples, audio_format, user_id) if samples is not None else None
+        return result
+    except SchedulerBusy:
+        raise HTTPException(status_code=503, detail="Model is busy, please retry", headers={"Retry-After": "5"})
     except Exception as e:
         logger.error(f"Error generating Qwen response: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
 
-async def call_radon_api(request_data: Dict[str, Any], stream: bool = False) -> Dict[str, Any]:
-    """Call Radon AI API with retry logic"""
-    max_retries = 3
-    retry_delay = 1.0
+async def cached_qwen_response(
+    conversation: List[Dict[str, Any]],
+    params: GenerationParams,
+    prepare: Callable[[], Awaitable[Dict[str, Any]]],
+    audio_format: str = "wav",
+    user_id: Optional[str] = None
+) -> Tuple[Dict[str, Any], bool]:
+    """Response from the response cache, or prepare the conversation and generate it"""
+    cache_key = None
+    # Stored audio belongs to the user who asked for it, so only text responses are cached
+    if not params.return_audio:
+        cache_key = await response_cache_key(
+            "qwen",
+            {"model": QWEN_MODEL_PATH, "conversation": conversation, "params": params._asdict()},
+            params.temperature
+        )
     
-    for attempt in range(max_retries):
-        try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                headers = {
-                    "Content-Type": "application/json",
-                    "User-Agent": "Radon-AI-Service/2.0.0"
-                }
-                
-                if RADON_API_KEY:
-                    headers["Authorization"] = f"Bearer {RADON_API_KEY}"
-                
-                if stream:
-                    # For streaming, we'll handle it differently
-                    response = await client.post(
-                        f"{RADON_API_URL}/chat/stream",
-                        json=request_data,
-                        headers=headers
-                    )
-                else:
-                    response = await client.post(
-                        f"{RADON_API_URL}/chat",
-                        json=request_data,
-                        headers=headers
-                    )
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    logger.error(f"Radon API error: {response.status_code} - {response.text}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        raise HTTPException(status_code=response.status_code, detail="Radon API error")
-                        
-        except httpx.TimeoutException:
-            logger.error(f"Timeout calling Radon API (attempt {attempt + 1})")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(retry_delay * (2 ** attempt))
-                continue
-            else:
-                raise HTTPException(status_code=504, detail="Radon API timeout")
-                
-        except Exception as e:
-            logger.error(f"Error calling Radon API: {str(e)}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(retry_delay * (2 ** attempt))
-                continue
-            else:
-                raise HTTPException(status_code=500, detail="Internal server error")
+    async def generate():
+        return await generate_qwen_response(await prepare(), params, audio_format, user_id)
+    
+    return await response_cache.get_or_compute(cache_key, generate)
+
+async def stream_qwen_response(
+    endpoint: str,
+    prepared: Dict[str, Any],
+    params: GenerationParams,
+    audio_format: str = "wav",
+    user_id: Optional[str] = None
+):
+    """SSE events for a local generation: token text as it is decoded, audio chunks, then usage"""
+    start_time = time.time()
+    loop = asyncio.get_running_loop()
+    streamer = AsyncTextStreamer(processor.tokenizer, loop)
+    generation = asyncio.ensure_future(
+        inference_scheduler.submit({**prepared, "streamer": streamer}, params._replace(stream=True))
+    )
+    # Ends the token loop below if the job fails or is rejected before streaming
+    generation.add_done_callback(lambda _: streamer.finish())
+    
+    first_token_at = None
+    try:
+        async for text in streamer:
+            if first_token_at is None:
+                first_token_at = time.time()
+                time_to_first_token.labels(endpoint).observe(first_token_at - start_time)
+            yield sse_event({"type": "token", "text": text})
+        
+        result = dict(await generation)
+        samples = result.pop("audio")
+        if samples is not None:
+            async for event in audio_publisher.stream(samples, audio_format, user_id, result):
+                yield sse_event(event)
+        processing_time = time.time() - start_time
+        record_inference(endpoint, processing_time, result["tokens_used"])
+        yield sse_event({
+            "type": "done",
+            "usage": {
+                "prompt_tokens": result["prompt_tokens"],
+                "completion_tokens": result["tokens_used"],
+                "total_tokens": result["prompt_tokens"] + result["tokens_used"]
+            },
+            "audio_url": result.get("audio_url"),
+            "time_to_first_token": round(first_token_at - start_time, 4) if first_token_at else None,
+            "processing_time": processing_time
+        })
+    except SchedulerBusy:
+        record_inference_error(endpoint)
+        yield sse_event({"type": "error", "detail": "Model is busy, please retry"})
+    except Exception as e:
+        record_inference_error(endpoint)
+        logger.error(f"Streaming generation error: {str(e)}")
+        yield sse_event({"type": "error", "detail": "Generation failed"})
+    finally:
+        # Client gone or stream done: stop the generation at the next token
+        streamer.cancel()
+        if not generation.done():
+            generation.cancel()
+
+async def call_radon_api(request_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Call Radon AI API through the pooled client and its retry policy"""
+    # Without a conversation Radon keeps no state, so a repeated call is harmless
+    idempotent = not request_data.get("conversation_id")
+    try:
+        response = await radon_client.post("/chat", request_data, idempotent=idempotent)
+    except httpx.TimeoutException:
+        logger.error("Timeout calling Radon API")
+        raise HTTPException(status_code=504, detail="Radon API timeout")
+    except httpx.HTTPError as e:
+        logger.error(f"Error calling Radon API: {str(e)}")
+        raise HTTPException(status_code=502, detail="Radon API unavailable")
+    
+    if response.status_code != 200:
+        logger.error(f"Radon API error: {response.status_code} - {response.text}")
+        raise HTTPException(status_code=response.status_code, detail="Radon API error")
+    return response.json()
 
 async def stream_radon_response(request_data: Dict[str, Any]):
     """Stream response from Radon AI API"""
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            headers = {
-                "Content-Type": "application/json",
-                "User-Agent": "Radon-AI-Service/2.0.0"
-            }
+        async with radon_client.stream("/chat/stream", request_data) as response:
+            if response.status_code != 200:
+                yield f"data: {json.dumps({'error': 'Radon API error'})}\n\n"
+                return
             
-            if RADON_API_KEY:
-                headers["Authorization"] = f"Bearer {RADON_API_KEY}"
-            
-            async with client.stream(
-                "POST",
-                f"{RADON_API_URL}/chat/stream",
-                json=request_data,
-                headers=headers
-            ) as response:
-                if response.status_code != 200:
-                    yield f"data: {json.dumps({'error': 'Radon API error'})}\n\n"
-                    return
-                
-                async for chunk in response.aiter_lines():
-                    if chunk:
-                        yield f"data: {chunk}\n\n"
-                        
+            async for chunk in response.aiter_lines():
+                if chunk:
+                    yield f"data: {chunk}\n\n"
+                    
     except Exception as e:
         logger.error(f"Error streaming from Radon API: {str(e)}")
         yield f"data: {json.dumps({'error': 'Streaming error'})}\n\n"
@@ -336,28 +649,7 @@ async def stream_radon_response(request_data: Dict[str, Any]):
 @app.get("/personalities")
 async def get_personalities():
     """Get available AI personalities"""
-    return {
-        "personalities": {
-            "helpful": {
-                "name": "Helpful Radon",
-                "description": "Patient, thorough, and educational assistant",
-                "response_style": "detailed, educational, patient",
-                "tone": "encouraging, supportive, thorough"
-            },
-            "creative": {
-                "name": "Creative Radon",
-                "description": "Imaginative, expressive, and storytelling-focused assistant",
-                "response_style": "imaginative, expressive, storytelling",
-                "tone": "inspiring, artistic, engaging"
-            },
-            "technical": {
-                "name": "Technical Radon",
-                "description": "Precise, efficient, and code-focused assistant",
-                "response_style": "concise, precise, technical",
-                "tone": "professional, direct, efficient"
-            }
-        }
-    }
+    return {"personalities": PERSONALITIES}
 
 @app.get("/functions")
 async def get_functions():
@@ -480,13 +772,8 @@ async def get_functions():
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
-    try:
-        # Check if Radon API is accessible
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{RADON_API_URL}/health")
-            radon_healthy = response.status_code == 200
-    except:
-        radon_healthy = False
+    # Check if Radon API is accessible
+    radon_healthy = await radon_client.healthy()
     
     # Check Qwen3-Omni model status
     qwen_loaded = model is not None and processor is not None
@@ -511,12 +798,31 @@ async def health_check():
         timestamp=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
     )
 
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: with QWEN_EAGER_LOAD, not ready until the model is loaded and warmed up"""
+    ready = model_status["state"] == "ready" or not QWEN_EAGER_LOAD
+    return ORJSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "model": model_status}
+    )
+
 @app.get("/metrics")
-async def get_metrics():
-    """Get service metrics"""
+async def get_metrics(request: Request):
+    """Prometheus histograms, or the JSON summary for `Accept: application/json`"""
+    if not prefers_json(request):
+        return prometheus_response(metrics_registry)
+    metrics["average_latency"] = inference_duration.mean()
     return {
         "service": "ai-service",
         "metrics": metrics,
+        "model": model_status,
+        "scheduler": inference_scheduler.snapshot(),
+        "prefix_cache": prefix_cache.snapshot(),
+        "response_cache": response_cache.snapshot(),
+        "radon_client": radon_client.snapshot(),
+        "media_cache": media_cache.snapshot(),
+        "audio": audio_publisher.snapshot(),
         "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
     }
 
@@ -543,15 +849,29 @@ async def chat(request: InferenceRequest):
         if request.audio_url:
             request_data["audio_url"] = request.audio_url
         
-        # Call Radon API
-        response = await call_radon_api(request_data)
+        # Call Radon API. A conversation carries server-side history, so only
+        # stateless calls are cached; user_id does not change the answer.
+        cache_key = None
+        if not request.conversation_id:
+            cache_key = await response_cache_key(
+                "radon_chat",
+                {"model": RADON_MODEL, **{k: v for k, v in request_data.items() if k != "user_id"}},
+                request.temperature
+            )
+        fresh = {}
+
+        async def call_uncached():
+            fresh.update(await call_radon_api(request_data))
+            # The conversation Radon opened belongs to this caller only, so it is not stored
+            return {k: v for k, v in fresh.items() if k != "conversation_id"}
+
+        response, cached = await response_cache.get_or_compute(cache_key, call_uncached)
+        if not cached:
+            response = fresh
         
         # Update metrics
         processing_time = time.time() - start_time
-        metrics["total_requests"] += 1
-        metrics["total_tokens"] += response.get("tokens_used", 0)
-        metrics["average_latency"] = (metrics["average_latency"] + processing_time) / 2
-        metrics["last_request"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        record_inference("chat", processing_time, 0 if cached else response.get("tokens_used") or 0)
         
         return InferenceResponse(
             response=response.get("response", ""),
@@ -561,9 +881,13 @@ async def chat(request: InferenceRequest):
             tokens_used=response.get("tokens_used"),
             processing_time=processing_time
         )
-        
+
+    except HTTPException:
+        # 502/504 from call_radon_api keep their status
+        record_inference_error("chat")
+        raise
     except Exception as e:
-        metrics["error_count"] += 1
+        record_inference_error("chat")
         logger.error(f"Inference error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -603,7 +927,7 @@ async def chat_stream(request: InferenceRequest):
         )
         
     except Exception as e:
-        metrics["error_count"] += 1
+        record_inference_error("chat_stream")
         logger.error(f"Streaming inference error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -616,24 +940,30 @@ async def multimodal_inference(request: MultimodalRequest):
         # Load Qwen3-Omni model if not loaded
         await load_qwen_model()
         
-        # Process multimodal input
-        processed_input = await process_multimodal_input(request)
-        
-        # Generate response
-        qwen_response = await generate_qwen_response(
-            processed_input["inputs"],
-            speaker=request.speaker,
-            max_new_tokens=request.max_new_tokens,
-            temperature=request.temperature,
-            use_audio_in_video=request.use_audio_in_video
+        # Process multimodal input and generate, unless the response is cached
+        conversation = build_multimodal_conversation(request)
+        qwen_response, cached = await cached_qwen_response(
+            conversation,
+            GenerationParams(
+                request.speaker,
+                request.max_new_tokens,
+                request.temperature,
+                request.use_audio_in_video,
+                request.return_audio
+            ),
+            lambda: prepare_conversation(
+                conversation,
+                request.use_audio_in_video,
+                conversation_id=request.conversation_id,
+                personality=request.personality
+            ),
+            request.audio_format,
+            request.user_id
         )
         
         # Update metrics
         processing_time = time.time() - start_time
-        metrics["total_requests"] += 1
-        metrics["total_tokens"] += qwen_response.get("tokens_used", 0)
-        metrics["average_latency"] = (metrics["average_latency"] + processing_time) / 2
-        metrics["last_request"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        record_inference("multimodal", processing_time, 0 if cached else qwen_response.get("tokens_used") or 0)
         
         return InferenceResponse(
             response=qwen_response["text"],
@@ -645,8 +975,11 @@ async def multimodal_inference(request: MultimodalRequest):
             audio_url=qwen_response.get("audio_url")
         )
         
+    except HTTPException:
+        record_inference_error("multimodal")
+        raise
     except Exception as e:
-        metrics["error_count"] += 1
+        record_inference_error("multimodal")
         logger.error(f"Multimodal inference error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -659,47 +992,24 @@ async def qwen_conversation(request: QwenConversationRequest):
         # Load Qwen3-Omni model if not loaded
         await load_qwen_model()
         
-        # Process conversation
-        from qwen_omni_utils import process_mm_info
-        
-        text = processor.apply_chat_template(
+        # Process conversation and generate, unless the response is cached
+        qwen_response, cached = await cached_qwen_response(
             request.messages,
-            add_generation_prompt=True,
-            tokenize=False
-        )
-        
-        audios, images, videos = process_mm_info(
-            request.messages,
-            use_audio_in_video=request.use_audio_in_video
-        )
-        
-        inputs = processor(
-            text=text,
-            audio=audios,
-            images=images,
-            videos=videos,
-            return_tensors="pt",
-            padding=True,
-            use_audio_in_video=request.use_audio_in_video
-        )
-        
-        inputs = inputs.to(model.device).to(model.dtype)
-        
-        # Generate response
-        qwen_response = await generate_qwen_response(
-            inputs,
-            speaker=request.speaker,
-            max_new_tokens=request.max_new_tokens,
-            temperature=request.temperature,
-            use_audio_in_video=request.use_audio_in_video
+            GenerationParams(
+                request.speaker,
+                request.max_new_tokens,
+                request.temperature,
+                request.use_audio_in_video,
+                request.return_audio
+            ),
+            lambda: prepare_conversation(request.messages, request.use_audio_in_video, conversation_id=request.conversation_id),
+            request.audio_format,
+            request.user_id
         )
         
         # Update metrics
         processing_time = time.time() - start_time
-        metrics["total_requests"] += 1
-        metrics["total_tokens"] += qwen_response.get("tokens_used", 0)
-        metrics["average_latency"] = (metrics["average_latency"] + processing_time) / 2
-        metrics["last_request"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        record_inference("qwen_conversation", processing_time, 0 if cached else qwen_response.get("tokens_used") or 0)
         
         return QwenResponse(
             text=qwen_response["text"],
@@ -708,14 +1018,78 @@ async def qwen_conversation(request: QwenConversationRequest):
             tokens_used=qwen_response.get("tokens_used")
         )
         
+    except HTTPException:
+        record_inference_error("qwen_conversation")
+        raise
     except Exception as e:
-        metrics["error_count"] += 1
+        record_inference_error("qwen_conversation")
         logger.error(f"Qwen conversation error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/qwen/upload")
+@app.post("/multimodal/stream")
+async def multimodal_stream(request: MultimodalRequest):
+    """Stream a multimodal Qwen3-Omni response as server-sent events"""
+    await load_qwen_model()
+    prepared = await prepare_conversation(
+        build_multimodal_conversation(request),
+        request.use_audio_in_video,
+        conversation_id=request.conversation_id,
+        personality=request.personality
+    )
+    params = GenerationParams(
+        request.speaker,
+        request.max_new_tokens,
+        request.temperature,
+        request.use_audio_in_video,
+        request.return_audio
+    )
+    return StreamingResponse(
+        stream_qwen_response("multimodal_stream", prepared, params, request.audio_format, request.user_id),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@app.post("/qwen/conversation/stream")
+async def qwen_conversation_stream(request: QwenConversationRequest):
+    """Stream a Qwen3-Omni conversation turn as server-sent events"""
+    await load_qwen_model()
+    prepared = await prepare_conversation(request.messages, request.use_audio_in_video, conversation_id=request.conversation_id)
+    params = GenerationParams(
+        request.speaker,
+        request.max_new_tokens,
+        request.temperature,
+        request.use_audio_in_video,
+        request.return_audio
+    )
+    return StreamingResponse(
+        stream_qwen_response("qwen_conversation_stream", prepared, params, request.audio_format, request.user_id),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+# The body is parsed by spool_multipart as it streams in, not by FastAPI
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                    "text": {"type": "string"},
+                    "speaker": {"type": "string"},
+                    "max_new_tokens": {"type": "integer"},
+                    "temperature": {"type": "number"}
+                },
+                "required": ["files"]
+            }
+        }
+    }
+}
+
+@app.post("/qwen/upload", openapi_extra={"requestBody": UPLOAD_REQUEST_BODY})
 async def upload_multimodal_files(
-    files: List[UploadFile] = File(...),
+    request: Request,
     text: Optional[str] = None,
     speaker: str = "Ethan",
     max_new_tokens: int = 2048,
@@ -723,38 +1097,33 @@ async def upload_multimodal_files(
 ):
     """Upload files and process with Qwen3-Omni"""
     start_time = time.time()
+    paths = []
     
     try:
-        # Load Qwen3-Omni model if not loaded
-        await load_qwen_model()
-        
-        # Process uploaded files
-        content = []
+        try:
+            # A declared oversized body is refused before any of it is read
+            check_content_length(request.headers.get("content-length"))
+            
+            # Load Qwen3-Omni model if not loaded
+            await load_qwen_model()
+            
+            # Stream the supported uploads into private temp files, bytes unchanged
+            spooled, fields = await spool_multipart(request.headers.get("content-type", ""), request.stream())
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except InvalidUpload as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        paths = [file.path for file in spooled]
+        content = [{"type": file.kind, file.kind: file.path} for file in spooled]
         
-        for file in files:
-            if file.content_type.startswith("image/"):
-                # Save image temporarily
-                image_data = await file.read()
-                image = Image.open(io.BytesIO(image_data))
-                image_path = f"/tmp/{file.filename}"
-                image.save(image_path)
-                content.append({"type": "image", "image": image_path})
-                
-            elif file.content_type.startswith("audio/"):
-                # Save audio temporarily
-                audio_data = await file.read()
-                audio_path = f"/tmp/{file.filename}"
-                with open(audio_path, "wb") as f:
-                    f.write(audio_data)
-                content.append({"type": "audio", "audio": audio_path})
-                
-            elif file.content_type.startswith("video/"):
-                # Save video temporarily
-                video_data = await file.read()
-                video_path = f"/tmp/{file.filename}"
-                with open(video_path, "wb") as f:
-                    f.write(video_data)
-                content.append({"type": "video", "video": video_path})
+        # Form fields take precedence over the query parameters
+        try:
+            text = fields.get("text", text)
+            speaker = fields.get("speaker", speaker)
+            max_new_tokens = int(fields.get("max_new_tokens", max_new_tokens))
+            temperature = float(fields.get("temperature", temperature))
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid form field: {str(e)}")
         
         if text:
             content.append({"type": "text", "text": text})
@@ -762,43 +1131,17 @@ async def upload_multimodal_files(
         conversation = [{"role": "user", "content": content}]
         
         # Process with Qwen3-Omni
-        from qwen_omni_utils import process_mm_info
-        
-        text_template = processor.apply_chat_template(
-            conversation,
-            add_generation_prompt=True,
-            tokenize=False
-        )
-        
-        audios, images, videos = process_mm_info(conversation, use_audio_in_video=True)
-        
-        inputs = processor(
-            text=text_template,
-            audio=audios,
-            images=images,
-            videos=videos,
-            return_tensors="pt",
-            padding=True,
-            use_audio_in_video=True
-        )
-        
-        inputs = inputs.to(model.device).to(model.dtype)
+        prepared = await prepare_conversation(conversation, use_audio_in_video=True)
         
         # Generate response
         qwen_response = await generate_qwen_response(
-            inputs,
-            speaker=speaker,
-            max_new_tokens=max_new_tokens,
-            temperature=temperature,
-            use_audio_in_video=True
+            prepared,
+            GenerationParams(speaker, max_new_tokens, temperature, True, True)
         )
         
         # Update metrics
         processing_time = time.time() - start_time
-        metrics["total_requests"] += 1
-        metrics["total_tokens"] += qwen_response.get("tokens_used", 0)
-        metrics["average_latency"] = (metrics["average_latency"] + processing_time) / 2
-        metrics["last_request"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        record_inference("qwen_upload", processing_time, qwen_response.get("tokens_used") or 0)
         
         return QwenResponse(
             text=qwen_response["text"],
@@ -807,10 +1150,15 @@ async def upload_multimodal_files(
             tokens_used=qwen_response.get("tokens_used")
         )
         
+    except HTTPException:
+        record_inference_error("qwen_upload")
+        raise
     except Exception as e:
-        metrics["error_count"] += 1
+        record_inference_error("qwen_upload")
         logger.error(f"File upload processing error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await asyncio.to_thread(remove_files, paths)
 
 @app.get("/")
 async def root():
@@ -822,6 +1170,8 @@ async def root():
             "/inference",
             "/inference/stream",
             "/multimodal",
+            "/multimodal/stream",
+            "/qwen/conversation/stream",
             "/health",
             "/metrics"
         ]
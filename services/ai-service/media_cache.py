@@ -0,0 +1,361 @@
+"""Content-addressed cache of decoded media for Qwen3-Omni prompts.
+
+`process_mm_info` downloads and decodes every image, audio clip and video
+of a conversation. In a chat, the same media come back on every follow-up
+turn. Here each media item is decoded on its own and the result is cached
+under a hash of the media bytes and the item's decode options: resized
+images, resampled audio arrays and sampled video frames.
+
+Two tiers, both bounded in bytes with LRU eviction:
+- memory (MEDIA_CACHE_MAX_BYTES);
+- optionally disk (MEDIA_CACHE_DIR), one .npy file per array. Large
+  arrays are memory-mapped on load, so a hit from disk only reads the
+  pages the processor touches.
+
+Items are downloaded, hashed and decoded on a dedicated thread pool. A
+remote URL is fetched once to hash it. The URL's hash is then remembered
+for MEDIA_CACHE_URL_TTL seconds, so repeated turns skip the download too.
+"""
+import os
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+import numpy as np
+import torch
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR")
+MEDIA_CACHE_DISK_MAX_BYTES = int(os.getenv("MEDIA_CACHE_DISK_MAX_BYTES", str(20 * 1024 ** 3)))
+# Arrays at least this large are memory-mapped when read from disk
+MEDIA_CACHE_MMAP_MIN_BYTES = int(os.getenv("MEDIA_CACHE_MMAP_MIN_BYTES", str(1024 * 1024)))
+MEDIA_CACHE_URL_TTL = float(os.getenv("MEDIA_CACHE_URL_TTL", "300"))
+MEDIA_DECODE_WORKERS = int(os.getenv("MEDIA_DECODE_WORKERS", "4"))
+MEDIA_DOWNLOAD_TIMEOUT = float(os.getenv("MEDIA_DOWNLOAD_TIMEOUT", "30"))
+
+# Keys holding the media reference of a content item, and the kind they decode to
+MEDIA_KEYS = {"image": "image", "image_url": "image", "audio": "audio", "audio_url": "audio", "video": "video"}
+KINDS = ("audio", "image", "video")
+
+
+class DecodedMedia(NamedTuple):
+    """What one content item contributes to process_mm_info's (audios, images, videos)"""
+    audios: List[Any]
+    images: List[Any]
+    videos: List[Any]
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    return 0
+
+
+def _media_reference(item: Dict[str, Any]) -> Optional[Tuple[str, Any]]:
+    for key in MEDIA_KEYS:
+        if key in item:
+            return key, item[key]
+    return None
+
+
+def media_items(conversation: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Media content items in the order process_mm_info visits them"""
+    items = []
+    for message in conversation:
+        content = message.get("content")
+        if isinstance(content, list):
+            items.extend(item for item in content if isinstance(item, dict) and _media_reference(item))
+    return items
+
+
+class MediaCache:
+    """Decoded media keyed by content hash, in memory and optionally on disk"""
+
+    def __init__(
+        self,
+        max_bytes: int = MEDIA_CACHE_MAX_BYTES,
+        disk_dir: Optional[str] = MEDIA_CACHE_DIR,
+        disk_max_bytes: int = MEDIA_CACHE_DISK_MAX_BYTES,
+        workers: int = MEDIA_DECODE_WORKERS
+    ):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.entries: "OrderedDict[str, Tuple[DecodedMedia, int]]" = OrderedDict()
+        self.size_bytes = 0
+        # Remote URL -> (content hash, expiry)
+        self.url_hashes: Dict[str, Tuple[str, float]] = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="media-decode")
+        self.http = httpx.Client(timeout=MEDIA_DOWNLOAD_TIMEOUT, follow_redirects=True)
+        self.stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "uncacheable": 0,
+            "downloads": 0,
+            "evictions": 0,
+            "decode_seconds": 0.0
+        }
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    async def process(self, conversation: List[Dict[str, Any]], use_audio_in_video: bool) -> Tuple[Any, Any, Any]:
+        """Drop-in for process_mm_info: (audios, images, videos), each None when empty"""
+        loop = asyncio.get_running_loop()
+        decoded = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, self.load, item, use_audio_in_video)
+            for item in media_items(conversation)
+        ))
+        audios = [audio for media in decoded for audio in media.audios]
+        images = [image for media in decoded for image in media.images]
+        videos = [video for media in decoded for video in media.videos]
+        return audios or None, images or None, videos or None
+
+    def load(self, item: Dict[str, Any], use_audio_in_video: bool) -> DecodedMedia:
+        """Decoded media for one content item (runs on the decode pool)"""
+        key_name, reference = _media_reference(item)
+        if not isinstance(reference, str):
+            # Frame lists and in-memory images have no bytes to address
+            self.stats["uncacheable"] += 1
+            return self._decode(item, use_audio_in_video)
+
+        downloaded = None
+        try:
+            content_hash = self._cached_url_hash(reference)
+            if content_hash is None:
+                content_hash, downloaded = self._hash_reference(reference)
+            options = {k: v for k, v in item.items() if k != key_name}
+            key = hashlib.sha256(json.dumps(
+                [content_hash, MEDIA_KEYS[key_name], options, use_audio_in_video],
+                sort_keys=True,
+                default=str
+            ).encode()).hexdigest()
+
+            media = self._get(key)
+            if media is not None:
+                return media
+
+            if downloaded is None and self._is_remote(reference):
+                # The URL's hash was remembered, but its bytes were not kept
+                content_hash, downloaded = self._hash_reference(reference)
+            self.stats["misses"] += 1
+            source = {**item, key_name: downloaded} if downloaded else item
+            media = self._decode(source, use_audio_in_video)
+            self._put(key, media)
+            if self.disk_dir:
+                self._write_disk(key, media)
+            return media
+        finally:
+            if downloaded:
+                try:
+                    os.remove(downloaded)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _is_remote(reference: str) -> bool:
+        return reference.startswith(("http://", "https://"))
+
+    def _cached_url_hash(self, reference: str) -> Optional[str]:
+        if not self._is_remote(reference):
+            return None
+        with self.lock:
+            cached = self.url_hashes.get(reference)
+            if cached is None or cached[1] <= time.time():
+                return None
+            return cached[0]
+
+    def _hash_reference(self, reference: str) -> Tuple[str, Optional[str]]:
+        """Content hash of a media reference, and the temp file holding a downloaded one"""
+        digest = hashlib.sha256()
+        if reference.startswith("data:"):
+            digest.update(base64.b64decode(reference.partition(",")[2]))
+            return digest.hexdigest(), None
+
+        if self._is_remote(reference):
+            self.stats["downloads"] += 1
+            suffix = os.path.splitext(urlparse(reference).path)[1]
+            fd, path = tempfile.mkstemp(prefix="media_", suffix=suffix)
+            try:
+                with os.fdopen(fd, "wb") as f, self.http.stream("GET", reference) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_bytes():
+                        digest.update(chunk)
+                        f.write(chunk)
+            except Exception:
+                os.remove(path)
+                raise
+            content_hash = digest.hexdigest()
+            with self.lock:
+                now = time.time()
+                if len(self.url_hashes) > 10000:
+                    self.url_hashes = {url: entry for url, entry in self.url_hashes.items() if entry[1] > now}
+                self.url_hashes[reference] = (content_hash, now + MEDIA_CACHE_URL_TTL)
+            return content_hash, path
+
+        path = reference[len("file://"):] if reference.startswith("file://") else reference
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest(), None
+
+    def _decode(self, item: Dict[str, Any], use_audio_in_video: bool) -> DecodedMedia:
+        from qwen_omni_utils import process_mm_info
+
+        start = time.monotonic()
+        audios, images, videos = process_mm_info(
+            [{"role": "user", "content": [item]}],
+            use_audio_in_video=use_audio_in_video
+        )
+        self.stats["decode_seconds"] += time.monotonic() - start
+        return DecodedMedia(list(audios or []), list(images or []), list(videos or []))
+
+    def _get(self, key: str) -> Optional[DecodedMedia]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+        if self.disk_dir:
+            media = self._read_disk(key)
+            if media is not None:
+                self.stats["hits"] += 1
+                self.stats["disk_hits"] += 1
+                self._put(key, media)
+                return media
+        return None
+
+    def _put(self, key: str, media: DecodedMedia):
+        nbytes = sum(_nbytes(value) for values in media for value in values)
+        with self.lock:
+            if nbytes > self.max_bytes:
+                return
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= previous[1]
+            self.entries[key] = (media, nbytes)
+            self.size_bytes += nbytes
+            while self.size_bytes > self.max_bytes and self.entries:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size_bytes -= evicted
+                self.stats["evictions"] += 1
+
+    def _manifest_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _array_path(self, key: str, kind: str, index: int) -> str:
+        return os.path.join(self.disk_dir, f"{key}-{kind}{index}.npy")
+
+    def _write_disk(self, key: str, media: DecodedMedia):
+        manifest = {}
+        try:
+            for kind, values in zip(KINDS, media):
+                manifest[kind] = []
+                for index, value in enumerate(values):
+                    if isinstance(value, Image.Image):
+                        array, form = np.asarray(value), {"type": "image", "mode": value.mode}
+                    elif isinstance(value, torch.Tensor):
+                        array, form = value.detach().cpu().numpy(), {"type": "tensor"}
+                    else:
+                        array, form = np.asarray(value), {"type": "array"}
+                    np.save(self._array_path(key, kind, index), array, allow_pickle=False)
+                    manifest[kind].append(form)
+            # The manifest goes last: an entry without one is incomplete
+            temp_path = f"{self._manifest_path(key)}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(manifest, f)
+            os.replace(temp_path, self._manifest_path(key))
+            self._trim_disk()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not persist decoded media {key}: {str(e)}")
+
+    def _read_disk(self, key: str) -> Optional[DecodedMedia]:
+        try:
+            with open(self._manifest_path(key)) as f:
+                manifest = json.load(f)
+            # Reading counts as use for the disk tier's LRU
+            os.utime(self._manifest_path(key))
+            values = {}
+            for kind in KINDS:
+                values[kind] = []
+                for index, form in enumerate(manifest[kind]):
+                    path = self._array_path(key, kind, index)
+                    # Copy-on-write maps: readers share the page cache, writers get private pages
+                    mmap_mode = "c" if os.path.getsize(path) >= MEDIA_CACHE_MMAP_MIN_BYTES else None
+                    array = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+                    if form["type"] == "image":
+                        values[kind].append(Image.fromarray(np.asarray(array), mode=form["mode"]))
+                    elif form["type"] == "tensor":
+                        values[kind].append(torch.from_numpy(array))
+                    else:
+                        values[kind].append(array)
+            return DecodedMedia(values["audio"], values["image"], values["video"])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Dropping unreadable decoded media {key}: {str(e)}")
+            self._remove_disk_entry(key)
+            return None
+
+    def _remove_disk_entry(self, key: str):
+        with os.scandir(self.disk_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith(key):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def _trim_disk(self):
+        """Drop least recently used entries once the disk tier is over budget"""
+        sizes: Dict[str, int] = {}
+        used: Dict[str, float] = {}
+        with os.scandir(self.disk_dir) as entries:
+            for entry in entries:
+                key = entry.name[:64]
+                stat = entry.stat()
+                sizes[key] = sizes.get(key, 0) + stat.st_size
+                if entry.name.endswith(".json"):
+                    used[key] = stat.st_mtime
+        total = sum(sizes.values())
+        if total <= self.disk_max_bytes:
+            return
+        # Arrays without a manifest are incomplete writes; they sort first
+        for key in sorted(sizes, key=lambda k: used.get(k, 0.0)):
+            self._remove_disk_entry(key)
+            total -= sizes[key]
+            if total <= self.disk_max_bytes:
+                break
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.http.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "decode_seconds": round(self.stats["decode_seconds"], 3),
+            "entries": len(self.entries),
+            "size_bytes": self.size_bytes,
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0
+        }
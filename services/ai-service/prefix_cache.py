@@ -0,0 +1,147 @@
+"""Reuse of the thinker's key/value cache across conversation turns.
+
+After a turn, the past key/values of prompt + answer are kept under the
+conversation id. The next turn's prompt usually starts with the same
+tokens, so prefill only has to run over the tokens after the longest
+common prefix. A prefix shorter than PREFIX_CACHE_MIN_REUSE_TOKENS is not
+worth it and the request runs a full prefill instead.
+
+Each personality's system prompt is cached once under a hash of its tokens
+and shared by every user; those entries are pinned and copied on use.
+Conversation entries are handed over to the request that uses them, since
+their next version is stored when it finishes. Memory is bounded by
+PREFIX_CACHE_MAX_BYTES with LRU eviction.
+"""
+import os
+import copy
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PREFIX_CACHE_MAX_BYTES = int(os.getenv("PREFIX_CACHE_MAX_BYTES", str(4 * 1024 ** 3)))
+PREFIX_CACHE_MIN_REUSE_TOKENS = int(os.getenv("PREFIX_CACHE_MIN_REUSE_TOKENS", "32"))
+
+
+class PrefixEntry(NamedTuple):
+    tokens: List[int]
+    cache: Any
+    nbytes: int
+    pinned: bool
+
+
+def cache_nbytes(cache) -> int:
+    """Bytes held by a transformers Cache of key/value tensors"""
+    return sum(tensor.numel() * tensor.element_size() for layer in cache.to_legacy_cache() for tensor in layer)
+
+
+def common_prefix_length(a: List[int], b: List[int]) -> int:
+    length = min(len(a), len(b))
+    for i in range(length):
+        if a[i] != b[i]:
+            return i
+    return length
+
+
+def personality_key(personality: str, tokens: List[int]) -> str:
+    """Key for a shared system prompt; changes whenever its tokens do"""
+    digest = hashlib.sha256(",".join(map(str, tokens)).encode()).hexdigest()[:16]
+    return f"personality:{personality}:{digest}"
+
+
+class PrefixCache:
+    """LRU of past key/values keyed by conversation or shared prefix"""
+
+    def __init__(self, max_bytes: int = PREFIX_CACHE_MAX_BYTES, min_reuse: int = PREFIX_CACHE_MIN_REUSE_TOKENS):
+        self.max_bytes = max_bytes
+        self.min_reuse = min_reuse
+        self.entries: "OrderedDict[str, PrefixEntry]" = OrderedDict()
+        self.size_bytes = 0
+        self.lock = threading.Lock()
+        self.stats = {
+            "conversation_hits": 0,
+            "shared_prefix_hits": 0,
+            "misses": 0,
+            "diverged": 0,
+            "tokens_reused": 0,
+            "tokens_prefilled": 0,
+            "stores": 0,
+            "evictions": 0
+        }
+
+    def match(
+        self,
+        input_ids: List[int],
+        conversation_key: Optional[str],
+        shared_key: Optional[str]
+    ) -> Tuple[Optional[Any], int]:
+        """Past key/values for the longest reusable prefix of input_ids, and its length"""
+        with self.lock:
+            # At least one prompt token must be left for the model to process
+            limit = len(input_ids) - 1
+
+            entry = self.entries.get(conversation_key) if conversation_key else None
+            if entry is not None:
+                reused = min(common_prefix_length(entry.tokens, input_ids), limit)
+                if reused >= self.min_reuse:
+                    # The next version of this conversation is stored after the turn
+                    self._remove(conversation_key)
+                    entry.cache.crop(reused)
+                    return self._hit("conversation_hits", entry.cache, reused, len(input_ids))
+                self.stats["diverged"] += 1
+
+            entry = self.entries.get(shared_key) if shared_key else None
+            if entry is not None and len(entry.tokens) <= limit and input_ids[:len(entry.tokens)] == entry.tokens:
+                self.entries.move_to_end(shared_key)
+                return self._hit("shared_prefix_hits", copy.deepcopy(entry.cache), len(entry.tokens), len(input_ids))
+
+            self.stats["misses"] += 1
+            self.stats["tokens_prefilled"] += len(input_ids)
+            return None, 0
+
+    def _hit(self, kind: str, cache, reused: int, total: int) -> Tuple[Any, int]:
+        self.stats[kind] += 1
+        self.stats["tokens_reused"] += reused
+        self.stats["tokens_prefilled"] += total - reused
+        return cache, reused
+
+    def contains(self, key: str) -> bool:
+        return key in self.entries
+
+    def store(self, key: str, tokens: List[int], cache, pinned: bool = False):
+        nbytes = cache_nbytes(cache)
+        with self.lock:
+            if nbytes > self.max_bytes:
+                return
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = PrefixEntry(tokens, cache, nbytes, pinned)
+            self.size_bytes += nbytes
+            self.stats["stores"] += 1
+
+            for candidate in list(self.entries):
+                if self.size_bytes <= self.max_bytes:
+                    break
+                if not self.entries[candidate].pinned:
+                    self._remove(candidate)
+                    self.stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry.nbytes
+
+    def snapshot(self) -> Dict[str, Any]:
+        hits = self.stats["conversation_hits"] + self.stats["shared_prefix_hits"]
+        lookups = hits + self.stats["misses"]
+        tokens = self.stats["tokens_reused"] + self.stats["tokens_prefilled"]
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "size_bytes": self.size_bytes,
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+            "token_reuse_ratio": round(self.stats["tokens_reused"] / tokens, 3) if tokens else 0.0
+        }
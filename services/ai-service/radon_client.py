@@ -0,0 +1,225 @@
+"""Long-lived, pooled client for the Radon API.
+
+One keep-alive client (HTTP/2 when the h2 package is installed) serves
+every call, instead of a new connection per attempt. Failed calls are
+retried with exponential backoff and full jitter, but only when a retry is
+safe:
+
+- the request never reached Radon (connect errors, pool timeouts, 503, 429),
+- or it may have, and the caller marked the call idempotent (read timeouts,
+  dropped connections, 502, 504).
+
+Other responses, including every other 4xx and 500, are returned to the
+caller at once. Retries also draw on a token-bucket budget that each call
+tops up by RADON_RETRY_BUDGET_RATIO. When Radon degrades, retries then
+add at most that fraction of extra load instead of multiplying it.
+"""
+import os
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RADON_MAX_CONNECTIONS = int(os.getenv("RADON_MAX_CONNECTIONS", "100"))
+RADON_MAX_KEEPALIVE = int(os.getenv("RADON_MAX_KEEPALIVE", "20"))
+RADON_KEEPALIVE_EXPIRY = float(os.getenv("RADON_KEEPALIVE_EXPIRY", "30"))
+RADON_CONNECT_TIMEOUT = float(os.getenv("RADON_CONNECT_TIMEOUT", "5"))
+RADON_READ_TIMEOUT = float(os.getenv("RADON_READ_TIMEOUT", "60"))
+RADON_STREAM_READ_TIMEOUT = float(os.getenv("RADON_STREAM_READ_TIMEOUT", "120"))
+RADON_POOL_TIMEOUT = float(os.getenv("RADON_POOL_TIMEOUT", "5"))
+RADON_HTTP2 = os.getenv("RADON_HTTP2", "true").lower() == "true"
+
+RADON_MAX_ATTEMPTS = int(os.getenv("RADON_MAX_ATTEMPTS", "3"))
+RADON_RETRY_BASE_DELAY = float(os.getenv("RADON_RETRY_BASE_DELAY", "0.25"))
+RADON_RETRY_MAX_DELAY = float(os.getenv("RADON_RETRY_MAX_DELAY", "4"))
+# Retries earned per call, and the most that may accumulate for bursts of failures
+RADON_RETRY_BUDGET_RATIO = float(os.getenv("RADON_RETRY_BUDGET_RATIO", "0.1"))
+RADON_RETRY_BUDGET_MAX = float(os.getenv("RADON_RETRY_BUDGET_MAX", "10"))
+
+# Statuses where Radon did not process the request
+UNPROCESSED_STATUSES = {429, 503}
+# Statuses where it may have, so only idempotent calls are retried
+TRANSIENT_STATUSES = {502, 504}
+
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+TRANSIENT_ERRORS = (httpx.ReadTimeout, httpx.WriteTimeout, httpx.ReadError, httpx.WriteError, httpx.RemoteProtocolError)
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def backoff_delay(attempt: int, base: float = RADON_RETRY_BASE_DELAY, cap: float = RADON_RETRY_MAX_DELAY) -> float:
+    """Full jitter: uniform over [0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RetryBudget:
+    """Token bucket that limits retries to a fraction of calls"""
+
+    def __init__(self, ratio: float = RADON_RETRY_BUDGET_RATIO, maximum: float = RADON_RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.maximum = maximum
+        # Start full so a restart does not disable retries
+        self.tokens = maximum
+
+    def deposit(self):
+        self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class RadonClient:
+    """Pooled Radon API client with budgeted, jittered retries"""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str] = None,
+        max_attempts: int = RADON_MAX_ATTEMPTS,
+        budget: Optional[RetryBudget] = None,
+        registry=None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {
+            "Content-Type": "application/json",
+            "User-Agent": "Radon-AI-Service/2.0.0"
+        }
+        if api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+        self.max_attempts = max(1, max_attempts)
+        self.budget = budget or RetryBudget()
+        self.client: Optional[httpx.AsyncClient] = None
+        self.stats = {"calls": 0, "retries": 0, "budget_exhausted": 0, "failures": 0}
+
+        self.retries_counter = None
+        if registry is not None:
+            self.retries_counter = registry.counter(
+                "ai_radon_retries_total", "Radon API retries by failure class", ["reason"]
+            )
+
+    async def start(self):
+        http2 = RADON_HTTP2 and _http2_available()
+        if RADON_HTTP2 and not http2:
+            logger.warning("h2 package not installed, the Radon client will use HTTP/1.1")
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=RADON_MAX_CONNECTIONS,
+                max_keepalive_connections=RADON_MAX_KEEPALIVE,
+                keepalive_expiry=RADON_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                connect=RADON_CONNECT_TIMEOUT,
+                read=RADON_READ_TIMEOUT,
+                write=RADON_READ_TIMEOUT,
+                pool=RADON_POOL_TIMEOUT
+            )
+        )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _retryable_status(self, status_code: int, idempotent: bool) -> bool:
+        return status_code in UNPROCESSED_STATUSES or (idempotent and status_code in TRANSIENT_STATUSES)
+
+    def _retryable_error(self, error: Exception, idempotent: bool) -> bool:
+        return isinstance(error, UNSENT_ERRORS) or (idempotent and isinstance(error, TRANSIENT_ERRORS))
+
+    def _may_retry(self, attempt: int, reason: str) -> bool:
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if not self.budget.try_spend():
+            self.stats["budget_exhausted"] += 1
+            logger.warning(f"Radon retry budget exhausted, not retrying {reason}")
+            return False
+        self.stats["retries"] += 1
+        if self.retries_counter is not None:
+            self.retries_counter.labels(reason).inc()
+        return True
+
+    async def post(self, path: str, payload: Dict[str, Any], idempotent: bool = False) -> httpx.Response:
+        """POST with retries; returns the last response, or raises the last transport error"""
+        self.stats["calls"] += 1
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.post(path, json=payload)
+            except httpx.TransportError as e:
+                if not self._retryable_error(e, idempotent) or not self._may_retry(attempt, type(e).__name__):
+                    self.stats["failures"] += 1
+                    raise
+                logger.warning(f"Radon API {type(e).__name__} on {path} (attempt {attempt + 1}), retrying")
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code < 400 or not self._retryable_status(response.status_code, idempotent):
+                if response.status_code >= 500:
+                    self.stats["failures"] += 1
+                return response
+            if not self._may_retry(attempt, str(response.status_code)):
+                self.stats["failures"] += 1
+                return response
+            logger.warning(f"Radon API returned {response.status_code} on {path} (attempt {attempt + 1}), retrying")
+            delay = backoff_delay(attempt)
+            retry_after = _retry_after(response)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, RADON_RETRY_MAX_DELAY))
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @asynccontextmanager
+    async def stream(self, path: str, payload: Dict[str, Any]) -> AsyncIterator[httpx.Response]:
+        """Streaming POST on the pooled client; not retried once the body may have started"""
+        self.stats["calls"] += 1
+        self.budget.deposit()
+        timeout = httpx.Timeout(
+            connect=RADON_CONNECT_TIMEOUT,
+            read=RADON_STREAM_READ_TIMEOUT,
+            write=RADON_READ_TIMEOUT,
+            pool=RADON_POOL_TIMEOUT
+        )
+        async with self.client.stream("POST", path, json=payload, timeout=timeout) as response:
+            yield response
+
+    async def healthy(self, timeout: float = 5.0) -> bool:
+        try:
+            response = await self.client.get("/health", timeout=timeout)
+            return response.status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "retry_budget": round(self.budget.tokens, 2),
+            "max_attempts": self.max_attempts
+        }
@@ -0,0 +1,270 @@
+"""Exact-match cache of deterministic AI responses.
+
+Only greedy generations (temperature 0) are cached: a sampled answer is
+meant to differ between calls, so those requests bypass the cache. Keys
+hash the normalized prompt or messages, the personality, the model, the
+generation parameters and a fingerprint of each media input (content hash
+for local files and data URLs, the URL itself otherwise).
+
+Entries live in an in-memory LRU bounded by bytes and TTL, and optionally
+in a disk tier (AI_RESPONSE_CACHE_DIR) that survives restarts. Entries
+record how long the original generation took, so hits report the compute
+time they saved.
+"""
+import os
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AI_RESPONSE_CACHE_ENABLED = os.getenv("AI_RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+AI_RESPONSE_CACHE_MAX_BYTES = int(os.getenv("AI_RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+AI_RESPONSE_CACHE_TTL = float(os.getenv("AI_RESPONSE_CACHE_TTL", "86400"))
+AI_RESPONSE_CACHE_DIR = os.getenv("AI_RESPONSE_CACHE_DIR")
+AI_RESPONSE_CACHE_DISK_MAX_BYTES = int(os.getenv("AI_RESPONSE_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+MEDIA_KEYS = ("image", "audio", "video", "image_url", "audio_url", "video_url")
+
+
+class CachedResponse(NamedTuple):
+    value: Dict[str, Any]
+    compute_seconds: float
+    expires_at: float
+    size: int
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return unicodedata.normalize("NFC", value).strip()
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def media_fingerprint(reference: str) -> str:
+    """Content hash for local files and data URLs, the reference itself otherwise"""
+    if reference.startswith("data:"):
+        _, _, data = reference.partition(",")
+        try:
+            return "sha256:" + hashlib.sha256(base64.b64decode(data)).hexdigest()
+        except ValueError:
+            return reference
+    path = reference[len("file://"):] if reference.startswith("file://") else reference
+    if os.path.isfile(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return "sha256:" + digest.hexdigest()
+    return reference
+
+
+def _fingerprint_media(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: media_fingerprint(item) if key in MEDIA_KEYS and isinstance(item, str) else _fingerprint_media(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_fingerprint_media(item) for item in value]
+    return value
+
+
+def is_deterministic(temperature: Optional[float]) -> bool:
+    return temperature is not None and temperature <= 0
+
+
+def make_cache_key(kind: str, payload: Dict[str, Any]) -> str:
+    """Hash of the normalized request; reads local media files, so call it off the event loop"""
+    canonical = json.dumps(
+        {"kind": kind, "payload": _fingerprint_media(_normalize(payload))},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class AIResponseCache:
+    """Memory LRU with an optional disk tier for deterministic responses"""
+
+    def __init__(
+        self,
+        enabled: bool = AI_RESPONSE_CACHE_ENABLED,
+        max_bytes: int = AI_RESPONSE_CACHE_MAX_BYTES,
+        ttl: float = AI_RESPONSE_CACHE_TTL,
+        disk_dir: Optional[str] = AI_RESPONSE_CACHE_DIR,
+        disk_max_bytes: int = AI_RESPONSE_CACHE_DISK_MAX_BYTES,
+        registry=None
+    ):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.size_bytes = 0
+        self.stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+            "compute_seconds_saved": 0.0
+        }
+        if self.enabled and self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        self.lookups_counter = None
+        self.saved_counter = None
+        if registry is not None:
+            self.lookups_counter = registry.counter(
+                "ai_response_cache_lookups_total", "Response cache lookups by result", ["result"]
+            )
+            self.saved_counter = registry.counter(
+                "ai_response_cache_compute_seconds_saved_total", "Generation time avoided by response cache hits"
+            )
+
+    def _count(self, result: str):
+        self.stats[result] += 1
+        if self.lookups_counter is not None:
+            self.lookups_counter.labels(result).inc()
+
+    async def get_or_compute(
+        self,
+        key: Optional[str],
+        compute: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Cached value for key, or compute and store it; returns (value, hit)"""
+        if not self.enabled or key is None:
+            self._count("bypassed")
+            return await compute(), False
+
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires_at <= time.time():
+            self._remove(key)
+            entry = None
+        if entry is None and self.disk_dir:
+            entry = await asyncio.to_thread(self._read_disk, key)
+            if entry is not None:
+                self.stats["disk_hits"] += 1
+                self._put(key, entry)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self._count("hits")
+            self.stats["compute_seconds_saved"] += entry.compute_seconds
+            if self.saved_counter is not None:
+                self.saved_counter.labels().inc(entry.compute_seconds)
+            return entry.value, True
+
+        self._count("misses")
+        start = time.monotonic()
+        value = await compute()
+        encoded = json.dumps(value, default=str)
+        entry = CachedResponse(value, time.monotonic() - start, time.time() + self.ttl, len(encoded))
+        self._put(key, entry)
+        self.stats["stores"] += 1
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, entry, encoded)
+        return value, False
+
+    def _put(self, key: str, entry: CachedResponse):
+        if entry.size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = entry
+        self.size_bytes += entry.size
+        while self.size_bytes > self.max_bytes and self.entries:
+            self._remove(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry.size
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[CachedResponse]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable response cache file {path}: {str(e)}")
+            self._unlink(path)
+            return None
+        if record["expires_at"] <= time.time():
+            self._unlink(path)
+            return None
+        # Reading counts as use for the disk tier's LRU
+        os.utime(path)
+        return CachedResponse(record["value"], record["compute_seconds"], record["expires_at"], record["size"])
+
+    def _write_disk(self, key: str, entry: CachedResponse, encoded: str):
+        path = self._disk_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({
+                    "value": json.loads(encoded),
+                    "compute_seconds": entry.compute_seconds,
+                    "expires_at": entry.expires_at,
+                    "size": entry.size
+                }))
+            os.replace(temp_path, path)
+            self._trim_disk()
+        except OSError as e:
+            logger.warning(f"Could not persist response cache entry: {str(e)}")
+            self._unlink(temp_path)
+
+    def _trim_disk(self):
+        """Drop least recently used files once the disk tier is over budget"""
+        files = []
+        total = 0
+        with os.scandir(self.disk_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        if total <= self.disk_max_bytes:
+            return
+        for _, size, path in sorted(files):
+            self._unlink(path)
+            total -= size
+            if total <= self.disk_max_bytes:
+                break
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "compute_seconds_saved": round(self.stats["compute_seconds_saved"], 3),
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "size_bytes": self.size_bytes,
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0
+        }
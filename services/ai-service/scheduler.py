@@ -0,0 +1,211 @@
+"""Dynamic batching for local model inference.
+
+Requests are queued and a dedicated worker thread groups them into batches
+of up to INFERENCE_MAX_BATCH_SIZE, waiting at most INFERENCE_MAX_WAIT_MS
+after the oldest request for others to join. Only requests with equal
+generation parameters share a batch; the others wait for their own batch.
+Results are handed back to each caller's future on its event loop, so
+the loop keeps serving other requests while the model runs.
+"""
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from collections import deque, OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+# Most requests that may wait for the model before new ones are refused
+INFERENCE_QUEUE_LIMIT = int(os.getenv("INFERENCE_QUEUE_LIMIT", "256"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64)
+
+
+class SchedulerBusy(Exception):
+    """Raised when the inference queue is full"""
+
+
+class _Job:
+    __slots__ = ("payload", "params", "future", "loop", "enqueued_at")
+
+    def __init__(self, payload: Any, params: Hashable, future: asyncio.Future, loop: asyncio.AbstractEventLoop):
+        self.payload = payload
+        self.params = params
+        self.future = future
+        self.loop = loop
+        self.enqueued_at = time.monotonic()
+
+
+def _set_result(future: asyncio.Future, result: Any):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, error: BaseException):
+    if not future.done():
+        future.set_exception(error)
+
+
+class InferenceScheduler:
+    """Queues requests and runs them in batches on a worker thread.
+
+    `runner(payloads, params)` is called on the worker thread with the
+    payloads of one batch and their shared parameters, and must return one
+    result per payload, in order. `max_batch_size(params)` may lower the
+    batch size for parameters the model cannot batch.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[List[Any], Hashable], List[Any]],
+        max_batch_size: int = INFERENCE_MAX_BATCH_SIZE,
+        max_wait: float = INFERENCE_MAX_WAIT_MS / 1000,
+        queue_limit: int = INFERENCE_QUEUE_LIMIT,
+        batch_limit: Optional[Callable[[Hashable], int]] = None,
+        registry=None
+    ):
+        self.runner = runner
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.queue_limit = queue_limit
+        self.batch_limit = batch_limit
+        self._queue: "queue.Queue[Optional[_Job]]" = queue.Queue()
+        # Jobs pulled off the queue while a batch with other parameters was forming
+        self._pending: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"jobs": 0, "batches": 0, "rejected": 0, "errors": 0, "cancelled": 0, "queue_wait_total": 0.0}
+
+        self.batch_size_histogram = None
+        self.queue_wait_histogram = None
+        if registry is not None:
+            self.batch_size_histogram = registry.histogram(
+                "ai_inference_batch_size", "Requests per model batch", buckets=BATCH_SIZE_BUCKETS
+            )
+            self.queue_wait_histogram = registry.histogram(
+                "ai_inference_queue_wait_seconds", "Time requests waited for a model batch"
+            )
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    async def submit(self, payload: Any, params: Hashable) -> Any:
+        """Queue one request and wait for its result"""
+        with self._lock:
+            if self._waiting >= self.queue_limit:
+                self.stats["rejected"] += 1
+                raise SchedulerBusy("Inference queue is full")
+            self._waiting += 1
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put(_Job(payload, params, future, loop))
+        return await future
+
+    def _limit_for(self, params: Hashable) -> int:
+        if self.batch_limit is None:
+            return self.max_batch_size
+        return max(1, min(self.max_batch_size, self.batch_limit(params)))
+
+    def _next_job(self) -> Optional[_Job]:
+        """Oldest job held back from earlier batches, else block on the queue"""
+        oldest_key = None
+        for key, jobs in self._pending.items():
+            if oldest_key is None or jobs[0].enqueued_at < self._pending[oldest_key][0].enqueued_at:
+                oldest_key = key
+        if oldest_key is not None:
+            return self._pop_pending(oldest_key)
+        return self._queue.get()
+
+    def _pop_pending(self, key: Hashable) -> _Job:
+        jobs = self._pending[key]
+        job = jobs.popleft()
+        if not jobs:
+            del self._pending[key]
+        return job
+
+    def _form_batch(self, first: _Job) -> List[_Job]:
+        batch = [first]
+        limit = self._limit_for(first.params)
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < limit:
+            if first.params in self._pending:
+                batch.append(self._pop_pending(first.params))
+                continue
+            timeout = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                # Shutdown: run what we have, then stop
+                self._queue.put(None)
+                break
+            if job.params == first.params:
+                batch.append(job)
+            else:
+                self._pending.setdefault(job.params, deque()).append(job)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._next_job()
+            if first is None:
+                return
+            batch = self._form_batch(first)
+            with self._lock:
+                self._waiting -= len(batch)
+
+            # Callers that went away do not need a slot in the batch
+            live = [job for job in batch if not job.future.cancelled()]
+            self.stats["cancelled"] += len(batch) - len(live)
+            if not live:
+                continue
+
+            started = time.monotonic()
+            for job in live:
+                self.stats["queue_wait_total"] += started - job.enqueued_at
+                if self.queue_wait_histogram is not None:
+                    self.queue_wait_histogram.labels().observe(started - job.enqueued_at)
+            if self.batch_size_histogram is not None:
+                self.batch_size_histogram.labels().observe(len(live))
+            self.stats["jobs"] += len(live)
+            self.stats["batches"] += 1
+
+            try:
+                results = self.runner([job.payload for job in live], first.params)
+                if len(results) != len(live):
+                    raise RuntimeError(f"Runner returned {len(results)} results for {len(live)} requests")
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Inference batch of {len(live)} failed: {str(e)}")
+                for job in live:
+                    job.loop.call_soon_threadsafe(_set_exception, job.future, e)
+                continue
+
+            for job, result in zip(live, results):
+                job.loop.call_soon_threadsafe(_set_result, job.future, result)
+
+    def snapshot(self) -> Dict[str, Any]:
+        jobs = self.stats["jobs"]
+        return {
+            **{key: value for key, value in self.stats.items() if key != "queue_wait_total"},
+            "waiting": self._waiting,
+            "avg_batch_size": round(jobs / self.stats["batches"], 2) if self.stats["batches"] else 0.0,
+            "avg_queue_wait_ms": round(self.stats["queue_wait_total"] / jobs * 1000, 2) if jobs else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000
+        }
@@ -0,0 +1,137 @@
+"""CPU stand-in for the Qwen3-Omni model and processor.
+
+Selected with QWEN_STAND_IN_MODEL=true. It implements just the parts of
+the transformers interface that the service uses: chat template,
+batched left-padded tokenization, generate() with thinker streaming and
+stopping criteria, and a speech waveform. Loading, warm-up, batching,
+streaming and readiness can then run end to end on a machine without a
+GPU or model weights. Replies are deterministic: the last user text,
+reversed.
+
+Tokens are UTF-8 bytes offset by SPECIAL_TOKENS; id 0 is padding and 1
+ends a message.
+"""
+import math
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import torch
+from transformers import BatchFeature
+
+PAD_TOKEN_ID = 0
+END_TOKEN_ID = 1
+SPECIAL_TOKENS = 2
+SAMPLE_RATE = 24000
+
+
+class StandInTokenizer:
+    pad_token_id = PAD_TOKEN_ID
+    eos_token_id = END_TOKEN_ID
+
+    def __init__(self):
+        self.padding_side = "left"
+
+    def encode(self, text: str) -> List[int]:
+        return [byte + SPECIAL_TOKENS for byte in text.encode("utf-8")]
+
+    def __call__(self, text: str, add_special_tokens: bool = True, **kwargs) -> Dict[str, List[int]]:
+        return {"input_ids": self.encode(text)}
+
+    def decode(self, token_ids, skip_special_tokens: bool = False, **kwargs) -> str:
+        if isinstance(token_ids, torch.Tensor):
+            token_ids = token_ids.tolist()
+        data = bytes(token - SPECIAL_TOKENS for token in token_ids if token >= SPECIAL_TOKENS)
+        return data.decode("utf-8", errors="ignore")
+
+    def batch_decode(self, sequences, **kwargs) -> List[str]:
+        return [self.decode(sequence, **kwargs) for sequence in sequences]
+
+
+class StandInProcessor:
+    def __init__(self):
+        self.tokenizer = StandInTokenizer()
+
+    @staticmethod
+    def _render(message: Dict[str, Any]) -> str:
+        content = message["content"]
+        if isinstance(content, str):
+            return content
+        parts = []
+        for item in content:
+            kind = item.get("type", "text")
+            parts.append(item["text"] if kind == "text" else f"<{kind}>")
+        return " ".join(parts)
+
+    def apply_chat_template(self, conversation, add_generation_prompt: bool = False, tokenize: bool = False, **kwargs) -> str:
+        text = "".join(f"<|{message['role']}|>{self._render(message)}\n" for message in conversation)
+        return text + "<|assistant|>" if add_generation_prompt else text
+
+    def __call__(self, text: List[str], padding: bool = True, return_tensors: str = "pt", **kwargs) -> BatchFeature:
+        encoded = [self.tokenizer.encode(prompt) for prompt in text]
+        width = max(len(ids) for ids in encoded)
+        input_ids = torch.full((len(encoded), width), PAD_TOKEN_ID, dtype=torch.long)
+        attention_mask = torch.zeros((len(encoded), width), dtype=torch.long)
+        for row, ids in enumerate(encoded):
+            if ids:
+                input_ids[row, width - len(ids):] = torch.tensor(ids)
+                attention_mask[row, width - len(ids):] = 1
+        return BatchFeature({"input_ids": input_ids, "attention_mask": attention_mask})
+
+    def batch_decode(self, sequences, **kwargs) -> List[str]:
+        return self.tokenizer.batch_decode(sequences, **kwargs)
+
+
+class StandInModel:
+    device = torch.device("cpu")
+    dtype = torch.float32
+
+    def __init__(self, tokenizer: StandInTokenizer):
+        self.tokenizer = tokenizer
+
+    def _reply(self, prompt_ids: List[int]) -> List[int]:
+        prompt = self.tokenizer.decode(prompt_ids)
+        user_turns = prompt.split("<|user|>")[1:]
+        last = user_turns[-1].split("\n")[0] if user_turns else prompt
+        return self.tokenizer.encode(last[::-1] or "ok")
+
+    def generate(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        max_new_tokens: int = 32,
+        return_audio: bool = True,
+        thinker_streamer=None,
+        thinker_stopping_criteria=None,
+        **kwargs
+    ):
+        replies = [self._reply(row.tolist())[:max_new_tokens] for row in input_ids]
+        width = max(len(reply) for reply in replies) + 1
+        completions = torch.full((len(replies), width), PAD_TOKEN_ID, dtype=torch.long)
+
+        if thinker_streamer is not None:
+            thinker_streamer.put(input_ids)
+        for row, reply in enumerate(replies):
+            for step, token in enumerate(reply + [END_TOKEN_ID]):
+                completions[row, step] = token
+                if thinker_streamer is not None:
+                    thinker_streamer.put(torch.tensor([token]))
+                if thinker_stopping_criteria is not None and thinker_stopping_criteria(
+                    torch.cat([input_ids[row], completions[row, :step + 1]]).unsqueeze(0), None
+                ):
+                    break
+        if thinker_streamer is not None:
+            thinker_streamer.end()
+
+        audio = None
+        if return_audio:
+            # A short tone per reply token
+            duration = 0.02 * max(len(reply) for reply in replies)
+            steps = torch.arange(int(SAMPLE_RATE * duration), dtype=torch.float32)
+            audio = 0.1 * torch.sin(2 * math.pi * 440 * steps / SAMPLE_RATE)
+        return SimpleNamespace(sequences=torch.cat([input_ids, completions], dim=1)), audio
+
+
+def load_stand_in():
+    """(model, processor) pair with the interface of the real ones"""
+    processor = StandInProcessor()
+    return StandInModel(processor.tokenizer), processor
@@ -0,0 +1,69 @@
+"""Token streaming from a generation running on another thread.
+
+`AsyncTextStreamer` reuses transformers' incremental detokenization (text
+is only released once it forms complete characters and words) and hands
+each piece to an asyncio queue on the caller's event loop. When the client
+goes away, `cancel()` makes `StopOnCancel` end the generation at the next
+token instead of running to max_new_tokens.
+"""
+import json
+import asyncio
+from typing import Any, Dict, Optional
+
+from transformers import StoppingCriteria, TextStreamer
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no"
+}
+
+_END = object()
+
+
+def sse_event(data: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class AsyncTextStreamer(TextStreamer):
+    """Streams decoded text from a generation thread to an event loop"""
+
+    def __init__(self, tokenizer, loop: asyncio.AbstractEventLoop, **decode_kwargs):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True, **decode_kwargs)
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.cancelled = False
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+        if stream_end:
+            self.finish()
+
+    def finish(self):
+        """Mark the stream as complete; safe to call more than once"""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, _END)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        item = await self.queue.get()
+        if item is _END:
+            # Later readers see the end too
+            self.queue.put_nowait(_END)
+            raise StopAsyncIteration
+        return item
+
+
+class StopOnCancel(StoppingCriteria):
+    """Stops generation once the streamer's client has disconnected"""
+
+    def __init__(self, streamer: Optional[AsyncTextStreamer]):
+        self.streamer = streamer
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.streamer is not None and self.streamer.cancelled
@@ -0,0 +1,58 @@
+import os
+import sys
+import asyncio
+from typing import List, Optional, Union
+
+import httpx
+import pytest
+
+# Service modules import each other by bare name, as they do inside the image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RADON_API_URL", "http://radon.test")
+# Generation runs on the CPU stand-in model (stand_in.py)
+os.environ.setdefault("QWEN_STAND_IN_MODEL", "true")
+
+
+class FakeRadon:
+    """Scripted Radon API: each call consumes the next outcome.
+
+    An outcome is a status code (answered with a JSON body), an httpx
+    exception class (raised as if the transport failed), or a
+    (delay seconds, outcome) pair that answers late. A late answer honours
+    the read timeout of the client that sent it, as the network transport
+    does: past the timeout the call fails with ReadTimeout. Once the script
+    runs out every call succeeds at once.
+    """
+
+    def __init__(self, *outcomes: Union[int, type, tuple]):
+        self.outcomes: List[Union[int, type, tuple]] = list(outcomes)
+        self.requests: List[httpx.Request] = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        outcome = self.outcomes.pop(0) if self.outcomes else 200
+        delay, outcome = outcome if isinstance(outcome, tuple) else (0.0, outcome)
+        if delay:
+            read_timeout = request.extensions.get("timeout", {}).get("read")
+            if read_timeout is not None and delay > read_timeout:
+                await asyncio.sleep(read_timeout)
+                raise httpx.ReadTimeout("scripted slow response", request=request)
+            await asyncio.sleep(delay)
+        if isinstance(outcome, type):
+            raise outcome("scripted failure", request=request)
+        body = {"response": "ok", "conversation_id": "conv_1", "tokens_used": 3} if outcome == 200 else {"error": outcome}
+        return httpx.Response(outcome, json=body)
+
+    def client(self, timeout: Optional[httpx.Timeout] = None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url="http://radon.test",
+            transport=httpx.MockTransport(self.handler),
+            timeout=timeout or httpx.Timeout(5.0)
+        )
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    import radon_client
+
+    monkeypatch.setattr(radon_client, "backoff_delay", lambda attempt: 0.0)
@@ -0,0 +1,113 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from conftest import FakeRadon
+from radon_client import RetryBudget
+
+pytest.importorskip("torch")
+import main  # noqa: E402
+
+
+@pytest.fixture
+def radon(monkeypatch, no_backoff):
+    """Point the service's Radon client at a scripted fake"""
+    def install(*outcomes, read_timeout: float = 5.0):
+        fake = FakeRadon(*outcomes)
+        monkeypatch.setattr(main.radon_client, "budget", RetryBudget())
+        monkeypatch.setattr(main.radon_client, "client", fake.client(httpx.Timeout(5.0, read=read_timeout)))
+        return fake
+    return install
+
+
+def chat(**fields):
+    request = main.InferenceRequest(prompt="hello", temperature=0, **fields)
+    return asyncio.run(main.chat(request))
+
+
+def chat_status(**fields) -> int:
+    with pytest.raises(HTTPException) as error:
+        chat(**fields)
+    return error.value.status_code
+
+
+def test_chat_relays_radon_answer(radon):
+    fake = radon(503)
+    response = chat()
+    assert response.response == "ok"
+    assert len(fake.requests) == 2
+
+
+def test_timeout_is_a_504(radon):
+    # With a conversation the call is not idempotent, so a read timeout is not retried
+    fake = radon(httpx.ReadTimeout)
+    assert chat_status(conversation_id="conv_1") == 504
+    assert len(fake.requests) == 1
+
+
+def test_radon_slower_than_the_read_timeout_is_retried_then_a_504(radon):
+    slow = (0.5, 200)
+    fake = radon(slow, slow, slow, read_timeout=0.1)
+    assert chat_status() == 504
+    assert len(fake.requests) == main.radon_client.max_attempts
+
+
+def test_unreachable_radon_is_a_502(radon):
+    fake = radon(httpx.ConnectError, httpx.ConnectError, httpx.ConnectError)
+    assert chat_status() == 502
+    assert len(fake.requests) == main.radon_client.max_attempts
+
+
+def test_radon_status_is_kept(radon):
+    radon(502, 502, 502)
+    assert chat_status() == 502
+    radon(404)
+    assert chat_status() == 404
+
+
+def test_errors_are_counted(radon):
+    radon(httpx.ReadTimeout)
+    before = main.metrics["error_count"]
+    chat_status(conversation_id="conv_1")
+    assert main.metrics["error_count"] == before + 1
+
+
+@pytest.fixture
+def response_cache(monkeypatch):
+    cache = main.AIResponseCache(enabled=True, disk_dir=None)
+    monkeypatch.setattr(main, "response_cache", cache)
+    return cache
+
+
+def test_greedy_chat_is_cached_without_the_conversation(radon, response_cache):
+    fake = radon()
+    first = chat(user_id="alice")
+    second = chat(user_id="bob")
+    assert len(fake.requests) == 1
+    # Only the caller that opened the conversation learns its id
+    assert first.conversation_id == "conv_1"
+    assert second.conversation_id is None
+    assert second.response == first.response
+    assert all("conversation_id" not in entry.value for entry in response_cache.entries.values())
+
+
+def test_chat_in_a_conversation_bypasses_the_cache(radon, response_cache):
+    fake = radon()
+    chat(conversation_id="conv_1")
+    chat(conversation_id="conv_1")
+    assert len(fake.requests) == 2
+    assert response_cache.stats["bypassed"] == 2
+    assert not response_cache.entries
+
+
+def test_cache_key_names_the_model_not_the_url(radon, response_cache, monkeypatch):
+    radon()
+    chat()
+    monkeypatch.setattr(main, "RADON_MODEL", "radon-ai-30b-v2")
+    chat()
+    monkeypatch.setattr(main, "RADON_API_URL", "http://radon-replica.test")
+    chat()
+    assert response_cache.stats["misses"] == 2
+    assert response_cache.stats["hits"] == 1
@@ -0,0 +1,174 @@
+import asyncio
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from prefix_cache import PrefixCache, personality_key  # noqa: E402
+
+LAYERS = 2
+HEADS = 2
+HEAD_DIM = 4
+# float32 keys and values for every layer
+BYTES_PER_TOKEN = LAYERS * 2 * HEADS * HEAD_DIM * 4
+
+
+class StandInKVCache:
+    """The parts of a transformers Cache that PrefixCache uses"""
+
+    def __init__(self, tokens: int):
+        self.layers = [
+            (torch.randn(1, HEADS, tokens, HEAD_DIM), torch.randn(1, HEADS, tokens, HEAD_DIM))
+            for _ in range(LAYERS)
+        ]
+
+    def to_legacy_cache(self):
+        return tuple(self.layers)
+
+    def get_seq_length(self) -> int:
+        return self.layers[0][0].shape[2]
+
+    def crop(self, length: int):
+        self.layers = [(keys[:, :, :length], values[:, :, :length]) for keys, values in self.layers]
+
+
+def store(cache: PrefixCache, key: str, tokens, pinned: bool = False) -> StandInKVCache:
+    kv = StandInKVCache(len(tokens))
+    cache.store(key, list(tokens), kv, pinned=pinned)
+    return kv
+
+
+def test_conversation_reuse_is_cropped_to_the_common_prefix():
+    cache = PrefixCache(max_bytes=1 << 20, min_reuse=8)
+    turn = list(range(100, 140))
+    store(cache, "conversation:c1", turn)
+
+    # The next prompt shares 30 tokens, then the template diverges
+    next_prompt = turn[:30] + [1, 2, 3] + list(range(500, 520))
+    kv, reused = cache.match(next_prompt, "conversation:c1", None)
+
+    assert reused == 30
+    assert kv.get_seq_length() == 30
+    # Handed over to the request; the turn stores the next version
+    assert not cache.contains("conversation:c1")
+    assert cache.stats["tokens_reused"] == 30
+    assert cache.stats["tokens_prefilled"] == len(next_prompt) - 30
+
+
+def test_reuse_leaves_one_prompt_token_to_process():
+    cache = PrefixCache(max_bytes=1 << 20, min_reuse=8)
+    prompt = list(range(20))
+    store(cache, "conversation:c1", prompt)
+
+    kv, reused = cache.match(prompt, "conversation:c1", None)
+    assert reused == len(prompt) - 1
+    assert kv.get_seq_length() == len(prompt) - 1
+
+
+def test_short_or_missing_prefix_falls_back_to_a_full_prefill():
+    cache = PrefixCache(max_bytes=1 << 20, min_reuse=8)
+    store(cache, "conversation:c1", list(range(40)))
+
+    # Diverges after 4 tokens, under min_reuse
+    prompt = [0, 1, 2, 3] + list(range(900, 930))
+    assert cache.match(prompt, "conversation:c1", None) == (None, 0)
+    assert cache.stats["diverged"] == 1
+    # A diverged entry is kept; nothing was handed over
+    assert cache.contains("conversation:c1")
+
+    assert cache.match(prompt, "conversation:unknown", None) == (None, 0)
+    assert cache.stats["misses"] == 2
+    assert cache.stats["tokens_prefilled"] == 2 * len(prompt)
+
+
+def test_lru_eviction_keeps_within_the_byte_budget():
+    cache = PrefixCache(max_bytes=25 * BYTES_PER_TOKEN, min_reuse=4)
+    store(cache, personality_key("helpful", list(range(5))), range(5), pinned=True)
+    store(cache, "conversation:old", range(10, 20))
+    store(cache, "conversation:new", range(20, 30))
+    assert cache.size_bytes == 25 * BYTES_PER_TOKEN
+
+    store(cache, "conversation:newest", range(30, 40))
+
+    assert not cache.contains("conversation:old")
+    assert cache.contains("conversation:new") and cache.contains("conversation:newest")
+    # Pinned personality prompts are never evicted
+    assert cache.contains(personality_key("helpful", list(range(5))))
+    assert cache.size_bytes <= cache.max_bytes
+    assert cache.stats["evictions"] == 1
+
+
+def test_entry_larger_than_the_budget_is_not_stored():
+    cache = PrefixCache(max_bytes=10 * BYTES_PER_TOKEN, min_reuse=4)
+    store(cache, "conversation:huge", range(11))
+    assert not cache.contains("conversation:huge")
+    assert cache.size_bytes == 0
+
+
+def test_personality_prefix_is_shared_across_conversations():
+    cache = PrefixCache(max_bytes=1 << 20, min_reuse=8)
+    system = list(range(1000, 1016))
+    key = personality_key("helpful", system)
+    shared = store(cache, key, system, pinned=True)
+
+    first, reused_first = cache.match(system + [1, 2, 3], "conversation:alice", key)
+    second, reused_second = cache.match(system + [7, 8, 9, 10], "conversation:bob", key)
+
+    assert reused_first == reused_second == len(system)
+    # Each conversation gets its own copy; the shared entry stays intact
+    assert first is not shared and second is not shared
+    first.crop(4)
+    assert second.get_seq_length() == len(system)
+    assert shared.get_seq_length() == len(system)
+    assert cache.stats["shared_prefix_hits"] == 2
+
+
+def test_personality_key_changes_with_the_prompt():
+    assert personality_key("helpful", [1, 2, 3]) == personality_key("helpful", [1, 2, 3])
+    assert personality_key("helpful", [1, 2, 3]) != personality_key("helpful", [1, 2, 4])
+
+
+def test_snapshot_reports_hit_ratios():
+    cache = PrefixCache(max_bytes=1 << 20, min_reuse=8)
+    system = list(range(1000, 1016))
+    key = personality_key("helpful", system)
+    store(cache, key, system, pinned=True)
+    store(cache, "conversation:c1", list(range(40)))
+
+    cache.match(list(range(40)) + [99], "conversation:c1", None)
+    cache.match(system + [1, 2, 3, 4], None, key)
+    cache.match(list(range(2000, 2020)), None, key)
+    cache.match(list(range(3000, 3020)), None, None)
+
+    snapshot = cache.snapshot()
+    assert snapshot["conversation_hits"] == 1
+    assert snapshot["shared_prefix_hits"] == 1
+    assert snapshot["misses"] == 2
+    assert snapshot["hit_ratio"] == 0.5
+    reused = 40 + len(system)
+    total = 41 + 20 + 20 + 20
+    assert snapshot["tokens_reused"] == reused
+    assert snapshot["token_reuse_ratio"] == round(reused / total, 3)
+
+
+def test_default_requests_look_up_the_prefix_cache(monkeypatch):
+    import main
+    from stand_in import load_stand_in
+
+    model, processor = load_stand_in()
+    monkeypatch.setattr(main, "model", model)
+    monkeypatch.setattr(main, "processor", processor)
+    cache = PrefixCache(max_bytes=1 << 20, min_reuse=8)
+    monkeypatch.setattr(main, "prefix_cache", cache)
+
+    request = main.MultimodalRequest(text="hello", conversation_id="c1")
+    params = main.GenerationParams(request.speaker, 8, 0.0, request.use_audio_in_video, request.return_audio)
+    conversation = main.build_multimodal_conversation(request)
+    prepared = asyncio.run(main.prepare_conversation(
+        conversation, request.use_audio_in_video, request.conversation_id, request.personality
+    ))
+
+    main.run_generation_batch([prepared], params)
+
+    assert cache.stats["misses"] == 1
+    assert prepared["shared_prefix"][0].startswith(f"personality:{request.personality}:")
@@ -0,0 +1,147 @@
+import asyncio
+
+import httpx
+import pytest
+
+from conftest import FakeRadon
+from radon_client import RadonClient, RetryBudget, backoff_delay
+
+
+def make_client(fake: FakeRadon, max_attempts: int = 3, budget: RetryBudget = None) -> RadonClient:
+    client = RadonClient("http://radon.test", max_attempts=max_attempts, budget=budget)
+    client.client = fake.client()
+    return client
+
+
+def post(client: RadonClient, idempotent: bool):
+    return asyncio.run(client.post("/chat", {"prompt": "hi"}, idempotent=idempotent))
+
+
+def test_unprocessed_statuses_are_retried_even_when_not_idempotent(no_backoff):
+    fake = FakeRadon(503, 429)
+    client = make_client(fake)
+    assert post(client, idempotent=False).status_code == 200
+    assert len(fake.requests) == 3
+    assert client.stats["retries"] == 2
+
+
+def test_transient_statuses_are_retried_only_when_idempotent(no_backoff):
+    fake = FakeRadon(502)
+    client = make_client(fake)
+    assert post(client, idempotent=False).status_code == 502
+    assert len(fake.requests) == 1
+
+    fake = FakeRadon(502, 504)
+    client = make_client(fake)
+    assert post(client, idempotent=True).status_code == 200
+    assert len(fake.requests) == 3
+
+
+def test_client_errors_and_500_are_not_retried(no_backoff):
+    for status in (400, 404, 500):
+        fake = FakeRadon(status)
+        client = make_client(fake)
+        assert post(client, idempotent=True).status_code == status
+        assert len(fake.requests) == 1
+
+
+def test_transport_errors(no_backoff):
+    # Never sent: safe to retry
+    fake = FakeRadon(httpx.ConnectError)
+    assert post(make_client(fake), idempotent=False).status_code == 200
+    assert len(fake.requests) == 2
+
+    # May have been processed: raised unless idempotent
+    fake = FakeRadon(httpx.ReadError)
+    with pytest.raises(httpx.ReadError):
+        post(make_client(fake), idempotent=False)
+    assert len(fake.requests) == 1
+
+    fake = FakeRadon(httpx.ReadTimeout, httpx.RemoteProtocolError)
+    assert post(make_client(fake), idempotent=True).status_code == 200
+    assert len(fake.requests) == 3
+
+
+def started_client(monkeypatch, fake: FakeRadon, read_timeout: float) -> RadonClient:
+    """Client with the timeouts start() configures, talking to the fake"""
+    import radon_client
+
+    monkeypatch.setattr(radon_client, "RADON_READ_TIMEOUT", read_timeout)
+    client = RadonClient("http://radon.test")
+    asyncio.run(client.start())
+    client.client = fake.client(timeout=client.client.timeout)
+    return client
+
+
+def test_response_slower_than_the_read_timeout_is_retried(monkeypatch, no_backoff):
+    fake = FakeRadon((0.5, 200), (0.05, 200))
+    client = started_client(monkeypatch, fake, read_timeout=0.2)
+
+    assert post(client, idempotent=True).status_code == 200
+    assert len(fake.requests) == 2
+    assert client.stats["retries"] == 1
+
+
+def test_slow_response_within_the_read_timeout_spends_no_retry(monkeypatch, no_backoff):
+    fake = FakeRadon((0.15, 200))
+    client = started_client(monkeypatch, fake, read_timeout=0.5)
+    budget = client.budget.tokens
+
+    assert post(client, idempotent=True).status_code == 200
+    assert len(fake.requests) == 1
+    assert client.stats["retries"] == 0
+    assert client.budget.tokens >= budget
+
+
+def test_attempts_are_capped(no_backoff):
+    fake = FakeRadon(503, 503, 503, 503)
+    client = make_client(fake, max_attempts=3)
+    assert post(client, idempotent=True).status_code == 503
+    assert len(fake.requests) == 3
+    assert client.stats["failures"] == 1
+
+
+def test_retry_budget_limits_retries_to_a_share_of_calls(no_backoff):
+    # An outage: every call fails. With a ratio of 0.1 and an empty budget,
+    # 100 calls may spend about 10 retries instead of 200.
+    fake = FakeRadon(*([503] * 1000))
+    budget = RetryBudget(ratio=0.1, maximum=10)
+    budget.tokens = 0
+    client = make_client(fake, max_attempts=3, budget=budget)
+
+    async def run():
+        for _ in range(100):
+            await client.post("/chat", {"prompt": "hi"}, idempotent=True)
+
+    asyncio.run(run())
+    assert 100 + 9 <= len(fake.requests) <= 100 + 10
+    assert client.stats["budget_exhausted"] >= 90
+
+
+def test_retry_after_is_honoured_up_to_the_cap(monkeypatch, no_backoff):
+    import radon_client
+
+    delays = []
+
+    async def record_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(radon_client.asyncio, "sleep", record_sleep)
+    monkeypatch.setattr(radon_client, "RADON_RETRY_MAX_DELAY", 2.0)
+
+    def handler(request):
+        if not delays:
+            return httpx.Response(429, headers={"Retry-After": "30"})
+        return httpx.Response(200, json={})
+
+    client = RadonClient("http://radon.test")
+    client.client = httpx.AsyncClient(base_url="http://radon.test", transport=httpx.MockTransport(handler))
+    assert post(client, idempotent=False).status_code == 200
+    assert delays == [2.0]
+
+
+def test_backoff_is_full_jitter():
+    samples = [backoff_delay(3, base=0.25, cap=4.0) for _ in range(1000)]
+    assert all(0 <= sample <= 2.0 for sample in samples)
+    assert max(samples) > 1.0 and min(samples) < 0.5
+    assert all(backoff_delay(10, base=0.25, cap=4.0) <= 4.0 for _ in range(100))
@@ -0,0 +1,75 @@
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("torch")
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture
+def fresh_model(monkeypatch):
+    """An unloaded stand-in model, loaded eagerly at startup"""
+    monkeypatch.setattr(main, "QWEN_STAND_IN_MODEL", True)
+    monkeypatch.setattr(main, "QWEN_EAGER_LOAD", True)
+    monkeypatch.setattr(main, "QWEN_WARMUP", True)
+    monkeypatch.setattr(main, "model", None)
+    monkeypatch.setattr(main, "processor", None)
+    monkeypatch.setattr(main, "model_status", {**main.model_status, "state": "not_loaded", "warmup_seconds": None})
+
+    # Hold the load until the test has seen /ready answer 503
+    release = threading.Event()
+    load = main.load_model_weights
+
+    def gated_load():
+        release.wait(10)
+        return load()
+
+    monkeypatch.setattr(main, "load_model_weights", gated_load)
+    return release
+
+
+def wait_until_ready(client: TestClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get("/ready")
+        if response.status_code == 200:
+            return response
+        time.sleep(0.05)
+    raise AssertionError(f"Not ready after {timeout}s: {response.json()}")
+
+
+def test_ready_after_load_and_warm_up(fresh_model):
+    with TestClient(main.app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["model"]["state"] == "loading"
+        # Liveness does not wait for the model
+        assert client.get("/health").status_code == 200
+
+        jobs_before = main.inference_scheduler.stats["jobs"]
+        fresh_model.set()
+        status = wait_until_ready(client).json()["model"]
+
+    assert status["state"] == "ready"
+    assert status["load_seconds"] is not None
+    assert status["warmup_seconds"] is not None
+    # One single request, one full batch and one spoken reply
+    assert main.inference_scheduler.stats["jobs"] - jobs_before == 1 + main.INFERENCE_MAX_BATCH_SIZE + 1
+    assert main.metrics_registry.value("ai_model_ready") == 1
+
+
+def test_failed_load_is_reported(fresh_model, monkeypatch):
+    def broken_load():
+        raise RuntimeError("no weights")
+
+    monkeypatch.setattr(main, "load_model_weights", broken_load)
+    with TestClient(main.app) as client:
+        deadline = time.monotonic() + 10
+        while main.model_status["state"] != "failed" and time.monotonic() < deadline:
+            time.sleep(0.05)
+        response = client.get("/ready")
+
+    assert response.status_code == 503
+    assert "no weights" in response.json()["model"]["error"]
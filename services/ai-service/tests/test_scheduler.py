@@ -0,0 +1,136 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from scheduler import InferenceScheduler, SchedulerBusy
+
+
+class StandInRunner:
+    """CPU stand-in for the model: a fixed cost per batch plus a little per request"""
+
+    def __init__(self, batch_seconds: float = 0.01, item_seconds: float = 0.001):
+        self.batch_seconds = batch_seconds
+        self.item_seconds = item_seconds
+        self.batches = []
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, payloads, params):
+        self.entered.set()
+        self.gate.wait()
+        self.batches.append((list(payloads), params))
+        time.sleep(self.batch_seconds + self.item_seconds * len(payloads))
+        return [f"{params}:{payload}" for payload in payloads]
+
+
+def run(scheduler: InferenceScheduler, coroutine):
+    scheduler.start()
+    try:
+        return asyncio.run(coroutine)
+    finally:
+        scheduler.close()
+
+
+def test_concurrent_requests_share_batches():
+    runner = StandInRunner()
+    scheduler = InferenceScheduler(runner, max_batch_size=8, max_wait=0.02)
+
+    async def submit_all():
+        return await asyncio.gather(*(scheduler.submit(i, "greedy") for i in range(32)))
+
+    results = run(scheduler, submit_all())
+    assert results == [f"greedy:{i}" for i in range(32)]
+    sizes = [len(payloads) for payloads, _ in runner.batches]
+    assert sum(sizes) == 32
+    assert max(sizes) <= 8
+    assert len(sizes) <= 8
+    assert scheduler.snapshot()["avg_batch_size"] >= 4
+
+
+def test_only_equal_params_share_a_batch():
+    runner = StandInRunner()
+    scheduler = InferenceScheduler(runner, max_batch_size=8, max_wait=0.02)
+
+    async def submit_all():
+        return await asyncio.gather(*(scheduler.submit(i, "greedy" if i % 2 else "sampled") for i in range(16)))
+
+    results = run(scheduler, submit_all())
+    assert results == [f"{'greedy' if i % 2 else 'sampled'}:{i}" for i in range(16)]
+    for payloads, params in runner.batches:
+        assert all((payload % 2 == 1) == (params == "greedy") for payload in payloads)
+
+
+def test_batch_limit_per_params():
+    runner = StandInRunner()
+    scheduler = InferenceScheduler(
+        runner, max_batch_size=8, max_wait=0.02, batch_limit=lambda params: 1 if params == "audio" else 8
+    )
+
+    async def submit_all():
+        return await asyncio.gather(*(scheduler.submit(i, "audio") for i in range(4)))
+
+    run(scheduler, submit_all())
+    assert [len(payloads) for payloads, _ in runner.batches] == [1, 1, 1, 1]
+
+
+def test_cancelled_requests_are_skipped():
+    runner = StandInRunner()
+    scheduler = InferenceScheduler(runner, max_batch_size=4, max_wait=0.01)
+
+    async def submit_and_cancel():
+        # Hold the worker on the first batch so the next requests queue up behind it
+        runner.gate.clear()
+        first = asyncio.create_task(scheduler.submit("first", "greedy"))
+        await asyncio.to_thread(runner.entered.wait, 5)
+        queued = [asyncio.create_task(scheduler.submit(i, "greedy")) for i in range(4)]
+        await asyncio.sleep(0.01)
+        for task in queued[:3]:
+            task.cancel()
+        await asyncio.sleep(0.01)
+        runner.gate.set()
+        return await first, await queued[3], [task.cancelled() for task in queued[:3]]
+
+    first, last, cancelled = run(scheduler, submit_and_cancel())
+    assert first == "greedy:first" and last == "greedy:3"
+    assert cancelled == [True, True, True]
+    assert [payloads for payloads, _ in runner.batches] == [["first"], [3]]
+    assert scheduler.stats["cancelled"] == 3
+
+
+def test_runner_errors_reach_every_caller_of_the_batch():
+    def failing_runner(payloads, params):
+        raise RuntimeError("out of memory")
+
+    scheduler = InferenceScheduler(failing_runner, max_batch_size=4, max_wait=0.02)
+
+    async def submit_all():
+        return await asyncio.gather(*(scheduler.submit(i, "greedy") for i in range(4)), return_exceptions=True)
+
+    results = run(scheduler, submit_all())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert scheduler.stats["errors"] >= 1
+
+
+def test_full_queue_is_refused():
+    runner = StandInRunner()
+    scheduler = InferenceScheduler(runner, max_batch_size=1, max_wait=0, queue_limit=2)
+
+    async def overfill():
+        # The worker holds request 0, requests 1 and 2 fill the queue
+        runner.gate.clear()
+        held = [asyncio.create_task(scheduler.submit(0, "greedy"))]
+        await asyncio.to_thread(runner.entered.wait, 5)
+        held += [asyncio.create_task(scheduler.submit(i, "greedy")) for i in (1, 2)]
+        await asyncio.sleep(0.01)
+        try:
+            with pytest.raises(SchedulerBusy):
+                await scheduler.submit(3, "greedy")
+        finally:
+            runner.gate.set()
+        return await asyncio.gather(*held)
+
+    assert run(scheduler, overfill()) == ["greedy:0", "greedy:1", "greedy:2"]
+    assert scheduler.stats["rejected"] == 1
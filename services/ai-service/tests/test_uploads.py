@@ -0,0 +1,183 @@
+import os
+import json
+import asyncio
+import functools
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import pytest
+
+pytest.importorskip("torch")
+import main  # noqa: E402
+import uploads  # noqa: E402
+
+BOUNDARY = "radon-test-boundary"
+CHUNK = 64 * 1024
+
+
+def file_part(name: str, filename: str, content_type: str, size: int) -> List[bytes]:
+    """Part header then its content in CHUNK pieces"""
+    header = (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    content = payload(size)
+    return [header] + [content[i:i + CHUNK] for i in range(0, size, CHUNK)] + [b"\r\n"]
+
+
+def payload(size: int) -> bytes:
+    return (bytes(range(256)) * (size // 256 + 1))[:size]
+
+
+def field_part(name: str, value: str) -> List[bytes]:
+    return [f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()]
+
+
+def closing() -> List[bytes]:
+    return [f"--{BOUNDARY}--\r\n".encode()]
+
+
+class Upload:
+    """Drives /qwen/upload through ASGI and counts how much body was read"""
+
+    def __init__(self, chunks: List[bytes], content_length: Optional[int] = None):
+        self.chunks = chunks
+        self.read = 0
+        self.status = None
+        self.body = b""
+        self.headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+        if content_length is not None:
+            self.headers.append((b"content-length", str(content_length).encode()))
+
+    async def receive(self) -> Dict:
+        if self.read < len(self.chunks):
+            self.read += 1
+            return {"type": "http.request", "body": self.chunks[self.read - 1], "more_body": self.read < len(self.chunks)}
+        return {"type": "http.disconnect"}
+
+    async def send(self, message: Dict):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        elif message["type"] == "http.response.body":
+            self.body += message.get("body", b"")
+
+    def run(self) -> "Upload":
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": "/qwen/upload",
+            "raw_path": b"/qwen/upload",
+            "query_string": b"",
+            "root_path": "",
+            "headers": self.headers,
+            "client": ("127.0.0.1", 1234),
+            "server": ("ai-service", 8001)
+        }
+        asyncio.run(main.app(scope, self.receive, self.send))
+        return self
+
+    def json(self):
+        return json.loads(self.body)
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    """Small limits, a private spool directory and a recording model"""
+    monkeypatch.setattr(uploads, "QWEN_UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "spool_multipart", functools.partial(
+        uploads.spool_multipart, file_limit=256 * 1024, total_limit=512 * 1024
+    ))
+    monkeypatch.setattr(main, "check_content_length", functools.partial(
+        uploads.check_content_length, total_limit=512 * 1024
+    ))
+
+    async def loaded():
+        pass
+
+    seen = {}
+
+    async def prepare_conversation(conversation, use_audio_in_video):
+        # The spooled files exist, complete, while the model reads them
+        seen["conversation"] = conversation
+        seen["files"] = []
+        for item in conversation[0]["content"]:
+            if item["type"] != "text":
+                with open(item[item["type"]], "rb") as f:
+                    seen["files"].append(f.read())
+        return {}
+
+    async def generate_qwen_response(prepared, params):
+        seen["params"] = params
+        return {"text": "ok", "audio_url": None, "tokens_used": 2}
+
+    monkeypatch.setattr(main, "load_qwen_model", loaded)
+    monkeypatch.setattr(main, "prepare_conversation", prepare_conversation)
+    monkeypatch.setattr(main, "generate_qwen_response", generate_qwen_response)
+    return SimpleNamespace(path=tmp_path, seen=seen)
+
+
+def test_upload_is_spooled_and_removed(upload_dir):
+    chunks = (
+        file_part("files", "photo.png", "image/png", 100 * 1024)
+        + file_part("files", "notes.txt", "text/plain", 1000)
+        + file_part("files", "clip.wav", "audio/wav", 3000)
+        + field_part("text", "What is this?")
+        + field_part("max_new_tokens", "64")
+        + closing()
+    )
+    upload = Upload(chunks, content_length=sum(map(len, chunks))).run()
+
+    assert upload.status == 200, upload.body
+    assert upload.json()["text"] == "ok"
+    content = upload_dir.seen["conversation"][0]["content"]
+    assert [item["type"] for item in content] == ["image", "audio", "text"]
+    assert content[0]["image"].endswith(".png") and content[1]["audio"].endswith(".wav")
+    assert content[2]["text"] == "What is this?"
+    assert upload_dir.seen["files"] == [payload(100 * 1024), payload(3000)]
+    assert upload_dir.seen["params"].max_new_tokens == 64
+    assert os.listdir(upload_dir.path) == []
+
+
+def test_declared_oversized_body_is_refused_unread(upload_dir):
+    chunks = file_part("files", "video.mp4", "video/mp4", 10 * 1024 * 1024) + closing()
+    upload = Upload(chunks, content_length=sum(map(len, chunks))).run()
+
+    assert upload.status == 413
+    assert upload.read == 0
+    assert os.listdir(upload_dir.path) == []
+
+
+def test_oversized_file_is_refused_while_streaming(upload_dir):
+    # No Content-Length, as with a chunked request
+    chunks = file_part("files", "video.mp4", "video/mp4", 10 * 1024 * 1024) + closing()
+    upload = Upload(chunks).run()
+
+    assert upload.status == 413
+    assert "video.mp4" in upload.json()["detail"]
+    # Stopped right after the 256KB file limit, not at the end of 10MB
+    assert upload.read <= 6 < len(chunks)
+    assert os.listdir(upload_dir.path) == []
+
+
+def test_request_limit_applies_across_files(upload_dir):
+    chunks = []
+    for index in range(4):
+        chunks += file_part("files", f"photo_{index}.png", "image/png", 200 * 1024)
+    chunks += closing()
+    upload = Upload(chunks).run()
+
+    assert upload.status == 413
+    assert upload.json()["detail"] == "Uploads are larger than the request limit"
+    assert upload.read < len(chunks)
+    assert os.listdir(upload_dir.path) == []
+
+
+def test_truncated_or_malformed_body_is_a_400(upload_dir):
+    truncated = file_part("files", "photo.png", "image/png", 1000)[:-1]
+    assert Upload(truncated).run().status == 400
+    assert Upload([b"not a multipart body"]).run().status == 400
+    assert os.listdir(upload_dir.path) == []
@@ -0,0 +1,204 @@
+"""Streaming spool of multipart uploads to private temp files.
+
+The request body is parsed as it arrives, and each file part is written
+straight to its own temp file. Memory per upload stays bounded and the
+original bytes reach the model unchanged. Size limits are checked on
+every chunk: a Content-Length over the request limit is refused before
+any of the body is read, and a body without one is refused as soon as it
+crosses a limit, without reading the rest.
+"""
+import os
+import asyncio
+import logging
+import tempfile
+from typing import AsyncIterator, BinaryIO, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import multipart
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import parse_options_header
+
+logger = logging.getLogger(__name__)
+
+QWEN_UPLOAD_MAX_FILE_BYTES = int(os.getenv("QWEN_UPLOAD_MAX_FILE_BYTES", str(200 * 1024 * 1024)))
+QWEN_UPLOAD_MAX_TOTAL_BYTES = int(os.getenv("QWEN_UPLOAD_MAX_TOTAL_BYTES", str(500 * 1024 * 1024)))
+QWEN_UPLOAD_DIR = os.getenv("QWEN_UPLOAD_DIR", tempfile.gettempdir())
+# Form fields are kept in memory, so each one is capped
+UPLOAD_MAX_FIELD_BYTES = 1024 * 1024
+# Room in Content-Length for boundaries and part headers
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+MEDIA_KINDS = ("image", "audio", "video")
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the per-file or per-request limit"""
+
+
+class InvalidUpload(Exception):
+    """Raised when the body is not a well-formed multipart form"""
+
+
+class SpooledFile(NamedTuple):
+    path: str
+    filename: Optional[str]
+    kind: str
+
+
+class _ByteBudget:
+    """Bytes left for the whole request"""
+
+    def __init__(self, limit: int):
+        self.remaining = limit
+
+    def take(self, amount: int) -> bool:
+        if amount > self.remaining:
+            return False
+        self.remaining -= amount
+        return True
+
+
+def _suffix(filename: Optional[str]) -> str:
+    # Decoders pick the container from the extension; the rest of the name is not trusted
+    extension = os.path.splitext(os.path.basename(filename or ""))[1]
+    return extension[:16] if extension[1:].isalnum() else ""
+
+
+def check_content_length(value: Optional[str], total_limit: int = QWEN_UPLOAD_MAX_TOTAL_BYTES):
+    """Refuse a declared body size over the request limit before reading it"""
+    if value is None:
+        return
+    try:
+        length = int(value)
+    except ValueError:
+        raise InvalidUpload("Invalid Content-Length")
+    if length > total_limit + MULTIPART_OVERHEAD_BYTES:
+        raise UploadTooLarge("Uploads are larger than the request limit")
+
+
+class _Part:
+    def __init__(self):
+        self.headers: Dict[bytes, bytes] = {}
+        self.name = ""
+        self.filename: Optional[str] = None
+        self.kind = ""
+        self.size = 0
+        self.file: Optional[BinaryIO] = None
+        self.path: Optional[str] = None
+        self.value = bytearray()
+
+
+async def spool_multipart(
+    content_type: str,
+    body: AsyncIterator[bytes],
+    file_limit: int = QWEN_UPLOAD_MAX_FILE_BYTES,
+    total_limit: int = QWEN_UPLOAD_MAX_TOTAL_BYTES
+) -> Tuple[List[SpooledFile], Dict[str, str]]:
+    """Parse a multipart body as it streams in.
+
+    Image, audio and video file parts are written to temp files; other
+    files are counted against the limits and dropped. Returns the spooled
+    files in upload order and the form fields. On any failure no temp
+    files are left behind.
+    """
+    media_type, options = parse_options_header(content_type)
+    boundary = options.get(b"boundary")
+    if media_type != b"multipart/form-data" or not boundary:
+        raise InvalidUpload("Expected a multipart/form-data body")
+
+    # The parser reports events synchronously; they are handled between chunks
+    events: List[Tuple[str, bytes]] = []
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        events.append(("header", bytes(header_field).lower() + b"\0" + bytes(header_value)))
+        header_field.clear()
+        header_value.clear()
+
+    parser = multipart.MultipartParser(boundary, {
+        "on_part_begin": lambda: events.append(("begin", b"")),
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", b"")),
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": lambda: events.append(("headers", b""))
+    })
+
+    budget = _ByteBudget(total_limit)
+    spooled: List[SpooledFile] = []
+    fields: Dict[str, str] = {}
+    part: Optional[_Part] = None
+
+    async def close_part(current: _Part):
+        if current.file is not None:
+            await asyncio.to_thread(current.file.close)
+            current.file = None
+
+    try:
+        async for chunk in body:
+            try:
+                parser.write(chunk)
+            except MultipartParseError as e:
+                raise InvalidUpload(f"Malformed multipart body: {str(e)}")
+
+            for event, data in events:
+                if event == "begin":
+                    part = _Part()
+                elif event == "header":
+                    name, _, value = data.partition(b"\0")
+                    part.headers[name] = value
+                elif event == "headers":
+                    _, disposition = parse_options_header(part.headers.get(b"content-disposition", b""))
+                    part.name = disposition.get(b"name", b"").decode("utf-8", errors="replace")
+                    if b"filename" in disposition:
+                        part.filename = disposition[b"filename"].decode("utf-8", errors="replace")
+                        part.kind = part.headers.get(b"content-type", b"").decode("latin-1").split("/")[0].lower()
+                        if part.kind in MEDIA_KINDS:
+                            fd, part.path = tempfile.mkstemp(
+                                prefix="qwen_upload_", suffix=_suffix(part.filename), dir=QWEN_UPLOAD_DIR
+                            )
+                            part.file = os.fdopen(fd, "wb")
+                            spooled.append(SpooledFile(part.path, part.filename, part.kind))
+                elif event == "data":
+                    part.size += len(data)
+                    if not budget.take(len(data)):
+                        raise UploadTooLarge("Uploads are larger than the request limit")
+                    if part.filename is None:
+                        if part.size > UPLOAD_MAX_FIELD_BYTES:
+                            raise UploadTooLarge(f"Form field {part.name} is too large")
+                        part.value.extend(data)
+                    elif part.size > file_limit:
+                        raise UploadTooLarge(f"{part.filename} is larger than {file_limit // (1024 * 1024)}MB")
+                    elif part.file is not None:
+                        await asyncio.to_thread(part.file.write, data)
+                elif event == "end":
+                    if part.filename is None:
+                        fields[part.name] = part.value.decode("utf-8", errors="replace")
+                    await close_part(part)
+                    part = None
+            events.clear()
+        parser.finalize()
+        if part is not None:
+            raise InvalidUpload("Multipart body ended inside a part")
+    except BaseException:
+        if part is not None:
+            await close_part(part)
+        await asyncio.to_thread(remove_files, [file.path for file in spooled])
+        raise
+
+    return spooled, fields
+
+
+def remove_files(paths: Sequence[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove upload {path}: {str(e)}")
@@ -0,0 +1,223 @@
+"""Tier-aware admission control with an adaptive concurrency limit.
+
+Requests to an admission-controlled upstream (the GPU-backed ai-service)
+take a slot before they are forwarded. The number of slots follows a
+gradient limiter: it grows while latency stays near the no-load baseline
+and shrinks as queueing inside the upstream drives latency up. Requests
+that find no free slot wait in a bounded queue for their subscription
+tier; freed slots go to the tiers by smooth weighted round robin, so a
+burst of free-tier traffic cannot starve paying users. A full queue or an
+exhausted wait budget sheds the request with 503 and Retry-After.
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Share of freed slots per tier, relative to each other
+TIER_WEIGHTS = {"free": 1, "pro": 4, "team": 6, "enterprise": 8}
+# Most requests each tier may have waiting
+TIER_QUEUE_LIMITS = {"free": 32, "pro": 128, "team": 256, "enterprise": 256}
+# Longest a request may wait for a slot before it is shed (seconds)
+TIER_MAX_WAIT = {"free": 5.0, "pro": 15.0, "team": 20.0, "enterprise": 25.0}
+
+ADMISSION_INITIAL_LIMIT = int(os.getenv("ADMISSION_INITIAL_LIMIT", "16"))
+ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", "2"))
+ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", "256"))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class GradientLimiter:
+    """Concurrency limit driven by the ratio of baseline to sampled latency.
+
+    The baseline is a slow moving average of latency; each sample moves the
+    limit towards `limit * gradient + sqrt(limit)`, where the gradient is
+    baseline / sample clamped to [0.5, 1]. The sqrt term leaves headroom
+    to probe for more capacity while latency holds steady.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = ADMISSION_INITIAL_LIMIT,
+        min_limit: int = ADMISSION_MIN_LIMIT,
+        max_limit: int = ADMISSION_MAX_LIMIT,
+        smoothing: float = 0.2,
+        tolerance: float = 1.5,
+        baseline_window: int = 600
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+        self.baseline_alpha = 2.0 / (baseline_window + 1)
+        self.baseline_rtt: Optional[float] = None
+        self.last_rtt: Optional[float] = None
+
+    def update(self, rtt: float, in_flight: int, ok: bool):
+        self.last_rtt = rtt
+        if not ok:
+            # Errors and timeouts are the strongest overload signal
+            new_limit = self.limit * 0.9
+        else:
+            if self.baseline_rtt is None:
+                self.baseline_rtt = rtt
+            else:
+                self.baseline_rtt += self.baseline_alpha * (rtt - self.baseline_rtt)
+                # Latency fell well below the baseline: recover quickly
+                if self.baseline_rtt > 2 * rtt:
+                    self.baseline_rtt = 0.9 * self.baseline_rtt + 0.1 * rtt
+
+            # Not using the slots we have, so latency says nothing about them
+            if in_flight < self.limit / 2:
+                return
+
+            gradient = max(0.5, min(1.0, self.tolerance * self.baseline_rtt / rtt))
+            new_limit = self.limit * gradient + math.sqrt(self.limit)
+
+        new_limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, new_limit))
+
+
+class AdmissionSlot:
+    """A granted slot; release it once the upstream call has finished"""
+
+    def __init__(self, controller: "AdmissionController", tier: str, queue_wait: float):
+        self.controller = controller
+        self.tier = tier
+        self.queue_wait = queue_wait
+        self.released = False
+
+    def sample(self, rtt: float, ok: bool):
+        """Feed the latency of the upstream call into the limiter"""
+        self.controller.limiter.update(rtt, self.controller.in_flight, ok)
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release()
+
+
+class AdmissionController:
+    """Bounded per-tier queues in front of one upstream"""
+
+    def __init__(self, service_name: str, limiter: Optional[GradientLimiter] = None):
+        self.service_name = service_name
+        self.limiter = limiter or GradientLimiter()
+        self.in_flight = 0
+        self.queues: Dict[str, deque] = {tier: deque() for tier in TIER_WEIGHTS}
+        self.current_weights: Dict[str, int] = {tier: 0 for tier in TIER_WEIGHTS}
+        self.stats = {
+            tier: {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_timeout": 0, "queue_wait_total": 0.0}
+            for tier in TIER_WEIGHTS
+        }
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limiter.limit)
+
+    def _retry_after(self, tier: str) -> int:
+        """Rough time until the tier's queue drains"""
+        rtt = self.limiter.baseline_rtt or 1.0
+        waiting = len(self.queues[tier]) + 1
+        return max(1, math.ceil(rtt * waiting / max(1, int(self.limiter.limit))))
+
+    def _next_tier(self) -> Optional[str]:
+        """Smooth weighted round robin over tiers with waiting requests"""
+        total = 0
+        best = None
+        for tier, queue in self.queues.items():
+            # Drop waiters that gave up
+            while queue and queue[0].done():
+                queue.popleft()
+            if not queue:
+                continue
+            weight = TIER_WEIGHTS[tier]
+            self.current_weights[tier] += weight
+            total += weight
+            if best is None or self.current_weights[tier] > self.current_weights[best]:
+                best = tier
+        if best is not None:
+            self.current_weights[best] -= total
+        return best
+
+    def _dispatch(self):
+        while self._has_capacity():
+            tier = self._next_tier()
+            if tier is None:
+                return
+            waiter = self.queues[tier].popleft()
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    async def acquire(self, tier: str) -> AdmissionSlot:
+        """Wait for a slot in the tier's queue or raise AdmissionRejected"""
+        if tier not in TIER_WEIGHTS:
+            tier = "free"
+        stats = self.stats[tier]
+        start = time.perf_counter()
+
+        if self._has_capacity() and not any(self.queues.values()):
+            self.in_flight += 1
+            stats["admitted"] += 1
+            return AdmissionSlot(self, tier, 0.0)
+
+        queue = self.queues[tier]
+        if len(queue) >= TIER_QUEUE_LIMITS[tier]:
+            stats["shed_queue_full"] += 1
+            raise AdmissionRejected("queue full", self._retry_after(tier))
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        stats["queued"] += 1
+        # The queue may be non-empty only because of stale waiters
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(waiter, timeout=TIER_MAX_WAIT[tier])
+        except asyncio.TimeoutError:
+            stats["shed_timeout"] += 1
+            raise AdmissionRejected("queue wait budget exceeded", self._retry_after(tier))
+        except asyncio.CancelledError:
+            # Granted just as the client went away: hand the slot on
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+
+        queue_wait = time.perf_counter() - start
+        stats["admitted"] += 1
+        stats["queue_wait_total"] += queue_wait
+        return AdmissionSlot(self, tier, queue_wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limiter.limit, 2),
+            "in_flight": self.in_flight,
+            "baseline_rtt_ms": round(self.limiter.baseline_rtt * 1000, 2) if self.limiter.baseline_rtt else None,
+            "last_rtt_ms": round(self.limiter.last_rtt * 1000, 2) if self.limiter.last_rtt else None,
+            "queued": {tier: len(queue) for tier, queue in self.queues.items()},
+            "tiers": {
+                tier: {
+                    **{key: value for key, value in stats.items() if key != "queue_wait_total"},
+                    "avg_queue_wait_ms": round(stats["queue_wait_total"] / stats["admitted"] * 1000, 2)
+                    if stats["admitted"] else 0.0
+                }
+                for tier, stats in self.stats.items()
+            }
+        }
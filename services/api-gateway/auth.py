@@ -0,0 +1,210 @@
+"""Clerk JWT verification with cached JWKS signing keys.
+
+Signing keys are fetched from Clerk's JWKS endpoint, kept in memory and
+refreshed in the background when they expire or when a token names an
+unknown `kid`. Tokens that already passed verification are remembered in a
+bounded LRU keyed by their SHA-256 digest until their `exp`, so repeat
+requests with the same bearer token skip the signature check entirely.
+"""
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+import httpx
+import jwt
+
+logger = logging.getLogger(__name__)
+
+# Clerk configuration
+CLERK_ISSUER = os.getenv("CLERK_ISSUER")
+CLERK_JWKS_URL = os.getenv("CLERK_JWKS_URL") or (
+    f"{CLERK_ISSUER.rstrip('/')}/.well-known/jwks.json" if CLERK_ISSUER else None
+)
+CLERK_AUDIENCE = os.getenv("CLERK_AUDIENCE")
+CLERK_ALGORITHMS = ["RS256"]
+
+# Cache tuning
+JWKS_CACHE_TTL = float(os.getenv("JWKS_CACHE_TTL", "3600"))
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_LEEWAY = float(os.getenv("TOKEN_LEEWAY", "5"))
+
+
+class SigningKeyUnavailable(Exception):
+    """Raised when no signing key can be obtained to verify a token"""
+
+
+class UnknownSigningKey(jwt.InvalidTokenError):
+    """Raised when a token names a kid that is not in Clerk's key set"""
+
+
+class ClerkTokenVerifier:
+    """Verifies Clerk session tokens against cached JWKS keys"""
+
+    def __init__(
+        self,
+        jwks_url: Optional[str] = CLERK_JWKS_URL,
+        issuer: Optional[str] = CLERK_ISSUER,
+        audience: Optional[str] = CLERK_AUDIENCE,
+        cache_size: int = TOKEN_CACHE_SIZE
+    ):
+        self.jwks_url = jwks_url
+        self.issuer = issuer
+        self.audience = audience
+        self.cache_size = cache_size
+        self.keys: Dict[str, Any] = {}
+        self.keys_fetched_at = 0.0
+        self.token_cache: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self.stats = {
+            "token_cache_hits": 0,
+            "token_cache_misses": 0,
+            "key_refreshes": 0,
+            "key_refresh_errors": 0,
+            "verify_failures": 0
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Create the JWKS client and prefetch the signing keys"""
+        if not self.jwks_url:
+            logger.warning("CLERK_JWKS_URL/CLERK_ISSUER not set, token signatures cannot be verified")
+            return
+        self._client = httpx.AsyncClient(timeout=5.0)
+        try:
+            await self.refresh_keys()
+        except Exception as e:
+            logger.error(f"Initial JWKS fetch failed: {str(e)}")
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def refresh_keys(self, force: bool = False):
+        """Fetch the JWKS document; concurrent callers share one fetch"""
+        fetched_at = self.keys_fetched_at
+        async with self._refresh_lock:
+            # Someone else refreshed while we waited for the lock
+            if self.keys_fetched_at != fetched_at and not force:
+                return
+            try:
+                response = await self._client.get(self.jwks_url)
+                response.raise_for_status()
+                keys = {}
+                for jwk in response.json().get("keys", []):
+                    try:
+                        keys[jwk["kid"]] = jwt.PyJWK(jwk).key
+                    except (KeyError, jwt.PyJWKError) as e:
+                        logger.warning(f"Skipping unusable JWKS key: {str(e)}")
+                self.keys = keys
+                self.keys_fetched_at = time.monotonic()
+                self.stats["key_refreshes"] += 1
+                logger.info(f"Loaded {len(keys)} Clerk signing keys")
+            except Exception:
+                self.stats["key_refresh_errors"] += 1
+                raise
+
+    def _refresh_in_background(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self):
+        try:
+            await self.refresh_keys()
+        except Exception as e:
+            logger.error(f"Background JWKS refresh failed: {str(e)}")
+
+    async def get_signing_key(self, kid: Optional[str]):
+        """Signing key for a kid, refreshing the key set when needed"""
+        if self._client is None:
+            raise SigningKeyUnavailable("JWKS endpoint is not configured")
+
+        age = time.monotonic() - self.keys_fetched_at
+        key = self.keys.get(kid)
+        if key is not None:
+            # Serve the cached key and renew the set off the request path
+            if age > JWKS_CACHE_TTL:
+                self._refresh_in_background()
+            return key
+
+        # Unknown kid: Clerk may have rotated keys. Throttle so tokens with
+        # made-up kids cannot turn into a flood of JWKS fetches.
+        if age > JWKS_MIN_REFRESH_INTERVAL:
+            try:
+                await self.refresh_keys()
+            except Exception as e:
+                raise SigningKeyUnavailable(f"JWKS refresh failed: {str(e)}")
+            key = self.keys.get(kid)
+            if key is not None:
+                return key
+
+        # An InvalidTokenError, so callers answer 401 like for any other bad token
+        raise UnknownSigningKey(f"Unknown signing key: {kid}")
+
+    def _cache_get(self, digest: bytes) -> Optional[Dict[str, Any]]:
+        entry = self.token_cache.get(digest)
+        if entry is None:
+            return None
+        claims, exp = entry
+        if exp <= time.time():
+            del self.token_cache[digest]
+            return None
+        self.token_cache.move_to_end(digest)
+        return claims
+
+    def _cache_put(self, digest: bytes, claims: Dict[str, Any]):
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)):
+            return
+        self.token_cache[digest] = (claims, float(exp))
+        self.token_cache.move_to_end(digest)
+        while len(self.token_cache) > self.cache_size:
+            self.token_cache.popitem(last=False)
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Return the verified claims of a token or raise jwt.InvalidTokenError"""
+        digest = hashlib.sha256(token.encode()).digest()
+        claims = self._cache_get(digest)
+        if claims is not None:
+            self.stats["token_cache_hits"] += 1
+            return claims
+        self.stats["token_cache_misses"] += 1
+
+        try:
+            header = jwt.get_unverified_header(token)
+            key = await self.get_signing_key(header.get("kid"))
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=CLERK_ALGORITHMS,
+                issuer=self.issuer,
+                audience=self.audience,
+                leeway=TOKEN_LEEWAY,
+                options={
+                    "require": ["exp", "sub"],
+                    "verify_aud": self.audience is not None
+                }
+            )
+        except jwt.InvalidTokenError:
+            self.stats["verify_failures"] += 1
+            raise
+
+        self._cache_put(digest, claims)
+        return claims
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["token_cache_hits"] + self.stats["token_cache_misses"]
+        return {
+            **self.stats,
+            "token_cache_size": len(self.token_cache),
+            "token_cache_hit_ratio": round(self.stats["token_cache_hits"] / lookups, 3) if lookups else 0.0,
+            "signing_keys": len(self.keys)
+        }
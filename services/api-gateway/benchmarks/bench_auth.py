@@ -0,0 +1,91 @@
+"""Microbenchmark of Clerk token verification, before and after key caching.
+
+Compares three paths for a single verified request:
+
+- per_request_jwks: fetch the JWKS and check the signature on every call,
+  which is what verifying without a key cache costs;
+- cached_keys: keys from ClerkTokenVerifier's cache, signature still
+  checked (a token seen for the first time);
+- cached_token: a token already verified, served from the token LRU.
+
+The JWKS endpoint is an in-process mock with JWKS_LATENCY_MS of added
+latency, so the numbers isolate the gateway's own cost plus one round trip.
+
+    python benchmarks/bench_auth.py [iterations]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+
+import httpx
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth import CLERK_ALGORITHMS, ClerkTokenVerifier  # noqa: E402
+
+ISSUER = "https://clerk.example.test"
+JWKS_URL = f"{ISSUER}/.well-known/jwks.json"
+JWKS_LATENCY_MS = float(os.getenv("JWKS_LATENCY_MS", "20"))
+
+
+def make_key():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": "bench", "alg": "RS256", "use": "sig"})
+    return private_key, jwk
+
+
+def make_tokens(private_key, count: int):
+    exp = int(time.time()) + 3600
+    return [
+        jwt.encode({"sub": f"user_{i}", "iss": ISSUER, "exp": exp}, private_key, algorithm="RS256", headers={"kid": "bench"})
+        for i in range(count)
+    ]
+
+
+def jwks_client(jwk) -> httpx.AsyncClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(JWKS_LATENCY_MS / 1000)
+        return httpx.Response(200, json={"keys": [jwk]})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def per_request_jwks(client: httpx.AsyncClient, token: str):
+    response = await client.get(JWKS_URL)
+    keys = {key["kid"]: jwt.PyJWK(key).key for key in response.json()["keys"]}
+    kid = jwt.get_unverified_header(token)["kid"]
+    return jwt.decode(token, keys[kid], algorithms=CLERK_ALGORITHMS, issuer=ISSUER)
+
+
+async def timed(label: str, calls):
+    start = time.perf_counter()
+    for call in calls:
+        await call
+    elapsed = time.perf_counter() - start
+    print(f"{label:<18} {len(calls):>6} calls  {elapsed / len(calls) * 1e6:>10.1f} us/call")
+
+
+async def main(iterations: int):
+    private_key, jwk = make_key()
+    tokens = make_tokens(private_key, iterations)
+
+    client = jwks_client(jwk)
+    await timed("per_request_jwks", [per_request_jwks(client, token) for token in tokens])
+    await client.aclose()
+
+    verifier = ClerkTokenVerifier(jwks_url=JWKS_URL, issuer=ISSUER, audience=None, cache_size=iterations)
+    verifier._client = jwks_client(jwk)
+    await verifier.refresh_keys(force=True)
+    await timed("cached_keys", [verifier.verify(token) for token in tokens])
+    await timed("cached_token", [verifier.verify(token) for token in tokens])
+    await verifier.close()
+    print(json.dumps(verifier.snapshot()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
@@ -0,0 +1,86 @@
+"""Bytes saved versus CPU cost of response compression.
+
+Runs the gateway's encoders over three typical bodies:
+
+- chat_history: a JSON page of chat messages (the bulk of buffered traffic);
+- token_stream: an SSE stream of single-token events, compressed and
+  flushed event by event as CompressionMiddleware does for streams;
+- random: incompressible bytes, the worst case.
+
+For each encoding and level it prints the compressed size, the share of
+bytes saved and the CPU time per response (time.process_time), i.e. what
+every compressed response costs the gateway.
+
+    python benchmarks/bench_compression.py [repeats]
+"""
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import compression  # noqa: E402
+
+LEVELS = {
+    "gzip": ("GZIP_LEVEL", (1, 5, 9)),
+    "br": ("BROTLI_QUALITY", (1, 4, 9)),
+    "zstd": ("ZSTD_LEVEL", (1, 3, 9)),
+}
+
+
+def chat_history() -> list:
+    messages = [
+        {
+            "id": f"msg_{i}",
+            "chat_id": "chat_42",
+            "role": "user" if i % 2 else "assistant",
+            "content": f"Message {i}: could you explain how token buckets refill over time and why idle buckets can be dropped?",
+            "created_at": f"2024-05-01T12:{i % 60:02d}:00Z",
+            "tokens_used": 40 + i % 17
+        }
+        for i in range(200)
+    ]
+    return [json.dumps({"messages": messages, "total": len(messages)}).encode()]
+
+
+def token_stream() -> list:
+    words = "The bucket refills at a steady rate until it is full again".split()
+    return [f"data: {json.dumps({'token': words[i % len(words)] + ' '})}\n\n".encode() for i in range(2000)]
+
+
+def random_bytes() -> list:
+    return [os.urandom(256 * 1024)]
+
+
+def compress(encoding: str, chunks: list) -> int:
+    encoder = compression.ENCODERS[encoding]()
+    out = 0
+    for index, chunk in enumerate(chunks):
+        out += len(encoder.compress(chunk, index == len(chunks) - 1))
+    return out
+
+
+def main(repeats: int):
+    bodies = {"chat_history": chat_history(), "token_stream": token_stream(), "random": random_bytes()}
+    print(f"{'body':<13} {'encoding':<9} {'level':>5} {'bytes in':>10} {'bytes out':>10} {'saved':>7} {'cpu us':>9} {'MB/s':>8}")
+    for name, chunks in bodies.items():
+        size = sum(len(chunk) for chunk in chunks)
+        for encoding, (setting, levels) in LEVELS.items():
+            if encoding not in compression.ENCODERS:
+                print(f"{name:<13} {encoding:<9} {'-':>5}  (package not installed)")
+                continue
+            for level in levels:
+                setattr(compression, setting, level)
+                start = time.process_time()
+                for _ in range(repeats):
+                    out = compress(encoding, chunks)
+                cpu = (time.process_time() - start) / repeats
+                print(
+                    f"{name:<13} {encoding:<9} {level:>5} {size:>10} {out:>10} "
+                    f"{1 - out / size:>7.1%} {cpu * 1e6:>9.0f} {size / cpu / 1e6 if cpu else 0:>8.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,265 @@
+"""Per-user response cache for idempotent GETs at the gateway.
+
+Cached routes are listed in CACHE_RULES with their TTL. Entries carry a
+strong ETag so clients revalidate with If-None-Match and get 304s. Entries
+are dropped when the owning user writes to the same route through the
+gateway, and when the services publish a matching event on Redis.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List, NamedTuple, Optional, Set, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+CACHE_EVENTS_REDIS_URL = os.getenv("REDIS_URL")
+
+# Scope used for entries shared by every user (static catalogs)
+SHARED_SCOPE = "*"
+
+
+class CacheRule(NamedTuple):
+    prefix: str
+    ttl: float
+    shared: bool = False
+
+
+CACHE_RULES = [
+    CacheRule("/api/settings", 300),
+    CacheRule("/api/profile", 300),
+    CacheRule("/api/subscriptions", 300),
+    CacheRule("/api/ai/personalities", 3600, shared=True),
+    CacheRule("/api/ai/functions", 3600, shared=True),
+]
+
+# Events published by the services and the route prefixes they invalidate
+EVENT_INVALIDATIONS = {
+    "user.settings.updated": ["/api/settings"],
+    "user.updated": ["/api/profile"],
+    "user.deleted": ["/api/profile", "/api/settings", "/api/subscriptions"],
+    "subscription.created": ["/api/subscriptions", "/api/profile"],
+    "subscription.updated": ["/api/subscriptions", "/api/profile"],
+    "subscription.deleted": ["/api/subscriptions", "/api/profile"],
+}
+
+
+class CacheEntry(NamedTuple):
+    body: bytes
+    status_code: int
+    headers: Dict[str, str]
+    etag: str
+    expires_at: float
+    scope: str
+    prefix: str
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of If-None-Match against an ETag (RFC 7232 3.2)"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def not_modified(etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    extra = {
+        name: value
+        for name, value in (headers or {}).items()
+        if name.lower() in ("cache-control", "vary", "expires")
+    }
+    return Response(status_code=304, headers={**extra, "ETag": etag})
+
+
+class ResponseCache:
+    """Memory-bounded LRU of GET responses with per-route TTLs"""
+
+    def __init__(
+        self,
+        rules: List[CacheRule] = CACHE_RULES,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        max_entry_bytes: int = RESPONSE_CACHE_MAX_ENTRY_BYTES
+    ):
+        self.rules = rules
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.entries: "OrderedDict[Tuple[str, str, str], CacheEntry]" = OrderedDict()
+        self.scope_index: Dict[str, Set[Tuple[str, str, str]]] = {}
+        self.size_bytes = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "not_modified": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+    def rule_for(self, path: str) -> Optional[CacheRule]:
+        for rule in self.rules:
+            if path == rule.prefix or path.startswith(rule.prefix + "/"):
+                return rule
+        return None
+
+    def key(self, rule: CacheRule, user_id: str, path: str, query: str) -> Tuple[str, str, str]:
+        return (SHARED_SCOPE if rule.shared else user_id, path, query)
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def put(
+        self,
+        key: Tuple[str, str, str],
+        rule: CacheRule,
+        body: bytes,
+        status_code: int,
+        headers: Dict[str, str]
+    ) -> Optional[CacheEntry]:
+        """Store a response; returns the entry, or None if it is too large"""
+        if len(body) > self.max_entry_bytes:
+            return None
+        if key in self.entries:
+            self._remove(key)
+
+        etag = headers.get("etag") or make_etag(body)
+        stored_headers = {
+            name: value
+            for name, value in headers.items()
+            if name.lower() not in ("content-length", "etag", "date", "server")
+        }
+        # Let browsers keep a copy but revalidate it with If-None-Match
+        stored_headers.setdefault("cache-control", "public, no-cache" if rule.shared else "private, no-cache")
+        entry = CacheEntry(body, status_code, stored_headers, etag, time.monotonic() + rule.ttl, key[0], rule.prefix)
+        self.entries[key] = entry
+        self.scope_index.setdefault(key[0], set()).add(key)
+        self.size_bytes += len(body)
+        self.stats["stores"] += 1
+
+        while self.size_bytes > self.max_bytes and self.entries:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+        return entry
+
+    def _remove(self, key: Tuple[str, str, str]):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.size_bytes -= len(entry.body)
+        keys = self.scope_index.get(entry.scope)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.scope_index[entry.scope]
+
+    def invalidate(self, user_id: str, prefixes: List[str]):
+        """Drop a user's entries under the given route prefixes"""
+        for key in list(self.scope_index.get(user_id, ())):
+            if self.entries[key].prefix in prefixes:
+                self._remove(key)
+                self.stats["invalidations"] += 1
+
+    def invalidate_path(self, user_id: str, path: str):
+        """Drop a user's entries for the route a write went to"""
+        rule = self.rule_for(path)
+        if rule is not None and not rule.shared:
+            self.invalidate(user_id, [rule.prefix])
+
+    def respond(self, entry: CacheEntry, request: Request, hit: bool = True) -> Response:
+        """Serve an entry, answering 304 when the client's copy is current"""
+        if etag_matches(request, entry.etag):
+            self.stats["not_modified"] += 1
+            return not_modified(entry.etag, entry.headers)
+        return Response(
+            content=entry.body,
+            status_code=entry.status_code,
+            headers={**entry.headers, "ETag": entry.etag, "X-Cache": "HIT" if hit else "MISS"}
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "size_bytes": self.size_bytes,
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0
+        }
+
+
+class CacheInvalidator:
+    """Listens to the services' events:* Redis channels and invalidates entries"""
+
+    def __init__(self, cache: ResponseCache, redis_url: Optional[str] = CACHE_EVENTS_REDIS_URL):
+        self.cache = cache
+        self.redis_url = redis_url
+        self._task: Optional[asyncio.Task] = None
+
+    def handle_event(self, event_type: str, data: Dict[str, Any]):
+        prefixes = EVENT_INVALIDATIONS.get(event_type)
+        user_id = data.get("user_id")
+        if prefixes and user_id:
+            self.cache.invalidate(user_id, prefixes)
+
+    async def _listen_forever(self):
+        import redis.asyncio as redis
+
+        while True:
+            client = redis.from_url(self.redis_url)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe("events:*")
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage":
+                        continue
+                    try:
+                        event = json.loads(message["data"])
+                        self.handle_event(event.get("type", ""), event.get("data") or {})
+                    except (ValueError, AttributeError) as e:
+                        logger.warning(f"Ignoring malformed event: {str(e)}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache invalidation listener error, reconnecting: {str(e)}")
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.close()
+                await client.close()
+
+    async def start(self):
+        if not self.redis_url:
+            logger.warning("REDIS_URL not set, response cache relies on TTLs and local writes only")
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen_forever())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
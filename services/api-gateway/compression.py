@@ -0,0 +1,255 @@
+"""Response compression negotiated through Accept-Encoding.
+
+Supports gzip always, and brotli / zstd when their packages are installed.
+Unlike buffering compressors, every body chunk is compressed and flushed
+as it passes through, so SSE events and token streams reach the client
+without added latency. Small bodies, responses that already carry a
+Content-Encoding and already-compressed media types are left untouched.
+"""
+import os
+import time
+import zlib
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Chunks at least this large are compressed in a worker thread
+COMPRESSION_THREAD_THRESHOLD = int(os.getenv("COMPRESSION_THREAD_THRESHOLD", str(256 * 1024)))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+
+# Server preference when the client accepts several encodings equally
+ENCODING_PREFERENCE = ["zstd", "br", "gzip"]
+
+# Content types that are already compressed
+INCOMPRESSIBLE_PREFIXES = (
+    "image/",
+    "video/",
+    "audio/",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zstd",
+    "application/octet-stream",
+    "application/pdf",
+)
+COMPRESSIBLE_SVG = "image/svg+xml"
+
+# Bytes saved and time spent per encoding, reported on /metrics
+compression_stats: Dict[str, Dict[str, float]] = {}
+
+
+class _GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        flush_mode = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        return self._compressor.compress(data) + self._compressor.flush(flush_mode)
+
+
+class _BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.process(data)
+        return out + (self._compressor.finish() if final else self._compressor.flush())
+
+
+class _ZstdEncoder:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.compress(data)
+        if final:
+            return out + self._compressor.flush()
+        return out + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+
+ENCODERS = {"gzip": _GzipEncoder}
+if brotli is not None:
+    ENCODERS["br"] = _BrotliEncoder
+if zstandard is not None:
+    ENCODERS["zstd"] = _ZstdEncoder
+
+for _encoding in ENCODERS:
+    compression_stats[_encoding] = {"responses": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0}
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header"""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        fields = part.strip().split(";")
+        coding = fields[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in fields[1:]:
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    best = None
+    best_quality = 0.0
+    for coding in ENCODING_PREFERENCE:
+        if coding not in ENCODERS:
+            continue
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def _is_compressible(headers: List[Tuple[bytes, bytes]]) -> bool:
+    content_type = ""
+    for name, value in headers:
+        name = name.lower()
+        if name == b"content-encoding":
+            return False
+        if name == b"content-type":
+            content_type = value.decode("latin-1").lower()
+        if name == b"cache-control" and b"no-transform" in value.lower():
+            return False
+    if content_type.startswith(COMPRESSIBLE_SVG):
+        return True
+    return not content_type.startswith(INCOMPRESSIBLE_PREFIXES)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses chunk by chunk"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate_encoding(accept_encoding) if accept_encoding else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, _CompressingSend(self, send, encoding))
+
+
+class _CompressingSend:
+    """Wraps ASGI send for one response"""
+
+    def __init__(self, middleware: CompressionMiddleware, send, encoding: str):
+        self.middleware = middleware
+        self.send = send
+        self.encoding = encoding
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            status = message["status"]
+            if status < 200 or status in (204, 304) or not _is_compressible(message.get("headers", [])):
+                self.passthrough = True
+                await self.send(message)
+            else:
+                # Hold the start until the first chunk shows whether it is worth compressing
+                self.start_message = message
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            if not more_body and len(body) < self.middleware.minimum_size:
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            await self._start_compressing()
+
+        compressed = await self._compress(body, final=not more_body)
+        if compressed or not more_body:
+            await self.send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+    async def _start_compressing(self):
+        self.encoder = ENCODERS[self.encoding]()
+        headers = []
+        vary = None
+        for name, value in self.start_message.get("headers", []):
+            lower = name.lower()
+            if lower == b"content-length":
+                continue
+            if lower == b"vary":
+                vary = value
+                continue
+            if lower == b"etag" and not value.startswith(b"W/"):
+                # The compressed body is a different representation
+                value = b"W/" + value
+            headers.append((name, value))
+        if vary is None:
+            vary = b"Accept-Encoding"
+        elif b"accept-encoding" not in vary.lower():
+            vary = vary + b", Accept-Encoding"
+        headers.append((b"vary", vary))
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        await self.send({**self.start_message, "headers": headers})
+        compression_stats[self.encoding]["responses"] += 1
+
+    async def _compress(self, data: bytes, final: bool) -> bytes:
+        start = time.perf_counter()
+        if len(data) < COMPRESSION_THREAD_THRESHOLD:
+            compressed = self.encoder.compress(data, final)
+        else:
+            # zlib, brotli and zstd release the GIL while compressing
+            compressed = await asyncio.to_thread(self.encoder.compress, data, final)
+        stats = compression_stats[self.encoding]
+        stats["bytes_in"] += len(data)
+        stats["bytes_out"] += len(compressed)
+        stats["cpu_seconds"] += time.perf_counter() - start
+        return compressed
+
+
+def compression_snapshot() -> Dict[str, Any]:
+    """Per-encoding totals with the achieved compression ratio"""
+    return {
+        encoding: {
+            **stats,
+            "cpu_seconds": round(stats["cpu_seconds"], 4),
+            "ratio": round(stats["bytes_out"] / stats["bytes_in"], 3) if stats["bytes_in"] else None
+        }
+        for encoding, stats in compression_stats.items()
+    }
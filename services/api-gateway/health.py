@@ -0,0 +1,114 @@
+"""Background health probing of the upstream services"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from upstream import UpstreamPool, Replica
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "10"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2"))
+HEALTH_LATENCY_WINDOW = int(os.getenv("HEALTH_LATENCY_WINDOW", "10"))
+
+
+class HealthProber:
+    """Probes every upstream concurrently on an interval.
+
+    `/health` answers from the latest snapshot, so load-balancer probes never
+    fan out to the upstreams and one slow service cannot delay the answer by
+    more than the probe timeout.
+    """
+
+    def __init__(
+        self,
+        pool: UpstreamPool,
+        interval: float = HEALTH_PROBE_INTERVAL,
+        timeout: float = HEALTH_PROBE_TIMEOUT
+    ):
+        self.pool = pool
+        self.interval = interval
+        self.timeout = timeout
+        self.status: Dict[str, Dict[str, Any]] = {}
+        self.latencies: Dict[str, deque] = {}
+        self.last_probe: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._probe_lock = asyncio.Lock()
+
+    async def _probe_replica(self, replica: Replica) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            response = await replica.client.get("/health", timeout=self.timeout)
+            healthy = response.status_code == 200
+            error = None if healthy else f"HTTP {response.status_code}"
+        except Exception as e:
+            healthy = False
+            error = type(e).__name__
+        return {
+            "url": replica.url,
+            "healthy": healthy,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            "error": error
+        }
+
+    async def _probe_service(self, service_name: str) -> Dict[str, Any]:
+        replicas = await asyncio.gather(
+            *(self._probe_replica(replica) for replica in self.pool.replicas[service_name])
+        )
+        healthy = [replica for replica in replicas if replica["healthy"]]
+        latency_ms = min(replica["latency_ms"] for replica in healthy) if healthy else None
+
+        previous = self.status.get(service_name, {})
+        window = self.latencies.setdefault(service_name, deque(maxlen=HEALTH_LATENCY_WINDOW))
+        if latency_ms is not None:
+            window.append(latency_ms)
+
+        if len(healthy) == len(replicas):
+            status = "healthy"
+        elif healthy:
+            status = "degraded"
+        else:
+            status = "unhealthy"
+
+        return {
+            "status": status,
+            "latency_ms": latency_ms,
+            "avg_latency_ms": round(sum(window) / len(window), 2) if window else None,
+            "consecutive_failures": 0 if healthy else previous.get("consecutive_failures", 0) + 1,
+            "replicas": replicas,
+            "checked_at": datetime.utcnow().isoformat()
+        }
+
+    async def probe(self) -> Dict[str, Dict[str, Any]]:
+        """Probe all upstreams at once and update the snapshot"""
+        async with self._probe_lock:
+            names = list(self.pool.replicas)
+            results = await asyncio.gather(*(self._probe_service(name) for name in names))
+            self.status = dict(zip(names, results))
+            self.last_probe = datetime.utcnow().isoformat()
+            return self.status
+
+    async def _probe_forever(self):
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error(f"Health probe failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._probe_forever())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,182 @@
+"""Hedged idempotent reads against replicated upstreams.
+
+If the first attempt has not answered within the route's recent p95
+latency, a second attempt goes to a different replica and whichever
+answers first wins; the other is cancelled. Hedges are paid for from a
+budget that every primary request tops up by HEDGE_BUDGET_RATIO, so
+hedging adds at most that share of extra load and backs off on its own
+when a service slows down as a whole.
+"""
+import os
+import re
+import math
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Services whose GETs may be hedged (opt-in, comma-separated)
+HEDGE_SERVICES = {name.strip() for name in os.getenv("HEDGE_SERVICES", "").split(",") if name.strip()}
+# Extra attempts allowed as a share of primary requests
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.05"))
+# Unused budget that may accumulate for bursts of slow responses
+HEDGE_BUDGET_MAX = float(os.getenv("HEDGE_BUDGET_MAX", "10"))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+# No hedging until a route has this many latency samples
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "50"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY_MS", "5")) / 1000
+HEDGE_WINDOW = 512
+
+ID_SEGMENT = re.compile(r"^[^/]*\d[^/]*$")
+
+
+def route_key(path: str) -> str:
+    """Path with id-like segments folded, e.g. /api/chats/42/messages -> /api/chats/:id/messages"""
+    return "/".join(":id" if ID_SEGMENT.match(segment) else segment for segment in path.split("/"))
+
+
+class LatencyWindow:
+    """Recent latencies of one route with a cached percentile"""
+
+    def __init__(self, size: int = HEDGE_WINDOW, refresh_every: int = 32):
+        self.samples = deque(maxlen=size)
+        self.refresh_every = refresh_every
+        self.since_refresh = 0
+        self.cached: Optional[float] = None
+
+    def add(self, latency: float):
+        self.samples.append(latency)
+        self.since_refresh += 1
+        if self.since_refresh >= self.refresh_every:
+            self.cached = None
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        if self.cached is None:
+            ordered = sorted(self.samples)
+            self.cached = ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+            self.since_refresh = 0
+        return self.cached
+
+
+class Hedger:
+    """Per-route hedge delays and the global hedge budget"""
+
+    def __init__(
+        self,
+        services: Set[str] = HEDGE_SERVICES,
+        budget_ratio: float = HEDGE_BUDGET_RATIO,
+        budget_max: float = HEDGE_BUDGET_MAX
+    ):
+        self.services = services
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self.budget = 0.0
+        self.windows: Dict[Tuple[str, str], LatencyWindow] = {}
+        self.stats = {
+            "primaries": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "budget_exhausted": 0,
+            "no_alternate_replica": 0
+        }
+
+    def enabled(self, service_name: str) -> bool:
+        return service_name in self.services
+
+    def record(self, service_name: str, route: str, latency: float):
+        window = self.windows.get((service_name, route))
+        if window is None:
+            window = self.windows[(service_name, route)] = LatencyWindow()
+        window.add(latency)
+
+    def delay_for(self, service_name: str, route: str) -> Optional[float]:
+        """How long to wait before hedging, or None if the route is not hedged"""
+        if not self.enabled(service_name):
+            return None
+        window = self.windows.get((service_name, route))
+        p95 = window.percentile(HEDGE_PERCENTILE) if window is not None else None
+        return max(HEDGE_MIN_DELAY, p95) if p95 is not None else None
+
+    def admit_primary(self):
+        self.stats["primaries"] += 1
+        self.budget = min(self.budget_max, self.budget + self.budget_ratio)
+
+    def try_spend(self) -> bool:
+        if self.budget < 1.0:
+            self.stats["budget_exhausted"] += 1
+            return False
+        self.budget -= 1.0
+        self.stats["hedges"] += 1
+        return True
+
+    async def run(
+        self,
+        service_name: str,
+        route: str,
+        attempt: Callable[[Optional[Any]], Awaitable[Any]],
+        choose_alternate: Callable[[Any], Optional[Any]],
+        primary_replica: Any
+    ) -> Any:
+        """Run `attempt(replica)` and hedge it on another replica when slow.
+
+        `choose_alternate(primary_replica)` returns a different replica or
+        None when there is none to hedge to.
+        """
+        loop = asyncio.get_running_loop()
+        self.admit_primary()
+        delay = self.delay_for(service_name, route)
+
+        start = loop.time()
+        primary = asyncio.ensure_future(self._timed(attempt, primary_replica, service_name, route))
+        tasks = {primary}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    alternate = choose_alternate(primary_replica)
+                    if alternate is None:
+                        self.stats["no_alternate_replica"] += 1
+                    elif self.try_spend():
+                        tasks.add(asyncio.ensure_future(self._timed(attempt, alternate, service_name, route)))
+
+            first_error = None
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is not None:
+                        first_error = first_error or task.exception()
+                        continue
+                    if task is not primary:
+                        self.stats["hedge_wins"] += 1
+                        # Keep the slow primary in the window so the p95 is not biased low
+                        self.record(service_name, route, loop.time() - start)
+                    return task.result()
+            raise first_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _timed(self, attempt, replica, service_name: str, route: str):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await attempt(replica)
+        self.record(service_name, route, loop.time() - start)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "services": sorted(self.services),
+            "budget": round(self.budget, 2),
+            "hedge_ratio": round(self.stats["hedges"] / self.stats["primaries"], 4) if self.stats["primaries"] else 0.0,
+            "p95_ms": {
+                f"{service_name}:{route}": round(p95 * 1000, 2)
+                for (service_name, route), window in self.windows.items()
+                if (p95 := window.percentile(HEDGE_PERCENTILE)) is not None
+            }
+        }
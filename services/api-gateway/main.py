@@ -1,15 +1,32 @@
 from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse, Response, ORJSONResponse
+from starlette.background import BackgroundTask
 import httpx
+import orjson
 import os
 import time
+import re
+import asyncio
 import logging
-from typing import Optional
+from contextlib import contextmanager
+from typing import Optional, Dict, List, NamedTuple, Callable
+from pydantic import BaseModel
 import jwt
 from datetime import datetime, timedelta
 
+from upstream import UpstreamPool, Replica, NoHealthyReplica, parse_service_urls
+from rate_limit import create_rate_limiter, RateLimitResult
+from auth import ClerkTokenVerifier, SigningKeyUnavailable
+from health import HealthProber
+from cache import ResponseCache, CacheInvalidator, CacheEntry, SHARED_SCOPE
+from singleflight import SingleFlight
+from admission import AdmissionController, AdmissionRejected
+from hedging import Hedger, route_key
+from compression import CompressionMiddleware, compression_snapshot
+from radon_common.metrics import setup_metrics, prefers_json, prometheus_response
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,7 +37,8 @@ app = FastAPI(
     description="API Gateway для микросервисной архитектуры Radon AI",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -41,20 +59,107 @@ app.add_middleware(
     allowed_hosts=["localhost", "127.0.0.1", "*.vercel.app"]
 )
 
-# Service URLs from environment
+# Response compression (gzip/br/zstd), flushed per chunk for streams
+app.add_middleware(CompressionMiddleware)
+
+# Prometheus latency and payload histograms per route (outermost, so it sees compressed sizes)
+metrics_registry = setup_metrics(app, "api-gateway")
+upstream_latency = metrics_registry.histogram(
+    "gateway_upstream_duration_seconds",
+    "Time from sending an upstream request to its response headers",
+    ["service", "status"]
+)
+admission_queue_wait = metrics_registry.histogram(
+    "gateway_admission_queue_wait_seconds",
+    "Time requests waited for an admission slot",
+    ["service", "tier"]
+)
+
+# Service URLs from environment (comma-separated for multiple replicas)
 SERVICE_URLS = {
-    "chat": os.getenv("CHAT_SERVICE_URL", "http://localhost:8002"),
-    "ai": os.getenv("AI_SERVICE_URL", "http://localhost:8001"),
-    "user": os.getenv("USER_SERVICE_URL", "http://localhost:8003"),
-    "subscription": os.getenv("SUBSCRIPTION_SERVICE_URL", "http://localhost:8004"),
-    "file": os.getenv("FILE_SERVICE_URL", "http://localhost:8005"),
+    "chat": parse_service_urls(os.getenv("CHAT_SERVICE_URL", "http://localhost:8002")),
+    "ai": parse_service_urls(os.getenv("AI_SERVICE_URL", "http://localhost:8001")),
+    "user": parse_service_urls(os.getenv("USER_SERVICE_URL", "http://localhost:8003")),
+    "subscription": parse_service_urls(os.getenv("SUBSCRIPTION_SERVICE_URL", "http://localhost:8004")),
+    "file": parse_service_urls(os.getenv("FILE_SERVICE_URL", "http://localhost:8005")),
+}
+
+# Shared upstream clients (created on startup, closed on shutdown)
+upstream_pool = UpstreamPool(SERVICE_URLS)
+
+# Background upstream health snapshot served by /health
+health_prober = HealthProber(upstream_pool)
+
+# Per-user cache of idempotent GETs, invalidated by service events
+response_cache = ResponseCache()
+cache_invalidator = CacheInvalidator(response_cache)
+
+# Identical concurrent GETs share one upstream call
+single_flight = SingleFlight()
+
+# Opt-in hedging of slow idempotent reads onto a second replica (HEDGE_SERVICES)
+hedger = Hedger()
+
+# GET routes whose responses are not buffered (file downloads can be large)
+STREAM_ONLY_PATHS = re.compile(r"^/api/(files/[^/]+|upload(/.*)?)$")
+
+# Tier-aware admission control with adaptive concurrency for GPU-bound writes
+admission_controllers = {
+    "ai": AdmissionController("ai"),
+}
+
+# Per-user, per-route token buckets (RATE_LIMIT_BACKEND=memory|redis)
+rate_limiter = create_rate_limiter()
+
+@app.on_event("startup")
+async def startup():
+    await upstream_pool.start()
+    await rate_limiter.start()
+    await token_verifier.start()
+    await health_prober.start()
+    await cache_invalidator.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await cache_invalidator.close()
+    await health_prober.close()
+    await token_verifier.close()
+    await rate_limiter.close()
+    await upstream_pool.close()
+
+# Hop-by-hop headers are connection-scoped and must not be forwarded (RFC 7230 6.1)
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
 }
 
-# Rate limiting storage (in production, use Redis)
-rate_limit_storage = {}
+def strip_hop_by_hop(headers) -> dict:
+    """Copy headers without hop-by-hop entries or ones named in Connection"""
+    connection_tokens = {
+        token.strip().lower()
+        for token in headers.get("connection", "").split(",")
+        if token.strip()
+    }
+    return {
+        name: value
+        for name, value in headers.items()
+        if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() not in connection_tokens
+    }
+
+def has_request_body(request: Request) -> bool:
+    """Whether the client announced a request body"""
+    return "content-length" in request.headers or "transfer-encoding" in request.headers
 
 # Clerk JWT validation
 CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY")
+token_verifier = ClerkTokenVerifier()
 
 async def verify_clerk_token(authorization: str = None) -> dict:
     """Verify Clerk JWT token and return user data"""
@@ -64,43 +169,279 @@ async def verify_clerk_token(authorization: str = None) -> dict:
     token = authorization.split(" ")[1]
     
     try:
-        # In production, verify JWT with Clerk's public key
-        # For now, we'll decode without verification for development
-        payload = jwt.decode(token, options={"verify_signature": False})
+        if token_verifier.jwks_url:
+            # Signature checked against Clerk's JWKS; repeat tokens hit the cache
+            payload = await token_verifier.verify(token)
+        elif os.getenv("ENVIRONMENT") == "development":
+            # No JWKS configured: decode without verification for local development only
+            payload = jwt.decode(token, options={"verify_signature": False})
+        else:
+            raise SigningKeyUnavailable("CLERK_JWKS_URL or CLERK_ISSUER is required")
         
         # Extract user information
         user_data = {
             "user_id": payload.get("sub"),
             "email": payload.get("email"),
-            "session_id": payload.get("sid")
+            "session_id": payload.get("sid"),
+            "tier": payload.get("tier") or payload.get("subscription") or "free"
         }
         
         return user_data
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    except SigningKeyUnavailable as e:
+        logger.error(f"Cannot verify token: {str(e)}")
+        raise HTTPException(status_code=503, detail="Authentication unavailable")
+
+async def check_rate_limit(user_data: dict, route: str) -> RateLimitResult:
+    """Check if user has exceeded rate limit for a route"""
+    return await rate_limiter.check(user_data["user_id"], route, user_data.get("tier", "free"))
+
+async def enforce_rate_limit(user_data: dict, path: str):
+    """Raise 429 when the user is over the limit for the path's route"""
+    limit = await check_rate_limit(user_data, route_name(path))
+    if not limit.allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={
+                "Retry-After": str(max(1, int(limit.retry_after + 0.5))),
+                "X-RateLimit-Limit": str(limit.limit),
+                "X-RateLimit-Remaining": "0"
+            }
+        )
+
+def route_name(path: str) -> str:
+    """Route family used for rate limiting, e.g. /api/chats/1/messages -> chats"""
+    parts = path.strip("/").split("/")
+    return parts[1] if len(parts) > 1 else parts[0]
+
+class BufferedResponse(NamedTuple):
+    status_code: int
+    headers: Dict[str, str]
+    body: bytes
 
-async def check_rate_limit(user_id: str, endpoint: str) -> bool:
-    """Check if user has exceeded rate limit"""
-    key = f"{user_id}:{endpoint}"
-    current_time = time.time()
+class ReadResult(NamedTuple):
+    response: BufferedResponse
+    cache_entry: Optional[CacheEntry]
+    cache_hit: bool
+
+def choose_replica(service_name: str) -> Replica:
+    """Pick an upstream replica or fail with 503 when none is available"""
+    try:
+        return upstream_pool.choose(service_name)
+    except NoHealthyReplica:
+        logger.error(f"No available replica for {service_name}")
+        raise HTTPException(status_code=503, detail="Service unavailable", headers={"Retry-After": "5"})
+
+@contextmanager
+def upstream_errors(service_name: str, replica: Replica, target_url: str):
+    """Translate upstream transport errors into gateway HTTP errors"""
+    try:
+        yield
+    except HTTPException:
+        raise
+    except httpx.PoolTimeout:
+        replica.record_pool_timeout()
+        logger.error(f"Connection pool exhausted forwarding request to {service_name}: {target_url}")
+        raise HTTPException(status_code=503, detail="Service busy")
+    except httpx.TimeoutException:
+        replica.record_failure()
+        logger.error(f"Timeout forwarding request to {service_name}: {target_url}")
+        raise HTTPException(status_code=504, detail="Service timeout")
+    except httpx.ConnectError:
+        replica.record_failure()
+        logger.error(f"Connection error forwarding request to {service_name}: {target_url}")
+        raise HTTPException(status_code=503, detail="Service unavailable")
+    except httpx.TransportError as e:
+        replica.record_failure()
+        logger.error(f"Transport error forwarding request to {service_name}: {target_url}: {type(e).__name__}")
+        raise HTTPException(status_code=502, detail="Bad gateway")
+    except Exception as e:
+        logger.error(f"Error forwarding request to {service_name}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+async def fetch_buffered(
+    service_name: str,
+    method: str,
+    path: str,
+    headers: dict,
+    params,
+    replica: Optional[Replica] = None
+) -> BufferedResponse:
+    """Call an upstream and read the whole (small) response body"""
+    replica = replica or choose_replica(service_name)
+    replica.begin()
+    start_time = time.perf_counter()
     
-    # Clean old entries
-    rate_limit_storage = {k: v for k, v in rate_limit_storage.items() 
-                         if current_time - v["last_request"] < 3600}  # 1 hour window
+    try:
+        with upstream_errors(service_name, replica, f"{replica.url}{path}"):
+            response = await replica.client.request(method=method, url=path, headers=headers, params=params)
+            latency = time.perf_counter() - start_time
+            replica.record_response(response.status_code, latency)
+            upstream_latency.labels(service_name, f"{response.status_code // 100}xx").observe(latency)
+            # response.content is decoded, so its encoding headers no longer apply
+            response_headers = {
+                name: value
+                for name, value in strip_hop_by_hop(response.headers).items()
+                if name not in ("content-length", "content-encoding")
+            }
+            return BufferedResponse(response.status_code, response_headers, response.content)
+    finally:
+        replica.end()
+
+def alternate_replica(service_name: str, primary: Replica) -> Optional[Replica]:
+    try:
+        return upstream_pool.choose(service_name, exclude=primary)
+    except NoHealthyReplica:
+        return None
+
+async def fetch_hedged(service_name: str, path: str, headers: dict, params) -> BufferedResponse:
+    """Buffered GET that is retried on a second replica once it runs past the route's p95"""
+    if not hedger.enabled(service_name):
+        return await fetch_buffered(service_name, "GET", path, headers, params)
+    return await hedger.run(
+        service_name,
+        route_key(path),
+        lambda replica: fetch_buffered(service_name, "GET", path, headers, params, replica=replica),
+        lambda primary: alternate_replica(service_name, primary),
+        choose_replica(service_name)
+    )
+
+async def stream_upstream(
+    service_name: str,
+    method: str,
+    path: str,
+    headers: dict,
+    request: Request,
+    on_release: Optional[Callable[[], None]] = None
+) -> StreamingResponse:
+    """Stream the request body to an upstream and its response back.
+
+    Both directions only pull the next chunk once the previous one has been
+    written, so backpressure is respected and memory stays flat for large
+    uploads; SSE events reach the client as soon as the upstream emits them.
+    """
+    replica = choose_replica(service_name)
+    replica.begin()
+    handed_off = False
+    start_time = time.perf_counter()
     
-    if key in rate_limit_storage:
-        user_data = rate_limit_storage[key]
-        if user_data["count"] >= 100:  # 100 requests per hour
-            return False
-        user_data["count"] += 1
-        user_data["last_request"] = current_time
-    else:
-        rate_limit_storage[key] = {
-            "count": 1,
-            "last_request": current_time
-        }
+    try:
+        with upstream_errors(service_name, replica, f"{replica.url}{path}"):
+            upstream_request = replica.client.build_request(
+                method=method,
+                url=path,
+                headers=headers,
+                content=request.stream() if has_request_body(request) else None,
+                params=request.query_params
+            )
+            upstream_response = await replica.client.send(upstream_request, stream=True)
+        latency = time.perf_counter() - start_time
+        replica.record_response(upstream_response.status_code, latency)
+        upstream_latency.labels(service_name, f"{upstream_response.status_code // 100}xx").observe(latency)
+        
+        released = False
+        
+        async def release_upstream():
+            nonlocal released
+            if released:
+                return
+            released = True
+            await upstream_response.aclose()
+            replica.end()
+            if on_release is not None:
+                on_release()
+        
+        async def stream_body():
+            try:
+                # Raw bytes: the upstream Content-Encoding is passed through untouched
+                async for chunk in upstream_response.aiter_raw():
+                    yield chunk
+            except httpx.HTTPError as e:
+                if isinstance(e, httpx.TransportError):
+                    replica.record_failure()
+                logger.error(f"Error streaming response from {service_name}: {str(e)}")
+            finally:
+                await release_upstream()
+        
+        handed_off = True
+        # The background task covers clients that disconnect before the body starts
+        return StreamingResponse(
+            stream_body(),
+            status_code=upstream_response.status_code,
+            headers=strip_hop_by_hop(upstream_response.headers),
+            background=BackgroundTask(release_upstream)
+        )
+    finally:
+        if not handed_off:
+            replica.end()
+
+async def forward_admitted(
+    service_name: str,
+    path: str,
+    method: str,
+    request: Request,
+    headers: dict,
+    user_data: Optional[dict]
+) -> Response:
+    """Forward through the service's admission queue; the slot is held until the body is relayed"""
+    tier = user_data.get("tier", "free") if user_data else "free"
+    try:
+        slot = await admission_controllers[service_name].acquire(tier)
+    except AdmissionRejected as e:
+        logger.warning(f"Shedding {tier} request to {service_name}: {e.reason}")
+        raise HTTPException(
+            status_code=503,
+            detail="Service overloaded, please retry",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    admission_queue_wait.labels(service_name, slot.tier).observe(slot.queue_wait)
     
-    return True
+    start_time = time.perf_counter()
+    try:
+        response = await stream_upstream(service_name, method, path, headers, request, on_release=slot.release)
+    except HTTPException as e:
+        slot.sample(time.perf_counter() - start_time, ok=e.status_code < 500)
+        slot.release()
+        raise
+    except BaseException:
+        slot.release()
+        raise
+    
+    # Time to response headers: queueing and prefill inside the upstream
+    slot.sample(time.perf_counter() - start_time, ok=response.status_code < 500)
+    return response
+
+async def read_through(
+    service_name: str,
+    path: str,
+    query: str,
+    headers: dict,
+    user_data: dict
+) -> ReadResult:
+    """Serve an idempotent GET from the cache or one shared upstream call"""
+    cache_rule = response_cache.rule_for(path)
+    scope = SHARED_SCOPE if cache_rule is not None and cache_rule.shared else user_data["user_id"]
+    if cache_rule is not None:
+        cache_key = response_cache.key(cache_rule, user_data["user_id"], path, query)
+        entry = response_cache.get(cache_key)
+        if entry is not None:
+            return ReadResult(BufferedResponse(entry.status_code, entry.headers, entry.body), entry, True)
+    
+    # Ask for an unencoded full body that can be shared between callers
+    headers = {**headers, "accept-encoding": "identity"}
+    headers.pop("if-none-match", None)
+    
+    result = await single_flight.do(
+        ("GET", path, query, scope),
+        lambda: fetch_hedged(service_name, path, headers, query)
+    )
+    
+    entry = None
+    if cache_rule is not None and result.status_code == 200:
+        entry = response_cache.put(cache_key, cache_rule, result.body, result.status_code, result.headers)
+    return ReadResult(result, entry, False)
 
 async def forward_request(
     service_name: str,
@@ -108,22 +449,22 @@ async def forward_request(
     method: str,
     request: Request,
     user_data: dict = None
-) -> JSONResponse:
-    """Forward request to appropriate microservice"""
+) -> Response:
+    """Forward request to appropriate microservice.
+
+    Small idempotent GETs are buffered so they can be cached and coalesced
+    with identical concurrent requests; everything else is streamed.
+    """
     
     if service_name not in SERVICE_URLS:
         raise HTTPException(status_code=404, detail=f"Service {service_name} not found")
     
-    service_url = SERVICE_URLS[service_name]
-    target_url = f"{service_url}{path}"
-    
     # Check rate limit
     if user_data:
-        if not await check_rate_limit(user_data["user_id"], f"{service_name}:{path}"):
-            raise HTTPException(status_code=429, detail="Rate limit exceeded")
+        await enforce_rate_limit(user_data, path)
     
     # Prepare headers
-    headers = dict(request.headers)
+    headers = strip_hop_by_hop(request.headers)
     if user_data:
         headers["X-User-ID"] = user_data["user_id"]
         headers["X-User-Email"] = user_data["email"]
@@ -131,56 +472,72 @@ async def forward_request(
     # Remove host header to avoid conflicts
     headers.pop("host", None)
     
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # Get request body
-            body = await request.body()
-            
-            # Forward request
-            response = await client.request(
-                method=method,
-                url=target_url,
-                headers=headers,
-                content=body,
-                params=request.query_params
-            )
-            
-            # Return response
-            return JSONResponse(
-                content=response.json() if response.headers.get("content-type", "").startswith("application/json") else {"data": response.text},
-                status_code=response.status_code,
-                headers=dict(response.headers)
-            )
-            
-    except httpx.TimeoutException:
-        logger.error(f"Timeout forwarding request to {service_name}: {target_url}")
-        raise HTTPException(status_code=504, detail="Service timeout")
-    except httpx.ConnectError:
-        logger.error(f"Connection error forwarding request to {service_name}: {target_url}")
-        raise HTTPException(status_code=503, detail="Service unavailable")
-    except Exception as e:
-        logger.error(f"Error forwarding request to {service_name}: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+    if method != "GET" and service_name in admission_controllers:
+        return await forward_admitted(service_name, path, method, request, headers, user_data)
+    
+    if method != "GET" or not user_data or STREAM_ONLY_PATHS.match(path):
+        response = await stream_upstream(service_name, method, path, headers, request)
+        # A successful write makes the user's cached reads of this route stale
+        if method != "GET" and user_data and response.status_code < 400:
+            response_cache.invalidate_path(user_data["user_id"], path)
+        return response
+    
+    result = await read_through(service_name, path, str(request.query_params), headers, user_data)
+    if result.cache_entry is not None:
+        return response_cache.respond(result.cache_entry, request, hit=result.cache_hit)
+    return Response(content=result.response.body, status_code=result.response.status_code, headers=result.response.headers)
 
 # Health check endpoint
 @app.get("/health")
-async def health_check():
-    """Health check for API Gateway"""
-    services_status = {}
-    
-    for service_name, service_url in SERVICE_URLS.items():
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{service_url}/health")
-                services_status[service_name] = "healthy" if response.status_code == 200 else "unhealthy"
-        except:
-            services_status[service_name] = "unhealthy"
+async def health_check(deep: bool = False):
+    """Health check for API Gateway.
+
+    Answers from the background prober's snapshot; `?deep=1` forces a fresh
+    concurrent probe of every upstream.
+    """
+    services = await health_prober.probe() if deep else health_prober.status
+    services_status = {name: info["status"] for name, info in services.items()}
     
-    overall_status = "healthy" if all(status == "healthy" for status in services_status.values()) else "degraded"
+    if not services_status:
+        overall_status = "starting"
+    elif all(status == "healthy" for status in services_status.values()):
+        overall_status = "healthy"
+    else:
+        overall_status = "degraded"
     
     return {
         "status": overall_status,
         "services": services_status,
+        "details": services,
+        "last_probe": health_prober.last_probe,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+# Gateway metrics endpoint
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    """Prometheus histograms, or the JSON summary for `Accept: application/json`"""
+    if not prefers_json(request):
+        return prometheus_response(metrics_registry)
+    return {
+        "service": "api-gateway",
+        "upstreams": upstream_pool.snapshot(),
+        "rate_limit": rate_limiter.snapshot(),
+        "auth": token_verifier.snapshot(),
+        "response_cache": response_cache.snapshot(),
+        "single_flight": single_flight.snapshot(),
+        "admission": {name: controller.snapshot() for name, controller in admission_controllers.items()},
+        "hedging": hedger.snapshot(),
+        "compression": compression_snapshot(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+# Admin view of upstream replicas
+@app.get("/admin/upstreams")
+async def get_upstreams():
+    """Per-replica in-flight requests, latency and circuit breaker state"""
+    return {
+        "upstreams": upstream_pool.replica_snapshot(),
         "timestamp": datetime.utcnow().isoformat()
     }
 
@@ -259,6 +616,107 @@ async def admin_routes(path: str, request: Request, authorization: str = None):
     else:
         return await forward_request("user", f"/api/admin/{path}", request.method, request, user_data)
 
+# Batch endpoint
+MAX_BATCH_REQUESTS = int(os.getenv("MAX_BATCH_REQUESTS", "20"))
+
+# Gateway route prefixes and the services behind them, most specific first
+ROUTE_TABLE = [
+    ("/api/admin/stats", "subscription"),
+    ("/api/admin", "user"),
+    ("/api/chats", "chat"),
+    ("/api/ai", "ai"),
+    ("/api/users", "user"),
+    ("/api/subscriptions", "subscription"),
+    ("/api/files", "file"),
+    ("/api/profile", "user"),
+    ("/api/settings", "user"),
+    ("/api/upload", "file"),
+    ("/api/usage", "subscription"),
+]
+
+class BatchSubRequest(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
+    stream: bool = False
+
+def resolve_service(path: str) -> Optional[str]:
+    """Service that owns a gateway path"""
+    for prefix, service_name in ROUTE_TABLE:
+        if path == prefix or path.startswith(prefix + "/"):
+            return service_name
+    return None
+
+def encode_batch_item(item_id: str, status_code: int, content_type: str, body: bytes) -> bytes:
+    """One batch result; JSON bodies are embedded as-is instead of re-encoded"""
+    if content_type.startswith("application/json") and body:
+        payload = body
+    else:
+        payload = orjson.dumps(body.decode("utf-8", errors="replace"))
+    return b"".join([
+        b'{"id":', orjson.dumps(item_id),
+        b',"status":', str(status_code).encode(),
+        b',"body":', payload,
+        b"}"
+    ])
+
+@app.post("/api/batch")
+async def batch_routes(batch_request: BatchRequest, request: Request, authorization: str = None):
+    """Run several GET sub-requests with one authentication.
+
+    Sub-requests fan out concurrently through the same rate limiting, cache
+    and coalescing as individual calls. Results come back as one JSON
+    document, or as NDJSON lines in completion order with `"stream": true`.
+    """
+    user_data = await verify_clerk_token(authorization)
+    
+    if len(batch_request.requests) > MAX_BATCH_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_REQUESTS} sub-requests per batch")
+    
+    headers = strip_hop_by_hop(request.headers)
+    for name in ("host", "content-length", "content-type"):
+        headers.pop(name, None)
+    headers["X-User-ID"] = user_data["user_id"]
+    headers["X-User-Email"] = user_data["email"]
+    
+    async def run(index: int, sub_request: BatchSubRequest) -> bytes:
+        item_id = sub_request.id or str(index)
+        try:
+            if sub_request.method.upper() != "GET":
+                raise HTTPException(status_code=405, detail="Only GET sub-requests are supported")
+            path, _, query = sub_request.path.partition("?")
+            service_name = resolve_service(path)
+            if service_name is None or ".." in path:
+                raise HTTPException(status_code=404, detail="Unknown route")
+            if STREAM_ONLY_PATHS.match(path):
+                raise HTTPException(status_code=400, detail="File downloads cannot be batched")
+            
+            await enforce_rate_limit(user_data, path)
+            result = await read_through(service_name, path, query, headers, user_data)
+            response = result.response
+            return encode_batch_item(item_id, response.status_code, response.headers.get("content-type", ""), response.body)
+        except HTTPException as e:
+            return encode_batch_item(item_id, e.status_code, "application/json", orjson.dumps({"detail": e.detail}))
+    
+    tasks = [asyncio.ensure_future(run(index, sub_request)) for index, sub_request in enumerate(batch_request.requests)]
+    
+    if not batch_request.stream:
+        items = await asyncio.gather(*tasks)
+        return Response(content=b'{"responses":[' + b",".join(items) + b"]}", media_type="application/json")
+    
+    async def stream_items():
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished + b"\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_items(), media_type="application/x-ndjson")
+
 # Root endpoint
 @app.get("/")
 async def root():
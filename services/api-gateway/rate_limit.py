@@ -0,0 +1,300 @@
+"""Token-bucket rate limiting for the API gateway.
+
+Every (user, route) pair gets a token bucket whose size and refill rate
+depend on the user's subscription tier. Checks are O(1). Buckets live in a
+pluggable backend: sharded in-process dicts for a single worker, a
+shared-memory table for several workers on one host, or Redis (any server
+speaking the Redis protocol) when several gateway replicas must share
+limits.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+
+from shared_state import SharedBucketTable, SharedCounters, shared_path
+
+logger = logging.getLogger(__name__)
+
+# Backend selection: memory (one worker), shared (all workers on the host) or redis
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379"))
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "16"))
+RATE_LIMIT_SWEEP_INTERVAL = float(os.getenv("RATE_LIMIT_SWEEP_INTERVAL", "30"))
+RATE_LIMIT_SHARED_SLOTS = int(os.getenv("RATE_LIMIT_SHARED_SLOTS", "8192"))  # per stripe
+
+# Requests allowed per window, per tier and route ("default" covers unlisted routes).
+# Override with RATE_LIMIT_TIERS='{"free": {"default": {"requests": 50, "window": 3600}}}'
+DEFAULT_TIER_LIMITS = {
+    "free": {
+        "default": {"requests": 100, "window": 3600},
+        "ai": {"requests": 30, "window": 3600}
+    },
+    "pro": {
+        "default": {"requests": 1000, "window": 3600},
+        "ai": {"requests": 300, "window": 3600}
+    },
+    "team": {
+        "default": {"requests": 5000, "window": 3600},
+        "ai": {"requests": 1500, "window": 3600}
+    },
+    "enterprise": {
+        "default": {"requests": 20000, "window": 3600},
+        "ai": {"requests": 6000, "window": 3600}
+    }
+}
+
+
+def load_tier_limits() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Default tier limits merged with the RATE_LIMIT_TIERS override"""
+    limits = {tier: dict(routes) for tier, routes in DEFAULT_TIER_LIMITS.items()}
+    override = os.getenv("RATE_LIMIT_TIERS")
+    if override:
+        try:
+            for tier, routes in json.loads(override).items():
+                limits.setdefault(tier, {}).update(routes)
+                if "default" not in limits[tier]:
+                    logger.error(f"RATE_LIMIT_TIERS tier {tier} has no default limit, using the free tier's")
+        except (ValueError, AttributeError) as e:
+            logger.error(f"Invalid RATE_LIMIT_TIERS, using defaults: {str(e)}")
+    return limits
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float
+
+
+class InMemoryBackend:
+    """Token buckets in sharded dicts, swept for idle keys in the background.
+
+    A bucket that has been idle long enough to refill completely carries no
+    state, so the sweeper drops it. Sweeping one shard per tick keeps each
+    pause short no matter how many users are tracked.
+    """
+
+    def __init__(self, shards: int = RATE_LIMIT_SHARDS, sweep_interval: float = RATE_LIMIT_SWEEP_INTERVAL):
+        self.shards: List[Dict[str, List[float]]] = [{} for _ in range(max(1, shards))]
+        self.sweep_interval = sweep_interval
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def _shard(self, key: str) -> Dict[str, List[float]]:
+        return self.shards[hash(key) % len(self.shards)]
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """Take tokens from a bucket; returns (allowed, tokens left)"""
+        now = time.monotonic()
+        shard = self._shard(key)
+        bucket = shard.get(key)
+
+        if bucket is None:
+            # [tokens, last refill, time the bucket is full again]
+            bucket = shard[key] = [capacity, now, now]
+        else:
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        allowed = bucket[0] >= cost
+        if allowed:
+            bucket[0] -= cost
+        bucket[2] = now + (capacity - bucket[0]) / rate
+        return allowed, bucket[0]
+
+    def size(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    def sweep_shard(self, index: int) -> int:
+        """Drop buckets that are full again; returns how many were evicted"""
+        now = time.monotonic()
+        shard = self.shards[index]
+        idle = [key for key, bucket in shard.items() if bucket[2] <= now]
+        for key in idle:
+            del shard[key]
+        return len(idle)
+
+    async def _sweep_forever(self):
+        index = 0
+        tick = self.sweep_interval / len(self.shards)
+        while True:
+            await asyncio.sleep(tick)
+            try:
+                self.sweep_shard(index)
+            except Exception as e:
+                logger.error(f"Error sweeping rate limit shard {index}: {str(e)}")
+            index = (index + 1) % len(self.shards)
+
+    async def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+
+class SharedMemoryBackend:
+    """Token buckets in a host-wide shared-memory table.
+
+    All uvicorn workers on the host enforce the same limits. A key whose
+    neighbourhood of the table is full is let through and counted.
+    """
+
+    def __init__(self, path: Optional[str] = None, slots_per_stripe: int = RATE_LIMIT_SHARED_SLOTS):
+        self.path = path or shared_path("radon-gateway-ratelimit")
+        self.slots_per_stripe = slots_per_stripe
+        self.table: Optional[SharedBucketTable] = None
+
+    async def start(self):
+        if self.table is None:
+            self.table = SharedBucketTable(self.path, self.slots_per_stripe)
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> Tuple[bool, float]:
+        return self.table.take(key, capacity, rate, cost)
+
+    def size(self) -> int:
+        return self.table.size() if self.table is not None else 0
+
+    async def close(self):
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+
+# Atomic refill-and-take. Uses the server clock so replicas with skewed
+# clocks agree, and a TTL so idle buckets expire on their own.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBackend:
+    """Token buckets shared by all gateway replicas through Redis"""
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, prefix: str = "ratelimit:"):
+        self.url = url
+        self.prefix = prefix
+        self.redis = None
+        self._script = None
+
+    async def start(self):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(self.url)
+        self._script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> Tuple[bool, float]:
+        allowed, tokens = await self._script(keys=[self.prefix + key], args=[capacity, rate, cost])
+        return bool(allowed), float(tokens)
+
+    def size(self) -> int:
+        return -1  # Tracked by Redis
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.close()
+            self.redis = None
+
+
+class RateLimiter:
+    """Per-user, per-route limits chosen by subscription tier"""
+
+    def __init__(
+        self,
+        backend,
+        tier_limits: Optional[Dict[str, Dict[str, Dict[str, float]]]] = None,
+        counters: Optional[SharedCounters] = None
+    ):
+        self.backend = backend
+        self.tier_limits = tier_limits or load_tier_limits()
+        self.stats = {"allowed": 0, "limited": 0, "backend_errors": 0}
+        # Host-wide totals when the workers share memory
+        self.counters = counters
+
+    def _count(self, name: str):
+        self.stats[name] += 1
+        if self.counters is not None:
+            self.counters.add(name)
+
+    def limit_for(self, tier: str, route: str) -> Tuple[int, float]:
+        """(bucket capacity, refill per second) for a tier and route"""
+        routes = self.tier_limits.get(tier) or self.tier_limits["free"]
+        # A tier added through RATE_LIMIT_TIERS may lack a default entry
+        limit = routes.get(route) or routes.get("default") or self.tier_limits["free"]["default"]
+        return int(limit["requests"]), limit["requests"] / limit["window"]
+
+    async def check(self, user_id: str, route: str, tier: str = "free") -> RateLimitResult:
+        capacity, rate = self.limit_for(tier, route)
+
+        try:
+            allowed, tokens = await self.backend.take(f"{user_id}:{route}", capacity, rate)
+        except Exception as e:
+            # Fail open: a broken limiter backend must not take the API down
+            self._count("backend_errors")
+            logger.error(f"Rate limit backend error: {str(e)}")
+            return RateLimitResult(True, capacity, capacity, 0.0)
+
+        if allowed:
+            self._count("allowed")
+            return RateLimitResult(True, capacity, int(tokens), 0.0)
+
+        self._count("limited")
+        return RateLimitResult(False, capacity, 0, (1.0 - tokens) / rate)
+
+    async def start(self):
+        await self.backend.start()
+
+    async def close(self):
+        await self.backend.close()
+        if self.counters is not None:
+            self.counters.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = {
+            **(self.counters.snapshot() if self.counters is not None else self.stats),
+            "backend": type(self.backend).__name__,
+            "tracked_keys": self.backend.size()
+        }
+        if self.counters is not None:
+            snapshot["this_worker"] = dict(self.stats)
+        return snapshot
+
+
+def create_rate_limiter() -> RateLimiter:
+    """Build the limiter for the backend named in RATE_LIMIT_BACKEND"""
+    if RATE_LIMIT_BACKEND == "redis":
+        return RateLimiter(RedisBackend())
+    if RATE_LIMIT_BACKEND == "shared":
+        counters = SharedCounters(shared_path("radon-gateway-ratelimit-stats"), ["allowed", "limited", "backend_errors"])
+        return RateLimiter(SharedMemoryBackend(), counters=counters)
+    if RATE_LIMIT_BACKEND != "memory":
+        logger.warning(f"Unknown RATE_LIMIT_BACKEND {RATE_LIMIT_BACKEND}, using memory")
+    return RateLimiter(InMemoryBackend())
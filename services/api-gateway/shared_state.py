@@ -0,0 +1,177 @@
+"""Host-wide gateway state shared by uvicorn worker processes.
+
+State lives in mmap-backed files (in /dev/shm when available), so every
+worker on the host sees the same rate-limit buckets and counters without a
+network hop. Updates are read-modify-write sequences made atomic with
+fcntl byte-range locks; each lock covers one stripe of the table, so
+workers only contend when they touch the same stripe.
+"""
+import os
+import mmap
+import time
+import fcntl
+import struct
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+SHARED_STATE_DIR = os.getenv(
+    "SHARED_STATE_DIR",
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+)
+
+# Lock offsets live past the data so they never overlap a stripe lock
+_INIT_LOCK_OFFSET = 1 << 40
+
+
+class _SharedFile:
+    """An mmap'd file created and sized once under an exclusive lock"""
+
+    HEADER = struct.Struct("4sII")
+    HEADER_SIZE = 64
+
+    def __init__(self, path: str, magic: bytes, size: int, layout: Tuple[int, int]):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self.locked(_INIT_LOCK_OFFSET):
+            current = os.fstat(self.fd).st_size
+            header = os.pread(self.fd, self.HEADER.size, 0) if current >= self.HEADER.size else b""
+            if current != size or header != self.HEADER.pack(magic, *layout):
+                # New file, or one left behind with another layout: start empty
+                if current:
+                    logger.warning(f"Reinitialising shared state file {path}")
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, size)
+                os.pwrite(self.fd, self.HEADER.pack(magic, *layout), 0)
+        self.map = mmap.mmap(self.fd, size)
+
+    @contextmanager
+    def locked(self, offset: int):
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, offset)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, offset)
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+
+def _key_hash(key: str) -> int:
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+class SharedBucketTable:
+    """Token buckets in a striped open-addressing hash table.
+
+    Each slot holds (key hash, tokens, last refill, time full again). A
+    bucket that is full again carries no state, so its slot may be reused
+    by another key; lookups probe at most `max_probes` slots.
+    """
+
+    SLOT = struct.Struct("Qddd")
+    MAGIC = b"RLB1"
+
+    def __init__(self, path: str, slots_per_stripe: int = 8192, stripes: int = 16, max_probes: int = 32):
+        self.slots_per_stripe = slots_per_stripe
+        self.stripes = stripes
+        self.max_probes = min(max_probes, slots_per_stripe)
+        size = _SharedFile.HEADER_SIZE + stripes * slots_per_stripe * self.SLOT.size
+        self.file = _SharedFile(path, self.MAGIC, size, (slots_per_stripe, stripes))
+        self.table_full = 0
+
+    def take(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """Refill and take tokens; returns (allowed, tokens left)"""
+        key_hash = _key_hash(key)
+        stripe = key_hash % self.stripes
+        start = (key_hash // self.stripes) % self.slots_per_stripe
+        base = _SharedFile.HEADER_SIZE + stripe * self.slots_per_stripe * self.SLOT.size
+        data = self.file.map
+        slot_struct = self.SLOT
+
+        with self.file.locked(stripe):
+            # time.monotonic() is CLOCK_MONOTONIC, common to all processes on the host
+            now = time.monotonic()
+            found = None
+            free = None
+            for probe in range(self.max_probes):
+                offset = base + ((start + probe) % self.slots_per_stripe) * slot_struct.size
+                slot_key, tokens, last, full_at = slot_struct.unpack_from(data, offset)
+                if slot_key == key_hash:
+                    found = offset
+                    break
+                if slot_key == 0:
+                    # Slots are never emptied again, so the key cannot be further on
+                    if free is None:
+                        free = offset
+                    break
+                if free is None and full_at <= now:
+                    free = offset
+
+            if found is not None:
+                tokens = min(capacity, tokens + (now - last) * rate)
+                offset = found
+            elif free is not None:
+                tokens = capacity
+                offset = free
+            else:
+                self.table_full += 1
+                return True, capacity
+
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            slot_struct.pack_into(data, offset, key_hash, tokens, now, now + (capacity - tokens) / rate)
+            return allowed, tokens
+
+    def size(self) -> int:
+        """Buckets that still hold state (not full again)"""
+        now = time.monotonic()
+        return sum(
+            1
+            for slot_key, _, _, full_at in self.SLOT.iter_unpack(self.file.map[_SharedFile.HEADER_SIZE:])
+            if slot_key and full_at > now
+        )
+
+    def close(self):
+        self.file.close()
+
+
+class SharedCounters:
+    """Named counters in a shared array of doubles"""
+
+    MAGIC = b"CNT1"
+
+    def __init__(self, path: str, names: Sequence[str]):
+        self.names: List[str] = list(names)
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        size = _SharedFile.HEADER_SIZE + 8 * len(self.names)
+        # The layout check covers the counter names, so renaming resets the file
+        layout = (len(self.names), _key_hash(",".join(self.names)) & 0xFFFFFFFF)
+        self.file = _SharedFile(path, self.MAGIC, size, layout)
+
+    def add(self, name: str, amount: float = 1.0):
+        offset = _SharedFile.HEADER_SIZE + 8 * self.index[name]
+        with self.file.locked(0):
+            value = struct.unpack_from("d", self.file.map, offset)[0]
+            struct.pack_into("d", self.file.map, offset, value + amount)
+
+    def get(self, name: str) -> float:
+        return struct.unpack_from("d", self.file.map, _SharedFile.HEADER_SIZE + 8 * self.index[name])[0]
+
+    def snapshot(self) -> Dict[str, float]:
+        values = struct.unpack_from(f"{len(self.names)}d", self.file.map, _SharedFile.HEADER_SIZE)
+        return {name: int(value) if value == int(value) else value for name, value in zip(self.names, values)}
+
+    def close(self):
+        self.file.close()
+
+
+def shared_path(name: str, directory: Optional[str] = None) -> str:
+    return os.path.join(directory or SHARED_STATE_DIR, name)
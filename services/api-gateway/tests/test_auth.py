@@ -0,0 +1,98 @@
+import json
+import time
+import asyncio
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+
+import auth
+from auth import ClerkTokenVerifier
+
+ISSUER = "https://clerk.example.test"
+
+
+def make_key(kid: str):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": kid, "alg": "RS256", "use": "sig"})
+    return private_key, jwk
+
+
+SIGNING_KEY, SIGNING_JWK = make_key("known")
+OTHER_KEY, _ = make_key("other")
+
+
+def make_token(private_key=SIGNING_KEY, kid: str = "known", **claims) -> str:
+    payload = {"sub": "user_1", "iss": ISSUER, "exp": int(time.time()) + 300, **claims}
+    return jwt.encode(payload, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+def make_verifier(jwks_requests: list) -> ClerkTokenVerifier:
+    def handler(request: httpx.Request) -> httpx.Response:
+        jwks_requests.append(request)
+        return httpx.Response(200, json={"keys": [SIGNING_JWK]})
+
+    verifier = ClerkTokenVerifier(jwks_url=f"{ISSUER}/.well-known/jwks.json", issuer=ISSUER, audience=None)
+    verifier._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return verifier
+
+
+def test_valid_token_is_verified_once_then_cached():
+    async def run():
+        requests = []
+        verifier = make_verifier(requests)
+        token = make_token()
+        first = await verifier.verify(token)
+        second = await verifier.verify(token)
+        return first, second, verifier.stats, len(requests)
+
+    first, second, stats, fetches = asyncio.run(run())
+    assert first["sub"] == second["sub"] == "user_1"
+    assert stats["token_cache_misses"] == 1
+    assert stats["token_cache_hits"] == 1
+    assert fetches == 1
+
+
+def test_unknown_kid_is_an_invalid_token(monkeypatch):
+    async def run():
+        requests = []
+        verifier = make_verifier(requests)
+        with pytest.raises(jwt.InvalidTokenError):
+            await verifier.verify(make_token(OTHER_KEY, kid="made-up"))
+        # A second made-up kid within the refresh interval does not refetch the key set
+        with pytest.raises(jwt.InvalidTokenError):
+            await verifier.verify(make_token(OTHER_KEY, kid="also-made-up"))
+        return verifier.stats, len(requests)
+
+    stats, fetches = asyncio.run(run())
+    assert stats["verify_failures"] == 2
+    assert fetches == 1
+
+
+def test_token_signed_by_another_key_is_rejected():
+    async def run():
+        verifier = make_verifier([])
+        with pytest.raises(jwt.InvalidTokenError):
+            await verifier.verify(make_token(OTHER_KEY, kid="known"))
+
+    asyncio.run(run())
+
+
+def test_gateway_answers_401_for_unknown_kid(monkeypatch):
+    import main
+
+    async def run():
+        verifier = make_verifier([])
+        monkeypatch.setattr(main, "token_verifier", verifier)
+        with pytest.raises(HTTPException) as error:
+            await main.verify_clerk_token(f"Bearer {make_token(OTHER_KEY, kid='made-up')}")
+        return error.value.status_code
+
+    assert asyncio.run(run()) == 401
+
+
+def test_unknown_kid_error_type():
+    assert issubclass(auth.UnknownSigningKey, jwt.InvalidTokenError)
@@ -0,0 +1,161 @@
+import time
+import asyncio
+
+import pytest
+
+from rate_limit import InMemoryBackend, RateLimiter, RedisBackend, load_tier_limits
+
+TIERS = {
+    "free": {"default": {"requests": 3, "window": 3600}, "ai": {"requests": 1, "window": 3600}},
+    "pro": {"default": {"requests": 10, "window": 3600}}
+}
+
+
+def takes(backend, key, count, capacity=5, rate=0.001):
+    async def run():
+        return [(await backend.take(key, capacity, rate))[0] for _ in range(count)]
+    return asyncio.run(run())
+
+
+def test_bucket_allows_capacity_then_refills():
+    backend = InMemoryBackend(shards=4)
+    assert takes(backend, "user_1:ai", 7) == [True] * 5 + [False] * 2
+    # 1000 tokens per second: full again almost at once
+    assert takes(backend, "user_2:ai", 2, capacity=1, rate=1000.0) == [True, False]
+    time.sleep(0.01)
+    assert takes(backend, "user_2:ai", 1, capacity=1, rate=1000.0) == [True]
+
+
+def test_take_cost_does_not_grow_with_tracked_keys():
+    async def seconds_per_take(tracked: int) -> float:
+        backend = InMemoryBackend(shards=16)
+        for i in range(tracked):
+            await backend.take(f"user_{i}:default", 5, 0.001)
+        assert backend.size() == tracked
+        start = time.perf_counter()
+        for i in range(2_000):
+            await backend.take(f"user_{i % 1_000}:default", 5, 0.001)
+        return (time.perf_counter() - start) / 2_000
+
+    async def run():
+        small = min([await seconds_per_take(1_000) for _ in range(3)])
+        large = min([await seconds_per_take(100_000) for _ in range(3)])
+        return small, large
+
+    small, large = asyncio.run(run())
+    # A scan of the keys would be ~100x slower; the generous bound keeps the test stable
+    assert large < small * 5
+
+
+def test_sweep_drops_only_buckets_that_are_full_again():
+    backend = InMemoryBackend(shards=4)
+    takes(backend, "idle:ai", 1, capacity=1, rate=1000.0)
+    takes(backend, "busy:ai", 1, capacity=5, rate=0.001)
+    time.sleep(0.01)
+    evicted = sum(backend.sweep_shard(index) for index in range(len(backend.shards)))
+    assert evicted == 1
+    assert backend.size() == 1
+    # The busy bucket kept its state
+    assert takes(backend, "busy:ai", 5) == [True] * 4 + [False]
+
+
+def test_background_sweeper_runs_until_closed():
+    async def run():
+        backend = InMemoryBackend(shards=2, sweep_interval=0.02)
+        await backend.start()
+        for i in range(100):
+            await backend.take(f"user_{i}:ai", 1, 1000.0)
+        await asyncio.sleep(0.1)
+        size = backend.size()
+        await backend.close()
+        return size, backend._sweeper
+
+    size, sweeper = asyncio.run(run())
+    assert size == 0
+    assert sweeper is None
+
+
+def test_limiter_uses_tier_and_route_limits():
+    async def run():
+        limiter = RateLimiter(InMemoryBackend(), tier_limits=TIERS)
+        ai = [await limiter.check("user_1", "ai", "free") for _ in range(2)]
+        other = [await limiter.check("user_1", "chats", "free") for _ in range(4)]
+        pro = [await limiter.check("user_2", "ai", "pro") for _ in range(10)]
+        unknown_tier = await limiter.check("user_3", "ai", "legacy")
+        return ai, other, pro, unknown_tier, limiter.snapshot()
+
+    ai, other, pro, unknown_tier, snapshot = asyncio.run(run())
+    assert [result.allowed for result in ai] == [True, False]
+    assert ai[1].retry_after == pytest.approx(3600, rel=0.01)
+    assert [result.remaining for result in other] == [2, 1, 0, 0]
+    assert all(result.allowed for result in pro) and pro[0].limit == 10
+    assert unknown_tier.limit == 1
+    assert snapshot["limited"] == 2 and snapshot["allowed"] == 15
+
+
+def test_limiter_fails_open_when_the_backend_breaks():
+    class BrokenBackend:
+        async def take(self, key, capacity, rate, cost=1.0):
+            raise ConnectionError("redis is down")
+
+        def size(self):
+            return 0
+
+    limiter = RateLimiter(BrokenBackend(), tier_limits=TIERS)
+    result = asyncio.run(limiter.check("user_1", "ai", "free"))
+    assert result.allowed
+    assert limiter.stats["backend_errors"] == 1
+
+
+def test_tier_without_default_falls_back_to_free(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_TIERS", '{"partner": {"ai": {"requests": 50, "window": 60}}}')
+    limiter = RateLimiter(InMemoryBackend(), tier_limits=load_tier_limits())
+
+    ai = asyncio.run(limiter.check("user_1", "ai", "partner"))
+    other = asyncio.run(limiter.check("user_1", "chats", "partner"))
+
+    assert ai.allowed and ai.limit == 50
+    assert other.allowed and other.limit == limiter.tier_limits["free"]["default"]["requests"]
+
+
+@pytest.fixture
+def redis_backend(monkeypatch):
+    """RedisBackend talking to fakeredis, which runs the Lua script in-process"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    import redis.asyncio
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.asyncio, "from_url", lambda url: fakeredis.FakeAsyncRedis(server=server))
+    return lambda: RedisBackend(url="redis://stand-in", prefix="test:")
+
+
+def test_redis_backend_limits_and_expires(redis_backend):
+    async def run():
+        backend = redis_backend()
+        await backend.start()
+        results = [await backend.take("user_1:ai", 3, 0.001) for _ in range(4)]
+        ttl = await backend.redis.pttl("test:user_1:ai")
+        await backend.close()
+        return results, ttl
+
+    results, ttl = asyncio.run(run())
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert results[2][1] == pytest.approx(0, abs=0.01)
+    # Idle buckets expire about when they would be full again (3 tokens at 1 per 1000s)
+    assert 3_000_000 < ttl <= 3_001_000 + 1_000
+
+
+def test_redis_backend_is_shared_by_replicas(redis_backend):
+    async def run():
+        replicas = [redis_backend(), redis_backend()]
+        for backend in replicas:
+            await backend.start()
+        allowed = 0
+        for i in range(10):
+            allowed += (await replicas[i % 2].take("user_1:ai", 5, 0.001))[0]
+        for backend in replicas:
+            await backend.close()
+        return allowed
+
+    assert asyncio.run(run()) == 5
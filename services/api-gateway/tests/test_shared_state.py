@@ -0,0 +1,69 @@
+import multiprocessing
+
+from shared_state import SharedBucketTable, SharedCounters
+
+PROCESSES = 4
+# Slow enough that no token is refilled while the test runs
+RATE = 1e-9
+
+
+def hammer(table_path, counters_path, keys, capacity, takes, barrier, results):
+    """One gateway worker: take tokens as fast as possible from shared buckets"""
+    table = SharedBucketTable(table_path, slots_per_stripe=256)
+    counters = SharedCounters(counters_path, ["allowed", "limited"])
+    barrier.wait()
+    allowed = 0
+    for i in range(takes):
+        ok, _ = table.take(keys[i % len(keys)], capacity, RATE)
+        allowed += ok
+        counters.add("allowed" if ok else "limited")
+    results.put(allowed)
+    table.close()
+    counters.close()
+
+
+def run_workers(tmp_path, keys, capacity, takes):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(PROCESSES)
+    results = context.Queue()
+    table_path = str(tmp_path / "buckets")
+    counters_path = str(tmp_path / "counters")
+    workers = [
+        context.Process(target=hammer, args=(table_path, counters_path, keys, capacity, takes, barrier, results))
+        for _ in range(PROCESSES)
+    ]
+    for worker in workers:
+        worker.start()
+    allowed = [results.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+    return allowed, SharedCounters(counters_path, ["allowed", "limited"]).snapshot()
+
+
+def test_one_bucket_holds_across_processes(tmp_path):
+    allowed, counters = run_workers(tmp_path, ["user_1:ai"], capacity=200, takes=500)
+    # Every worker alone could take 200; together they still get exactly 200
+    assert sum(allowed) == 200
+    assert counters == {"allowed": 200, "limited": PROCESSES * 500 - 200}
+
+
+def test_many_buckets_hold_across_processes(tmp_path):
+    keys = [f"user_{i}:default" for i in range(40)]
+    allowed, counters = run_workers(tmp_path, keys, capacity=10, takes=800)
+    assert sum(allowed) == len(keys) * 10
+    assert counters["allowed"] == len(keys) * 10
+
+
+def test_buckets_survive_reopening(tmp_path):
+    path = str(tmp_path / "buckets")
+    first = SharedBucketTable(path, slots_per_stripe=256)
+    allowed, tokens = first.take("user_1:ai", 2, RATE)
+    assert allowed and tokens == 1.0
+    second = SharedBucketTable(path, slots_per_stripe=256)
+    allowed, tokens = second.take("user_1:ai", 2, RATE)
+    assert allowed and tokens < 1e-6
+    assert first.take("user_1:ai", 2, RATE)[0] is False
+    assert first.size() == second.size() == 1
+    first.close()
+    second.close()
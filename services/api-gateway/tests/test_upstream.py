@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import main
+import upstream
+from upstream import Replica
+
+
+def make_replica(handler) -> Replica:
+    client = httpx.AsyncClient(base_url="http://replica.test", transport=httpx.MockTransport(handler))
+    return Replica("chat", "http://replica.test", client, max_connections=10)
+
+
+def open_breaker(replica: Replica, monkeypatch):
+    monkeypatch.setattr(upstream, "BREAKER_OPEN_SECONDS", 0.0)
+    for _ in range(upstream.BREAKER_FAILURE_THRESHOLD):
+        replica.record_failure()
+    assert replica.state == Replica.OPEN
+
+
+def test_cancelled_trial_frees_the_half_open_slot(monkeypatch):
+    async def hang(request):
+        await asyncio.sleep(60)
+
+    async def run():
+        replica = make_replica(hang)
+        open_breaker(replica, monkeypatch)
+        assert replica.available()
+        trial = asyncio.create_task(main.fetch_buffered("chat", "GET", "/api/chats", {}, None, replica=replica))
+        await asyncio.sleep(0.01)
+        assert replica.trial_in_flight and not replica.available()
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        return replica
+
+    replica = asyncio.run(run())
+    assert replica.state == Replica.HALF_OPEN
+    assert replica.available()
+
+
+def test_gateway_error_during_trial_frees_the_half_open_slot(monkeypatch):
+    def explode(request):
+        raise ValueError("bug in a handler")
+
+    async def run():
+        replica = make_replica(explode)
+        open_breaker(replica, monkeypatch)
+        assert replica.available()
+        with pytest.raises(HTTPException) as error:
+            await main.fetch_buffered("chat", "GET", "/api/chats", {}, None, replica=replica)
+        return replica, error.value.status_code
+
+    replica, status_code = asyncio.run(run())
+    assert status_code == 500
+    assert replica.available()
+
+
+@pytest.mark.parametrize("error, status_code", [
+    (httpx.ReadError("connection reset"), 502),
+    (httpx.RemoteProtocolError("malformed response"), 502),
+    (httpx.ConnectError("refused"), 503),
+    (httpx.ReadTimeout("slow"), 504),
+])
+def test_transport_errors_count_as_failures(error, status_code):
+    def fail(request):
+        raise error
+
+    async def run():
+        replica = make_replica(fail)
+        with pytest.raises(HTTPException) as raised:
+            await main.fetch_buffered("chat", "GET", "/api/chats", {}, None, replica=replica)
+        return replica, raised.value.status_code
+
+    replica, raised_status = asyncio.run(run())
+    assert raised_status == status_code
+    assert replica.stats["failures"] == 1
+    assert replica.consecutive_failures == 1
+    assert replica.in_flight == 0
+
+
+def test_repeated_read_errors_open_the_breaker():
+    def fail(request):
+        raise httpx.ReadError("connection reset")
+
+    async def run():
+        replica = make_replica(fail)
+        for _ in range(upstream.BREAKER_FAILURE_THRESHOLD):
+            with pytest.raises(HTTPException):
+                await main.fetch_buffered("chat", "GET", "/api/chats", {}, None, replica=replica)
+        return replica
+
+    assert asyncio.run(run()).state == Replica.OPEN
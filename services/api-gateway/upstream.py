@@ -0,0 +1,265 @@
+"""Pooled, long-lived HTTP clients for the upstream microservices.
+
+Each service may run several replicas. Every replica gets its own keep-alive
+client and circuit breaker, and calls are spread across replicas with
+power-of-two-choices on the number of outstanding requests.
+"""
+import os
+import time
+import random
+import logging
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Pool defaults (override per service with e.g. CHAT_SERVICE_MAX_CONNECTIONS)
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "30"))
+UPSTREAM_WRITE_TIMEOUT = float(os.getenv("UPSTREAM_WRITE_TIMEOUT", "30"))
+UPSTREAM_POOL_TIMEOUT = float(os.getenv("UPSTREAM_POOL_TIMEOUT", "5"))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "true").lower() == "true"
+
+# Circuit breaker
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "10"))
+
+# Weight of the newest sample in the per-replica latency average
+LATENCY_EWMA_ALPHA = 0.2
+
+
+def parse_service_urls(value: str) -> List[str]:
+    """Split a comma-separated replica list from the environment"""
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+def _service_setting(service_name: str, setting: str, default: float) -> float:
+    """Read a per-service pool setting, falling back to the global default"""
+    value = os.getenv(f"{service_name.upper()}_SERVICE_{setting}")
+    return float(value) if value is not None else default
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class NoHealthyReplica(Exception):
+    """Raised when every replica of a service has an open circuit breaker"""
+
+
+class Replica:
+    """One upstream instance: its client, load counters and circuit breaker.
+
+    The breaker opens after BREAKER_FAILURE_THRESHOLD consecutive 5xx
+    responses or transport failures. After BREAKER_OPEN_SECONDS a single
+    half-open trial request is let through; success closes the breaker,
+    failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, service_name: str, url: str, client: httpx.AsyncClient, max_connections: int):
+        self.service_name = service_name
+        self.url = url
+        self.client = client
+        self.max_connections = max_connections
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.latency_ewma_ms = None
+        self.stats = {
+            "requests": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+            "saturated": 0,
+            "pool_timeouts": 0,
+            "failures": 0,
+            "breaker_opens": 0
+        }
+
+    @property
+    def in_flight(self) -> int:
+        return self.stats["in_flight"]
+
+    def available(self) -> bool:
+        """Whether the breaker lets a request through right now"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= BREAKER_OPEN_SECONDS:
+            self.state = self.HALF_OPEN
+            self.trial_in_flight = False
+        return self.state == self.HALF_OPEN and not self.trial_in_flight
+
+    def begin(self):
+        """Record the start of a call"""
+        stats = self.stats
+        stats["requests"] += 1
+        # Every connection is already busy, so this call queues for the pool
+        if stats["in_flight"] >= self.max_connections:
+            stats["saturated"] += 1
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        if self.state == self.HALF_OPEN:
+            self.trial_in_flight = True
+
+    def end(self):
+        """Record the end of a call, once its body has been fully relayed"""
+        self.stats["in_flight"] -= 1
+        # A trial that ended without a verdict (cancelled, lost a hedge race,
+        # failed inside the gateway) frees the slot for the next request
+        if self.state == self.HALF_OPEN:
+            self.trial_in_flight = False
+
+    def record_response(self, status_code: int, latency: float):
+        """Feed a response status and time-to-headers into the breaker"""
+        latency_ms = latency * 1000
+        if self.latency_ewma_ms is None:
+            self.latency_ewma_ms = latency_ms
+        else:
+            self.latency_ewma_ms += LATENCY_EWMA_ALPHA * (latency_ms - self.latency_ewma_ms)
+
+        if status_code >= 500:
+            self.record_failure()
+        else:
+            self.consecutive_failures = 0
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit closed for {self.service_name} replica {self.url}")
+            self.state = self.CLOSED
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        """Count a 5xx, timeout or connection failure"""
+        self.stats["failures"] += 1
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= BREAKER_FAILURE_THRESHOLD:
+            if self.state != self.OPEN:
+                self.stats["breaker_opens"] += 1
+                logger.warning(
+                    f"Circuit opened for {self.service_name} replica {self.url} "
+                    f"after {self.consecutive_failures} consecutive failures"
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    def record_pool_timeout(self):
+        """Record a call that gave up waiting for a free connection"""
+        self.stats["pool_timeouts"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "latency_ewma_ms": round(self.latency_ewma_ms, 2) if self.latency_ewma_ms is not None else None,
+            "max_connections": self.max_connections,
+            "utilization": round(self.stats["in_flight"] / self.max_connections, 3),
+            **self.stats
+        }
+
+
+class UpstreamPool:
+    """Shared keep-alive clients for every replica of every upstream.
+
+    Clients are created at startup and closed at shutdown so proxied calls
+    reuse connections instead of paying TCP setup every time.
+    """
+
+    def __init__(self, service_urls: Dict[str, List[str]]):
+        self.service_urls = service_urls
+        self.replicas: Dict[str, List[Replica]] = {}
+
+    async def start(self):
+        """Create the per-replica clients"""
+        http2 = UPSTREAM_HTTP2 and _http2_available()
+        if UPSTREAM_HTTP2 and not http2:
+            logger.warning("h2 package not installed, upstream clients will use HTTP/1.1")
+
+        for service_name, urls in self.service_urls.items():
+            max_connections = int(_service_setting(service_name, "MAX_CONNECTIONS", UPSTREAM_MAX_CONNECTIONS))
+            max_keepalive = int(_service_setting(service_name, "MAX_KEEPALIVE", UPSTREAM_MAX_KEEPALIVE))
+            read_timeout = _service_setting(service_name, "READ_TIMEOUT", UPSTREAM_READ_TIMEOUT)
+
+            self.replicas[service_name] = [
+                Replica(
+                    service_name,
+                    url,
+                    httpx.AsyncClient(
+                        base_url=url,
+                        http2=http2,
+                        limits=httpx.Limits(
+                            max_connections=max_connections,
+                            max_keepalive_connections=max_keepalive,
+                            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY
+                        ),
+                        timeout=httpx.Timeout(
+                            connect=UPSTREAM_CONNECT_TIMEOUT,
+                            read=read_timeout,
+                            write=UPSTREAM_WRITE_TIMEOUT,
+                            pool=UPSTREAM_POOL_TIMEOUT
+                        )
+                    ),
+                    max_connections
+                )
+                for url in urls
+            ]
+
+            logger.info(
+                f"Upstream pool for {service_name}: {', '.join(urls)} "
+                f"(max_connections={max_connections}, max_keepalive={max_keepalive}, http2={http2})"
+            )
+
+    async def close(self):
+        """Close all clients and their pooled connections"""
+        for service_name, replicas in self.replicas.items():
+            for replica in replicas:
+                try:
+                    await replica.client.aclose()
+                except Exception as e:
+                    logger.error(f"Error closing upstream client for {service_name} ({replica.url}): {str(e)}")
+        self.replicas.clear()
+
+    def choose(self, service_name: str, exclude: Optional[Replica] = None) -> Replica:
+        """Pick a replica: the less loaded of two random available ones"""
+        replicas = self.replicas.get(service_name)
+        if not replicas:
+            raise RuntimeError(f"Upstream pool for {service_name} is not started")
+
+        candidates = [replica for replica in replicas if replica is not exclude and replica.available()]
+        if not candidates:
+            raise NoHealthyReplica(f"All {service_name} replicas are unavailable")
+        if len(candidates) == 1:
+            return candidates[0]
+
+        first, second = random.sample(candidates, 2)
+        return first if first.in_flight <= second.in_flight else second
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Per-service totals of the replica pool counters"""
+        summary = {}
+        for service_name, replicas in self.replicas.items():
+            totals = {key: sum(replica.stats[key] for replica in replicas) for key in replicas[0].stats}
+            totals["peak_in_flight"] = max(replica.stats["peak_in_flight"] for replica in replicas)
+            totals["replicas"] = len(replicas)
+            totals["available_replicas"] = sum(1 for replica in replicas if replica.state != Replica.OPEN)
+            summary[service_name] = totals
+        return summary
+
+    def replica_snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Per-replica in-flight, latency and breaker state"""
+        return {
+            service_name: [replica.snapshot() for replica in replicas]
+            for service_name, replicas in self.replicas.items()
+        }
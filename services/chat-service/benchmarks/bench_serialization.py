@@ -0,0 +1,99 @@
+"""Serialization throughput for large chat histories.
+
+Encodes the message list of one chat, at several history lengths, the way
+FastAPI did before (response_model validation, jsonable_encoder and
+json.dumps), with ORJSONResponse in place of json.dumps, and with the
+pre-built TypeAdapter serializer get_messages uses now. A last column
+times the real GET /api/chats/{id}/messages endpoint end to end through
+the ASGI app.
+
+    python benchmarks/bench_serialization.py [repeats]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+import main  # noqa: E402
+from main import MessageResponse, message_list_encoder  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+HISTORY_LENGTHS = (100, 1_000, 10_000)
+USER_ID = "user_bench"
+
+
+def build_history(length: int) -> List[MessageResponse]:
+    chat_id = f"chat_{length}"
+    main.chats_db[chat_id] = {"id": chat_id, "title": "Bench", "user_id": USER_ID, "created_at": "2024-05-01T12:00:00"}
+    history = []
+    for i in range(length):
+        message = {
+            "id": f"{chat_id}_msg_{i}",
+            "chat_id": chat_id,
+            "role": "user" if i % 2 else "assistant",
+            "content": "Explain how token buckets refill and why idle buckets can be dropped. " * 4,
+            "personality_used": None if i % 2 else "helpful",
+            "conversation_id": "conv_1",
+            "function_calls": None if i % 5 else {"name": "search", "arguments": {"query": "token bucket"}},
+            "created_at": f"2024-05-01T12:00:{i:07d}",
+            "is_edited": False
+        }
+        main.messages_db[message["id"]] = message
+        history.append(MessageResponse(**message))
+    return history
+
+
+async def fastapi_default(field, history) -> bytes:
+    return JSONResponse(await serialize_response(field=field, response_content=history)).body
+
+
+async def fastapi_orjson(field, history) -> bytes:
+    return ORJSONResponse(await serialize_response(field=field, response_content=history)).body
+
+
+async def prebuilt(field, history) -> bytes:
+    return message_list_encoder.dump_json(history)
+
+
+async def time_encoder(encode, field, history, repeats: int):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        body = await encode(field, history)
+    return (time.perf_counter() - start) / repeats, len(body)
+
+
+def main_benchmark(repeats: int):
+    field = create_response_field(name="Response_get_messages", type_=List[MessageResponse])
+    client = TestClient(main.app)
+    encoders = (fastapi_default, fastapi_orjson, prebuilt)
+    print(f"{'messages':>8} {'body KiB':>9} " + " ".join(f"{encode.__name__ + ' ms':>19}" for encode in encoders) + f" {'endpoint ms':>12} {'MB/s':>7}")
+    for length in HISTORY_LENGTHS:
+        history = build_history(length)
+        timings = [asyncio.run(time_encoder(encode, field, history, repeats)) for encode in encoders]
+        size = timings[-1][1]
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            response = client.get(f"/api/chats/chat_{length}/messages", headers={"X-User-ID": USER_ID})
+        endpoint = (time.perf_counter() - start) / repeats
+        assert response.status_code == 200 and len(response.json()) == length
+
+        print(
+            f"{length:>8} {size / 1024:>9.0f} "
+            + " ".join(f"{seconds * 1000:>19.2f}" for seconds, _ in timings)
+            + f" {endpoint * 1000:>12.2f} {size / timings[-1][0] / 1e6:>7.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -1,16 +1,19 @@
 from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, ORJSONResponse, Response
 import httpx
 import os
 import json
 import time
 import logging
+import redis.asyncio as redis
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from datetime import datetime
 import asyncio
 
+from radon_common.metrics import setup_metrics, prometheus_response
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,7 +24,8 @@ app = FastAPI(
     description="Chat Service для управления чатами и сообщениями",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -33,10 +37,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus latency and payload histograms per route
+metrics_registry = setup_metrics(app, "chat-service")
+
 # Service URLs
 AI_SERVICE_URL = os.getenv("AI_SERVICE_URL", "http://localhost:8001")
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 
+# Shared Redis connection for event publishing (created on first publish)
+redis_client = None
+
 # Request models
 class ChatCreate(BaseModel):
     title: str
@@ -80,6 +90,14 @@ class MessageResponse(BaseModel):
     edited_at: Optional[str] = None
     is_edited: bool
 
+# Pre-built pydantic-core serializers for the hot response models. Returning
+# their bytes skips FastAPI's re-validation and dict round trip.
+chat_list_encoder = TypeAdapter(List[ChatResponse])
+message_list_encoder = TypeAdapter(List[MessageResponse])
+
+def encoded_response(body: bytes, status_code: int = 200) -> Response:
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
 # In-memory storage (in production, use PostgreSQL)
 chats_db = {}
 messages_db = {}
@@ -94,9 +112,18 @@ def get_user_id(request: Request) -> str:
     return user_id
 
 async def publish_event(event_type: str, data: Dict[str, Any]):
-    """Publish event to Redis (placeholder)"""
+    """Publish event to Redis pub/sub on the events:<type> channel"""
+    global redis_client
     logger.info(f"Publishing event: {event_type} - {data}")
-    # In production, publish to Redis pub/sub
+    try:
+        if redis_client is None:
+            redis_client = redis.from_url(REDIS_URL, socket_connect_timeout=1)
+        await redis_client.publish(
+            f"events:{event_type}",
+            json.dumps({"type": event_type, "data": data}, default=str)
+        )
+    except Exception as e:
+        logger.error(f"Error publishing event {event_type}: {str(e)}")
 
 async def call_ai_service(message_data: MessageCreate, conversation_id: Optional[str] = None) -> Dict[str, Any]:
     """Call AI Service for response generation"""
@@ -141,6 +168,11 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    return prometheus_response(metrics_registry)
+
 # Chat endpoints
 @app.get("/api/chats", response_model=List[ChatResponse])
 async def get_chats(request: Request):
@@ -160,7 +192,8 @@ async def get_chats(request: Request):
                 message_count=message_count
             ))
     
-    return sorted(user_chats, key=lambda x: x.created_at, reverse=True)
+    user_chats.sort(key=lambda x: x.created_at, reverse=True)
+    return encoded_response(chat_list_encoder.dump_json(user_chats))
 
 @app.post("/api/chats", response_model=ChatResponse)
 async def create_chat(chat_data: ChatCreate, request: Request):
@@ -188,14 +221,14 @@ async def create_chat(chat_data: ChatCreate, request: Request):
         "title": chat_data.title
     })
     
-    return ChatResponse(
+    return encoded_response(ChatResponse(
         id=chat_id,
         title=chat["title"],
         user_id=chat["user_id"],
         workspace_id=chat.get("workspace_id"),
         created_at=chat["created_at"],
         message_count=0
-    )
+    ).model_dump_json())
 
 @app.get("/api/chats/{chat_id}", response_model=ChatResponse)
 async def get_chat(chat_id: str, request: Request):
@@ -211,14 +244,14 @@ async def get_chat(chat_id: str, request: Request):
     
     message_count = len([m for m in messages_db.values() if m["chat_id"] == chat_id])
     
-    return ChatResponse(
+    return encoded_response(ChatResponse(
         id=chat_id,
         title=chat["title"],
         user_id=chat["user_id"],
         workspace_id=chat.get("workspace_id"),
         created_at=chat["created_at"],
         message_count=message_count
-    )
+    ).model_dump_json())
 
 @app.put("/api/chats/{chat_id}", response_model=ChatResponse)
 async def update_chat(chat_id: str, chat_data: ChatUpdate, request: Request):
@@ -243,14 +276,14 @@ async def update_chat(chat_id: str, chat_data: ChatUpdate, request: Request):
     
     message_count = len([m for m in messages_db.values() if m["chat_id"] == chat_id])
     
-    return ChatResponse(
+    return encoded_response(ChatResponse(
         id=chat_id,
         title=chat["title"],
         user_id=chat["user_id"],
         workspace_id=chat.get("workspace_id"),
         created_at=chat["created_at"],
         message_count=message_count
-    )
+    ).model_dump_json())
 
 @app.delete("/api/chats/{chat_id}")
 async def delete_chat(chat_id: str, request: Request):
@@ -296,7 +329,7 @@ async def get_messages(chat_id: str, request: Request):
     chat_messages = [msg for msg in messages_db.values() if msg["chat_id"] == chat_id]
     chat_messages.sort(key=lambda x: x["created_at"])
     
-    return [
+    return encoded_response(message_list_encoder.dump_json([
         MessageResponse(
             id=msg["id"],
             chat_id=msg["chat_id"],
@@ -314,7 +347,7 @@ async def get_messages(chat_id: str, request: Request):
             is_edited=msg.get("is_edited", False)
         )
         for msg in chat_messages
-    ]
+    ]))
 
 @app.post("/api/chats/{chat_id}/messages", response_model=MessageResponse)
 async def create_message(chat_id: str, message_data: MessageCreate, request: Request):
@@ -385,7 +418,7 @@ async def create_message(chat_id: str, message_data: MessageCreate, request: Req
             "role": "assistant"
         })
         
-        return MessageResponse(
+        return encoded_response(MessageResponse(
             id=ai_message_id,
             chat_id=ai_message["chat_id"],
             role=ai_message["role"],
@@ -395,7 +428,7 @@ async def create_message(chat_id: str, message_data: MessageCreate, request: Req
             conversation_id=ai_message.get("conversation_id"),
             created_at=ai_message["created_at"],
             is_edited=ai_message["is_edited"]
-        )
+        ).model_dump_json())
         
     except Exception as e:
         logger.error(f"Error getting AI response: {str(e)}")
@@ -432,7 +465,7 @@ async def update_message(chat_id: str, message_id: str, message_data: MessageUpd
         "user_id": user_id
     })
     
-    return MessageResponse(
+    return encoded_response(MessageResponse(
         id=message["id"],
         chat_id=message["chat_id"],
         role=message["role"],
@@ -447,7 +480,7 @@ async def update_message(chat_id: str, message_id: str, message_data: MessageUpd
         created_at=message["created_at"],
         edited_at=message.get("edited_at"),
         is_edited=message["is_edited"]
-    )
+    ).model_dump_json())
 
 @app.delete("/api/chats/{chat_id}/messages/{message_id}")
 async def delete_message(chat_id: str, message_id: str, request: Request):
@@ -0,0 +1,5 @@
+"""Code shared by the Radon AI backend services.
+
+Installed into every service image (see each service's Dockerfile), so a
+fix here reaches all services at once instead of being copied around.
+"""
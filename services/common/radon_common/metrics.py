@@ -0,0 +1,457 @@
+"""Low-overhead Prometheus metrics for the Radon AI services.
+
+Shared by every service through the radon-common package. Counters,
+gauges and fixed-bucket histograms are plain float slots: an update is a
+bisect plus a few additions, which keeps the cost per request in the low
+microseconds.
+
+When METRICS_MULTIPROC_DIR is set, each process keeps its slots in its own
+mmap-backed file in that directory and `/metrics` sums the files of all
+workers, so numbers are correct under `uvicorn --workers N`. Gauges only
+count processes that are still alive.
+"""
+import os
+import glob
+import json
+import mmap
+import time
+import struct
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144,
+    1048576, 4194304, 16777216, 67108864
+)
+
+
+class _LocalStore:
+    """Slots for a single process"""
+
+    def __init__(self):
+        self.values: List[float] = []
+        self.keys: Dict[str, int] = {}
+
+    def allocate(self, key: str) -> int:
+        slot = self.keys.get(key)
+        if slot is None:
+            slot = self.keys[key] = len(self.values)
+            self.values.append(0.0)
+        return slot
+
+    def add(self, slot: int, amount: float):
+        self.values[slot] += amount
+
+    def set(self, slot: int, value: float):
+        self.values[slot] = value
+
+    def items(self):
+        return [(key, self.values[slot]) for key, slot in self.keys.items()]
+
+
+class _MmapStore:
+    """Slots in a per-process file that other workers can read.
+
+    Layout: an 8 byte header holding the used length, then entries of
+    [int32 key length][key, padded to 8 byte alignment][float64 value].
+    """
+
+    HEADER_SIZE = 8
+
+    def __init__(self, path: str, initial_size: int = 1 << 16):
+        self.path = path
+        self.keys: Dict[str, int] = {}
+        self._file = open(path, "w+b")
+        self._file.truncate(initial_size)
+        self._map = mmap.mmap(self._file.fileno(), initial_size)
+        self.used = self.HEADER_SIZE
+        struct.pack_into("i", self._map, 0, self.used)
+
+    def allocate(self, key: str) -> int:
+        slot = self.keys.get(key)
+        if slot is not None:
+            return slot
+        encoded = key.encode("utf-8")
+        padded = len(encoded) + (8 - (4 + len(encoded)) % 8) % 8
+        needed = 4 + padded + 8
+        if self.used + needed > len(self._map):
+            self._grow(self.used + needed)
+        struct.pack_into(f"i{padded}sd", self._map, self.used, len(encoded), encoded, 0.0)
+        slot = self.keys[key] = self.used + 4 + padded
+        self.used += needed
+        struct.pack_into("i", self._map, 0, self.used)
+        return slot
+
+    def _grow(self, minimum: int):
+        size = len(self._map)
+        while size < minimum:
+            size *= 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+    def add(self, slot: int, amount: float):
+        struct.pack_into("d", self._map, slot, struct.unpack_from("d", self._map, slot)[0] + amount)
+
+    def set(self, slot: int, value: float):
+        struct.pack_into("d", self._map, slot, value)
+
+    def items(self):
+        return list(read_mmap_file(self.path))
+
+
+def read_mmap_file(path: str):
+    """Yield (key, value) pairs from a worker's metrics file"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _MmapStore.HEADER_SIZE:
+        return
+    used = struct.unpack_from("i", data, 0)[0]
+    pos = _MmapStore.HEADER_SIZE
+    while pos < used:
+        key_length = struct.unpack_from("i", data, pos)[0]
+        padded = key_length + (8 - (4 + key_length) % 8) % 8
+        key = data[pos + 4:pos + 4 + key_length].decode("utf-8")
+        value = struct.unpack_from("d", data, pos + 4 + padded)[0]
+        yield key, value
+        pos += 4 + padded + 8
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _sample_key(name: str, suffix: str, labels: Sequence[Tuple[str, str]]) -> str:
+    return json.dumps([name, suffix, [list(pair) for pair in labels]], separators=(",", ":"))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str]):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self.registry.lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._make_child(
+                        tuple(zip(self.labelnames, (str(value) for value in values)))
+                    )
+        return child
+
+    def _make_child(self, labels):
+        raise NotImplementedError
+
+
+class _CounterChild:
+    def __init__(self, registry, slot):
+        self.registry = registry
+        self.slot = slot
+
+    def inc(self, amount: float = 1.0):
+        with self.registry.lock:
+            self.registry.store.add(self.slot, amount)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _make_child(self, labels):
+        return _CounterChild(self.registry, self.registry.store.allocate(_sample_key(self.name, "_total", labels)))
+
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        with self.registry.lock:
+            self.registry.store.set(self.slot, value)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _make_child(self, labels):
+        return _GaugeChild(self.registry, self.registry.store.allocate(_sample_key(self.name, "", labels)))
+
+
+class _HistogramChild:
+    def __init__(self, registry, bounds, bucket_slots, sum_slot, count_slot):
+        self.registry = registry
+        self.bounds = bounds
+        self.bucket_slots = bucket_slots
+        self.sum_slot = sum_slot
+        self.count_slot = count_slot
+
+    def observe(self, value: float):
+        slot = self.bucket_slots[bisect.bisect_left(self.bounds, value)]
+        with self.registry.lock:
+            store = self.registry.store
+            store.add(slot, 1.0)
+            store.add(self.sum_slot, value)
+            store.add(self.count_slot, 1.0)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames, buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _make_child(self, labels):
+        store = self.registry.store
+        bucket_slots = [
+            store.allocate(_sample_key(self.name, "_bucket", labels + (("le", _format_value(bound)),)))
+            for bound in self.bounds
+        ]
+        bucket_slots.append(store.allocate(_sample_key(self.name, "_bucket", labels + (("le", "+Inf"),))))
+        return _HistogramChild(
+            self.registry,
+            self.bounds,
+            bucket_slots,
+            store.allocate(_sample_key(self.name, "_sum", labels)),
+            store.allocate(_sample_key(self.name, "_count", labels))
+        )
+
+    def mean(self) -> float:
+        """Mean of every observation over all label sets and workers"""
+        total = count = 0.0
+        for key, value in self.registry.collect().items():
+            name, suffix, _ = json.loads(key)
+            if name == self.name:
+                if suffix == "_sum":
+                    total += value
+                elif suffix == "_count":
+                    count += value
+        return total / count if count else 0.0
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """All metrics of one service process"""
+
+    def __init__(self, service_name: str, multiproc_dir: Optional[str] = METRICS_MULTIPROC_DIR):
+        self.service_name = service_name
+        self.multiproc_dir = multiproc_dir
+        self.metrics: Dict[str, _Metric] = {}
+        self.lock = threading.Lock()
+        if multiproc_dir:
+            os.makedirs(multiproc_dir, exist_ok=True)
+            self.store = _MmapStore(os.path.join(multiproc_dir, f"{service_name}_{os.getpid()}.db"))
+        else:
+            self.store = _LocalStore()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def collect(self) -> Dict[str, float]:
+        """Sample values summed over every worker process"""
+        if not self.multiproc_dir:
+            return dict(self.store.items())
+
+        gauges = {name for name, metric in self.metrics.items() if metric.kind == "gauge"}
+        totals: Dict[str, float] = {}
+        for path in glob.glob(os.path.join(self.multiproc_dir, f"{self.service_name}_*.db")):
+            try:
+                pid = int(os.path.basename(path)[len(self.service_name) + 1:-3])
+                alive = _pid_alive(pid)
+                for key, value in read_mmap_file(path):
+                    # Gauges of exited workers are stale; counters stay cumulative
+                    if not alive and json.loads(key)[0] in gauges:
+                        continue
+                    totals[key] = totals.get(key, 0.0) + value
+            except (OSError, ValueError, struct.error):
+                continue
+        return totals
+
+    def value(self, name: str, suffix: str = "", **labels) -> float:
+        """Current (summed) value of one sample, for JSON summaries"""
+        if suffix == "" and self.metrics.get(name) is not None and self.metrics[name].kind == "counter":
+            suffix = "_total"
+        return self.collect().get(_sample_key(name, suffix, tuple(labels.items())), 0.0)
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        samples: Dict[str, List[Tuple[str, List[List[str]], float]]] = {}
+        for key, value in self.collect().items():
+            name, suffix, labels = json.loads(key)
+            samples.setdefault(name, []).append((suffix, labels, value))
+
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            entries = samples.get(name, [])
+            if metric.kind == "histogram":
+                entries = _cumulative_buckets(metric, entries)
+            else:
+                entries.sort(key=lambda entry: entry[1])
+            for suffix, labels, value in entries:
+                label_text = ",".join(f'{label}="{_escape(label_value)}"' for label, label_value in labels)
+                lines.append(f"{name}{suffix}{{{label_text}}} {_format_sample(value)}" if label_text
+                             else f"{name}{suffix} {_format_sample(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _cumulative_buckets(metric: Histogram, entries):
+    """Turn per-bucket counts into Prometheus' cumulative `le` buckets"""
+    order = {_format_value(bound): index for index, bound in enumerate(metric.bounds)}
+    order["+Inf"] = len(metric.bounds)
+    series: Dict[str, List] = {}
+    others = []
+    for suffix, labels, value in entries:
+        if suffix != "_bucket":
+            others.append((suffix, labels, value))
+            continue
+        base = [pair for pair in labels if pair[0] != "le"]
+        le = next(pair[1] for pair in labels if pair[0] == "le")
+        series.setdefault(json.dumps(base), []).append((order.get(le, 0), labels, value))
+
+    result = []
+    for base in sorted(series):
+        running = 0.0
+        for _, labels, value in sorted(series[base], key=lambda bucket: bucket[0]):
+            running += value
+            result.append(("_bucket", labels, running))
+    return result + sorted(others, key=lambda entry: (entry[1], entry[0]))
+
+
+def _format_sample(value: float) -> str:
+    return str(int(value)) if value == int(value) and abs(value) < 1e15 else repr(value)
+
+
+def route_label(scope) -> str:
+    """Low-cardinality route label: the matched path template or endpoint"""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        return getattr(endpoint, "__name__", "unknown")
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and payload sizes per route"""
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.request_duration = registry.histogram(
+            "http_request_duration_seconds",
+            "Time to serve an HTTP request, including streamed bodies",
+            ["method", "route", "status"]
+        )
+        self.request_size = registry.histogram(
+            "http_request_size_bytes",
+            "HTTP request body size from Content-Length",
+            ["method", "route"],
+            buckets=SIZE_BUCKETS
+        )
+        self.response_size = registry.histogram(
+            "http_response_size_bytes",
+            "HTTP response body size as sent",
+            ["method", "route", "status"],
+            buckets=SIZE_BUCKETS
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        response_bytes = 0
+
+        async def send_wrapper(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            method = scope.get("method", "")
+            route = route_label(scope)
+            status_class = f"{status // 100}xx"
+            self.request_duration.labels(method, route, status_class).observe(time.perf_counter() - start)
+            self.response_size.labels(method, route, status_class).observe(response_bytes)
+            for name, value in scope.get("headers", []):
+                if name == b"content-length":
+                    try:
+                        self.request_size.labels(method, route).observe(int(value))
+                    except ValueError:
+                        pass
+                    break
+
+
+def setup_metrics(app, service_name: str) -> MetricsRegistry:
+    """Create the service's registry and install the request middleware"""
+    registry = MetricsRegistry(service_name)
+    app.add_middleware(MetricsMiddleware, registry=registry)
+    return registry
+
+
+def prefers_json(request: Request) -> bool:
+    """JSON for browsers and API clients, Prometheus text for scrapers"""
+    return request.query_params.get("format") == "json" or "application/json" in request.headers.get("accept", "")
+
+
+def prometheus_response(registry: MetricsRegistry) -> Response:
+    return Response(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,10 +1,11 @@
 from fastapi import FastAPI, HTTPException, Depends, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse, Response
 import os
 import json
 import time
 import logging
+import redis.asyncio as redis
 import uuid
 import mimetypes
 from typing import Optional, Dict, Any, List
@@ -13,6 +14,8 @@ from datetime import datetime
 import aiofiles
 import hashlib
 
+from radon_common.metrics import setup_metrics, prometheus_response
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,7 +26,8 @@ app = FastAPI(
     description="File Service для управления файлами и загрузками",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -35,6 +39,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus latency and payload histograms per route
+metrics_registry = setup_metrics(app, "file-service")
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+# Shared Redis connection for event publishing (created on first publish)
+redis_client = None
+
 # Configuration
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/app/uploads")
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "50 * 1024 * 1024"))  # 50MB
@@ -47,7 +59,7 @@ ALLOWED_EXTENSIONS = {
 
 # Create upload directories
 os.makedirs(f"{UPLOAD_DIR}/images", exist_ok=True)
-os.makedirs(f"{UPLOAD_DIR}/audio", exist_ok=True)
+os.makedirs(f"{UPLOAD_DIR}/audios", exist_ok=True)
 os.makedirs(f"{UPLOAD_DIR}/videos", exist_ok=True)
 os.makedirs(f"{UPLOAD_DIR}/documents", exist_ok=True)
 
@@ -75,6 +87,11 @@ class FileListResponse(BaseModel):
     files: List[Dict[str, Any]]
     total: int
 
+# Returning a model's pydantic-core JSON bytes skips FastAPI's re-validation
+# and dict round trip for the hot responses
+def encoded_response(body: bytes, status_code: int = 200) -> Response:
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
 # In-memory storage (in production, use PostgreSQL)
 files_db = {}
 
@@ -86,9 +103,18 @@ def get_user_id(request: Request) -> str:
     return user_id
 
 async def publish_event(event_type: str, data: Dict[str, Any]):
-    """Publish event to Redis (placeholder)"""
+    """Publish event to Redis pub/sub on the events:<type> channel"""
+    global redis_client
     logger.info(f"Publishing event: {event_type} - {data}")
-    # In production, publish to Redis pub/sub
+    try:
+        if redis_client is None:
+            redis_client = redis.from_url(REDIS_URL, socket_connect_timeout=1)
+        await redis_client.publish(
+            f"events:{event_type}",
+            json.dumps({"type": event_type, "data": data}, default=str)
+        )
+    except Exception as e:
+        logger.error(f"Error publishing event {event_type}: {str(e)}")
 
 def get_file_type(content_type: str) -> str:
     """Determine file type from content type"""
@@ -147,6 +173,11 @@ async def health_check():
         "upload_dir": UPLOAD_DIR
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    return prometheus_response(metrics_registry)
+
 # File upload endpoints
 @app.post("/api/upload", response_model=FileUploadResponse)
 async def upload_file(
@@ -212,7 +243,7 @@ async def upload_file(
         "size": len(content)
     })
     
-    return FileUploadResponse(
+    return encoded_response(FileUploadResponse(
         file_id=file_id,
         filename=file.filename,
         url=file_info["url"],
@@ -220,7 +251,7 @@ async def upload_file(
         size=len(content),
         file_type=file_type,
         metadata=metadata
-    )
+    ).model_dump_json())
 
 @app.get("/api/files/{file_id}")
 async def get_file(file_id: str, request: Request):
@@ -266,10 +297,10 @@ async def list_files(request: Request, file_type: Optional[str] = None):
     # Sort by creation date (newest first)
     user_files.sort(key=lambda x: x["created_at"], reverse=True)
     
-    return FileListResponse(
+    return encoded_response(FileListResponse(
         files=user_files,
         total=len(user_files)
-    )
+    ).model_dump_json())
 
 @app.delete("/api/files/{file_id}")
 async def delete_file(file_id: str, request: Request):
@@ -1,13 +1,17 @@
 from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import os
 import json
 import time
 import logging
+import redis.asyncio as redis
 from typing import Optional, Dict, Any
 from pydantic import BaseModel
 from datetime import datetime
 
+from radon_common.metrics import setup_metrics, prometheus_response
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,7 +22,8 @@ app = FastAPI(
     description="User Service для управления пользователями и профилями",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -30,6 +35,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus latency and payload histograms per route
+metrics_registry = setup_metrics(app, "user-service")
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+# Shared Redis connection for event publishing (created on first publish)
+redis_client = None
+
 # Request models
 class ProfileUpdate(BaseModel):
     name: Optional[str] = None
@@ -71,9 +84,18 @@ def get_user_id(request: Request) -> str:
     return user_id
 
 async def publish_event(event_type: str, data: Dict[str, Any]):
-    """Publish event to Redis (placeholder)"""
+    """Publish event to Redis pub/sub on the events:<type> channel"""
+    global redis_client
     logger.info(f"Publishing event: {event_type} - {data}")
-    # In production, publish to Redis pub/sub
+    try:
+        if redis_client is None:
+            redis_client = redis.from_url(REDIS_URL, socket_connect_timeout=1)
+        await redis_client.publish(
+            f"events:{event_type}",
+            json.dumps({"type": event_type, "data": data}, default=str)
+        )
+    except Exception as e:
+        logger.error(f"Error publishing event {event_type}: {str(e)}")
 
 @app.get("/health")
 async def health_check():
@@ -84,6 +106,11 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    return prometheus_response(metrics_registry)
+
 # Profile endpoints
 @app.get("/api/profile", response_model=ProfileResponse)
 async def get_profile(request: Request):
@@ -0,0 +1,74 @@
+import json
+import asyncio
+
+import httpx
+import fakeredis
+import pytest
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(main, "settings_db", {})
+    monkeypatch.setattr(main, "redis_client", None)
+
+
+def put_settings(user_id, body):
+    async def request():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://user-service") as client:
+            return await client.put("/api/settings", json=body, headers={"X-User-ID": user_id})
+    return request
+
+
+def test_settings_update_publishes_invalidation_event(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(main.redis, "from_url", lambda *args, **kwargs: fakeredis.FakeAsyncRedis(server=server))
+
+    async def scenario():
+        # Subscribed the way the gateway's cache invalidation listener is
+        subscriber = fakeredis.FakeAsyncRedis(server=server).pubsub()
+        await subscriber.psubscribe("events:*")
+        await subscriber.get_message(timeout=1)
+
+        response = await put_settings("user_1", {"theme": "light"})()
+        message = await subscriber.get_message(ignore_subscribe_messages=True, timeout=1)
+        await subscriber.aclose()
+        return response, message
+
+    response, message = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert message["channel"] == b"events:user.settings.updated"
+    event = json.loads(message["data"])
+    assert event["type"] == "user.settings.updated"
+    assert event["data"]["user_id"] == "user_1"
+    assert event["data"]["settings"]["theme"] == "light"
+
+
+def test_event_is_published_after_the_write(monkeypatch):
+    published = []
+
+    async def publish_event(event_type, data):
+        # What a reader refetching on this event would get
+        published.append((event_type, data["user_id"], main.settings_db.get(data["user_id"], {}).get("theme")))
+
+    monkeypatch.setattr(main, "publish_event", publish_event)
+
+    response = asyncio.run(put_settings("user_1", {"theme": "light"})())
+
+    assert response.status_code == 200
+    assert published == [("user.settings.updated", "user_1", "light")]
+
+
+def test_update_succeeds_when_redis_is_down(monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise ConnectionError("redis unavailable")
+
+    monkeypatch.setattr(main.redis, "from_url", unreachable)
+
+    response = asyncio.run(put_settings("user_1", {"language": "en"})())
+
+    assert response.status_code == 200
+    assert main.settings_db["user_1"]["language"] == "en"
@@ -23,6 +23,7 @@ export interface QwenMultimodalRequest {
   user_id?: string
   speaker?: string
   use_audio_in_video?: boolean
+  return_audio?: boolean
 }
 
 export interface QwenConversationRequest {
@@ -40,6 +41,7 @@ export interface QwenConversationRequest {
   use_audio_in_video?: boolean
   max_new_tokens?: number
   temperature?: number
+  return_audio?: boolean
 }
 
 export interface QwenResponse {